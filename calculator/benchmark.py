@@ -0,0 +1,120 @@
+"""
+Benchmarks for the calculator.
+
+Usage: python benchmark.py [name ...] [--rows N] [--lines N]
+
+batch: evaluates one expression over N rows of inputs, once with `Batch`
+(parse once, one NumPy operation per node) and once by substituting each
+row into the source text and running `Interpreter.expr` on it.
+cache: replays a log of N lines drawn from a small set of expressions, with
+a fresh `Interpreter` per line and with `evaluate`.
+"""
+import argparse
+import random
+import time
+
+from calculator import Batch, ExpressionCache, Interpreter, Lexer, evaluate, np
+
+EXPRESSION = "(1 + 2) * 3 - 4 / (5 - 6)"
+COLUMNS = {0: "a", 1: "b", 4: "c", 5: "d"}
+TEMPLATE = "({a} + {b}) * 3 - 4 / ({c} - {d})"
+
+
+def rows(count, seed=0):
+    rng = random.Random(seed)
+    return {name: [rng.randint(0, 20) for _ in range(count)] for name in "abcd"}
+
+
+def loop(data):
+    values = []
+    for a, b, c, d in zip(data["a"], data["b"], data["c"], data["d"]):
+        text = TEMPLATE.format(a=a, b=b, c=c, d=d)
+        try:
+            values.append(Interpreter(Lexer(text)).expr())
+        except ZeroDivisionError:
+            values.append(None)
+    return values
+
+
+def best_of(repeat, function, *args):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def batch(count):
+    data = rows(count)
+    elapsed, expected = best_of(3, loop, data)
+    print(f"expr() loop: {elapsed * 1e9 / count:10.0f} ns/row")
+    if np is None:
+        print("NumPy is not installed, skipping Batch.")
+        return
+    arrays = {name: np.array(column, dtype=np.int64) for name, column in data.items()}
+    compiled = Batch(EXPRESSION, COLUMNS)
+    elapsed, (values, zero_division) = best_of(3, compiled.evaluate, arrays)
+    print(f"Batch:       {elapsed * 1e9 / count:10.0f} ns/row")
+    for value, zero, want in zip(values, zero_division, expected):
+        assert zero == (want is None)
+        assert zero or abs(value - want) < 1e-9, (value, want)
+    print(f"{int(zero_division.sum())} of {count} rows divided by zero")
+
+
+def replay_log(count, distinct=200, seed=0):
+    rng = random.Random(seed)
+    expressions = [
+        TEMPLATE.format(a=rng.randint(0, 99), b=rng.randint(0, 99), c=n, d=n + 1)
+        for n in range(distinct)
+    ]
+    # Few expressions make up most of the log.
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    return rng.choices(expressions, weights, k=count)
+
+
+def uncached(lines):
+    return [Interpreter(Lexer(text)).expr() for text in lines]
+
+
+def cached(lines, cache):
+    return [evaluate(text, cache) for text in lines]
+
+
+def cache(count):
+    lines = replay_log(count)
+    elapsed, expected = best_of(3, uncached, lines)
+    print(f"Interpreter per line: {elapsed * 1e9 / count:8.0f} ns/line")
+    for maxsize in (16, 64, 1024):
+        expression_cache = ExpressionCache(maxsize)
+        elapsed, values = best_of(1, cached, lines, expression_cache)
+        assert values == expected
+        stats = expression_cache.stats()
+        print(
+            f"evaluate, maxsize {maxsize:4}: {elapsed * 1e9 / count:8.0f} ns/line, "
+            f"{stats['hits']} hits, {stats['misses']} misses, "
+            f"{stats['evictions']} evictions"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Calculator benchmarks.")
+    parser.add_argument("names", nargs="*", help="benchmarks to run (default: all)")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--lines", type=int, default=100000)
+    args = parser.parse_args()
+    benchmarks = {
+        "batch": lambda: batch(args.rows),
+        "cache": lambda: cache(args.lines),
+    }
+    for name in args.names:
+        if name not in benchmarks:
+            parser.error(f"unknown benchmark {name!r}")
+    for name in args.names or benchmarks:
+        print(f"== {name}")
+        benchmarks[name]()
+
+
+if __name__ == "__main__":
+    main()
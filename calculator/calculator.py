@@ -1,3 +1,9 @@
+from collections import OrderedDict
+
+try:
+	import numpy as np
+except ImportError:  # only needed by Batch
+	np = None
 
 INTEGER, PLUS, MINUS, TIMES, DIV, LPAR, RPAR, EOS = "INTEGER", "PLUS", "MINUS", "TIMES", "DIV", "LPAR", "RPAR", "EOS"
 
@@ -136,7 +142,7 @@ class Interpreter:
 				div = self.factor()
 				if div == 0:
 					raise ZeroDivisionError("Dividing by 0!")
-				result /= self.factor()
+				result /= div
 		return result
 
 	def expr(self):
@@ -158,6 +164,219 @@ class Interpreter:
 		return result
 
 
+class Num:
+	def __init__(self, value):
+		self.value = value
+
+
+class Column:
+	def __init__(self, name):
+		self.name = name
+
+
+class BinOp:
+	def __init__(self, left, op, right):
+		self.left = left
+		self.op = op
+		self.right = right
+
+
+class Parser:
+	"""
+	Parses the same grammar as `Interpreter`, but builds a tree of Num,
+	Column and BinOp nodes instead of computing the result.
+	columns maps positions of integer literals (0 for the first) to the
+	names of the columns that replace them.
+	"""
+	def __init__(self, lexer, columns=None):
+		self.lexer = lexer
+		self.columns = columns if columns is not None else {}
+		self.literals = 0
+		self.current_token = self.lexer.get_next_token()
+
+	def error(self):
+		raise Exception("Invalid syntax.")
+
+	def eat(self, type):
+		if self.current_token.type == type:
+			self.current_token = self.lexer.get_next_token()
+		else:
+			raise self.error()
+
+	def factor(self):
+		"""
+		factor : INTEGER | LPAR expr RPAR
+		"""
+		token = self.current_token
+		if token.type == INTEGER:
+			self.eat(INTEGER)
+			index = self.literals
+			self.literals += 1
+			if index in self.columns:
+				return Column(self.columns[index])
+			return Num(token.value)
+		if token.type == LPAR:
+			self.eat(LPAR)
+			node = self.expr()
+			self.eat(RPAR)
+			return node
+		self.error()
+
+	def term(self):
+		"""
+		term : factor((TIMES | DIV) factor)*
+		"""
+		node = self.factor()
+		while self.current_token.type in (TIMES, DIV):
+			op = self.current_token.type
+			self.eat(op)
+			node = BinOp(node, op, self.factor())
+		return node
+
+	def expr(self):
+		"""
+		expr : term((PLUS | MINUS) term)*
+		"""
+		node = self.term()
+		while self.current_token.type in (PLUS, MINUS):
+			op = self.current_token.type
+			self.eat(op)
+			node = BinOp(node, op, self.term())
+		return node
+
+	def parse(self):
+		node = self.expr()
+		if self.current_token.type != EOS:
+			self.error()
+		return node
+
+
+class Batch:
+	"""
+	An expression parsed once, then evaluated over whole NumPy arrays of
+	inputs: `evaluate` computes each node for every row in one vectorized
+	operation. Needs NumPy.
+
+	Example:
+		batch = Batch("(1 + 2) * 3 / 4", columns={0: "a", 2: "c"})
+		values, zero_division = batch.evaluate({"a": a, "c": c})
+	"""
+	def __init__(self, text, columns=None):
+		self.tree = Parser(Lexer(text), columns).parse()
+
+	def evaluate(self, data):
+		"""
+		Evaluate the expression for every row of data, a mapping from
+		column names to equally long arrays.
+		Returns (values, zero_division). A row that divides by zero doesn't
+		stop the others: its value is NaN and zero_division is True for it.
+		Integer arithmetic is done in the arrays' dtype, so unlike
+		`Interpreter` it can overflow.
+		"""
+		if np is None:
+			raise ImportError("Batch evaluation needs NumPy.")
+		self.data = data
+		self.rows = len(next(iter(data.values()))) if data else 1
+		self.zero_division = np.zeros(self.rows, dtype=bool)
+		values = np.broadcast_to(self.visit(self.tree), (self.rows,)).copy()
+		return values, self.zero_division
+
+	def visit(self, node):
+		if isinstance(node, Num):
+			return node.value
+		if isinstance(node, Column):
+			return np.asarray(self.data[node.name])
+		left = self.visit(node.left)
+		right = self.visit(node.right)
+		if node.op == PLUS:
+			return np.add(left, right)
+		if node.op == MINUS:
+			return np.subtract(left, right)
+		if node.op == TIMES:
+			return np.multiply(left, right)
+		zero = np.broadcast_to(np.equal(right, 0), (self.rows,))
+		self.zero_division |= zero
+		result = np.full(self.rows, np.nan)
+		np.divide(left, right, out=result, where=~zero)
+		return result
+
+
+def compile_tree(node):
+	"""
+	Turns a tree from `Parser` into a function of no arguments that computes
+	what `Interpreter` would for the same text.
+	"""
+	if isinstance(node, Num):
+		value = node.value
+		return lambda: value
+	left = compile_tree(node.left)
+	right = compile_tree(node.right)
+	if node.op == PLUS:
+		return lambda: left() + right()
+	if node.op == MINUS:
+		return lambda: left() - right()
+	if node.op == TIMES:
+		return lambda: left() * right()
+
+	def divide():
+		div = right()
+		if div == 0:
+			raise ZeroDivisionError("Dividing by 0!")
+		return left() / div
+
+	return divide
+
+
+class ExpressionCache:
+	"""
+	A bounded LRU cache of compiled expressions, keyed by their text.
+	"""
+	def __init__(self, maxsize=1024):
+		self.maxsize = maxsize
+		self.entries = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	def get(self, text):
+		try:
+			function = self.entries[text]
+		except KeyError:
+			self.misses += 1
+			function = compile_tree(Parser(Lexer(text)).parse())
+			self.entries[text] = function
+			if len(self.entries) > self.maxsize:
+				self.entries.popitem(last=False)
+				self.evictions += 1
+			return function
+		self.hits += 1
+		self.entries.move_to_end(text)
+		return function
+
+	def stats(self):
+		return {
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"size": len(self.entries),
+			"maxsize": self.maxsize,
+		}
+
+	def clear(self):
+		self.entries.clear()
+		self.hits = self.misses = self.evictions = 0
+
+
+CACHE = ExpressionCache()
+
+
+def evaluate(text, cache=CACHE):
+	"""
+	Computes the value of text, reusing its compiled form if it has been
+	seen recently.
+	"""
+	return cache.get(text)()
+
 
 def main():
     while True:
@@ -168,10 +387,7 @@ def main():
             break
         if not text:
             continue
-        lexer = Lexer(text)
-        interpreter = Interpreter(lexer)
-        result = interpreter.expr()
-        print(result)
+        print(evaluate(text))
 
 
 if __name__ == "__main__":
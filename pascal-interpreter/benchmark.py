@@ -0,0 +1,1624 @@
+# Benchmarks for the Pascal interpreter.
+# usage: python benchmark.py [name ...] [--json FILE] [--seed N] [--set KNOB=N ...]
+import argparse
+import gc
+import importlib.util
+import io
+import itertools
+import json
+import math
+import os
+import pickle
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+
+def load(file_name, module_name):
+    """Import one of the hyphenated scripts in this directory as a module."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+pascal = load("pascal-interpreter.py", "pascal_interpreter")
+recompiler = load("source-to-source-compiler.py", "source_to_source_compiler")
+
+
+#############################################
+# 				  Sample programs			#
+#############################################
+
+SAMPLE_PROGRAM = """\
+PROGRAM Sample;
+VAR
+   a, b, _c : INTEGER;
+   y : REAL;
+{ a {nested} comment }
+PROCEDURE P1(x, z : INTEGER);
+VAR
+   k : REAL;
+BEGIN {P1}
+   k := 2.5
+END;  {P1}
+
+begin {Sample}
+   a := 2;
+   BEGIN
+      b := 10 * a + 10 * A div 4;
+      _c := a - - b
+   END;
+   y := 20 / 7 + 3.14;
+   a := (a + b) * -_c
+End.  {Sample}
+"""
+
+
+CALL_PROGRAM = """\
+PROGRAM Calls;
+VAR
+   a, b : INTEGER;
+   y : REAL;
+PROCEDURE Add(x, z : INTEGER; r : REAL);
+VAR
+   k : INTEGER;
+   a : REAL;
+PROCEDURE Inner(q : INTEGER);
+BEGIN
+   b := b + q * k;
+   y := y + a
+END;
+BEGIN
+   k := x + z;
+   a := r / 2;
+   Inner(k); Inner(1)
+END;
+PROCEDURE Nop;
+BEGIN
+END;
+BEGIN
+   a := 1; b := 0; y := 0.5;
+   Add(a, 2, 3); Nop; Nop();
+   Add(b, a * 2, y)
+END.
+"""
+
+
+def arithmetic_program(statements):
+    """A flat program that keeps reassigning a handful of variables."""
+    lines = ["PROGRAM Arithmetic;", "VAR", "   a, b, c : INTEGER;", "BEGIN"]
+    lines.append("   a := 3; b := 7; c := 1;")
+    for i in range(statements):
+        k = i % 97 + 1
+        lines.append(f"   {{ step {i} }} c := (a + b) * {k} - c DIV 3 - a * {k};")
+        lines.append(f"   a := (c + b * 2) DIV {k + 1} + 10 - -a DIV -2;")
+    lines.append("   b := a")
+    lines.append("END.")
+    return "\n".join(lines)
+
+
+def constant_program(statements):
+    """Like arithmetic_program, with constant subexpressions and identities."""
+    lines = ["PROGRAM Constants;", "VAR", "   a, b : INTEGER;", "   y : REAL;", "BEGIN"]
+    lines.append("   a := 3; b := 7;")
+    for i in range(statements):
+        k = i % 97 + 1
+        lines.append(f"   a := 2 * (3 + {k}) - -1 + b * 1 + 0 - a DIV (4 - 2);")
+        lines.append(f"   y := {k} / 4 * 2.5 + - -a - 0;")
+        lines.append(f"   b := +(b DIV {k + 1}) * (1 * 1) + {k} DIV 3")
+        lines[-1] += ";"
+    lines.append("   b := a")
+    lines.append("END.")
+    return "\n".join(lines)
+
+
+def mixed_program(statements):
+    """Like arithmetic_program, mixing INTEGER and REAL variables."""
+    lines = ["PROGRAM Mixed;", "VAR", "   a, b : INTEGER;", "   x, y : REAL;"]
+    lines += ["BEGIN", "   a := 3; b := 7; x := 1; y := 0.5;"]
+    for i in range(statements):
+        k = i % 97 + 1
+        lines.append(f"   x := (a + b) * {k} / 4 - x / 3 + y * a;")
+        lines.append(f"   y := b DIV {k + 1} - -y * 0.5 + a;")
+        lines.append(f"   a := (b * {k} + a) DIV 3; x := a;")
+    lines.append("   b := a")
+    lines.append("END.")
+    return "\n".join(lines)
+
+
+def call_program(levels):
+    """
+    A program whose procedure P<i> calls P<i - 1> twice, so that calling
+    P<levels - 1> makes 2 ** levels - 1 calls.
+    """
+    lines = ["PROGRAM Calls;", "VAR", "   total : INTEGER;"]
+    lines += ["PROCEDURE P0(n : INTEGER);", "VAR", "   k : INTEGER;", "BEGIN"]
+    lines += ["   k := n + 1; total := total + k", "END;"]
+    for level in range(1, levels):
+        lines += [f"PROCEDURE P{level}(n : INTEGER);", "BEGIN"]
+        lines += [f"   P{level - 1}(n); P{level - 1}(n + 1)", "END;"]
+    lines += ["BEGIN", "   total := 0;", f"   P{levels - 1}(1)", "END."]
+    return "\n".join(lines)
+
+
+def declaration_program(declarations):
+    """A program that declares many variables and uses a few of them."""
+    lines = ["PROGRAM Declarations;", "VAR"]
+    for i in range(0, declarations, 10):
+        names = ", ".join(f"v{j}" for j in range(i, min(i + 10, declarations)))
+        lines.append(f"   {names} : {'INTEGER' if i % 20 else 'REAL'};")
+    lines.append("BEGIN")
+    lines.append("   v1 := 1; v0 := v1 * 2.5")
+    lines.append("END.")
+    return "\n".join(lines)
+
+
+#############################################
+# 				Program generator			#
+#############################################
+
+
+class ProgramGenerator:
+    """
+    Generates random Pascal programs that check and run without errors.
+    The same seed and knobs always give the same program. Knobs:
+        declarations          variables declared by each block
+        procedures            procedures declared by each block
+        nesting               how deep procedures nest
+        params                parameters of each procedure
+        expression_size       operators in each expression
+        statements            statements in the program's body
+        procedure_statements  statements in each procedure's body
+        calls                 procedure calls made by each block
+        call_budget           most statements a single call may execute
+
+    Every block assigns its variables before anything can read them, and
+    divides only by non-zero constants. Each assigned INTEGER expression is
+    divided by a bound on its size, so values stay small however long the
+    program runs. Without conditionals a program can't recurse, so blocks
+    only call procedures declared before them or inside them.
+
+    After `generate()`, `executed` is the number of statements a run of the
+    program executes, counting each call and the statements it executes.
+    """
+
+    def __init__(
+        self,
+        seed=0,
+        declarations=8,
+        procedures=3,
+        nesting=2,
+        params=2,
+        expression_size=6,
+        statements=200,
+        procedure_statements=8,
+        calls=2,
+        call_budget=1000,
+    ):
+        self.seed = seed
+        self.declarations = declarations
+        self.procedures = procedures
+        self.nesting = nesting
+        self.params = params
+        self.expression_size = expression_size
+        self.statements = statements
+        self.procedure_statements = procedure_statements
+        self.calls = calls
+        self.call_budget = call_budget
+
+    def generate(self):
+        self.random = random.Random(self.seed)
+        self.names = itertools.count()
+        self.lines = ["PROGRAM Generated;"]
+        self.executed = self.block([], [], 0, self.statements, "")
+        self.lines[-1] += "."
+        return "\n".join(self.lines) + "\n"
+
+    def block(self, visible, procedures, depth, statements, indent):
+        """
+        Add a block that can see the variables visible and call procedures,
+        both lists of (name, ...) tuples. Returns the statements it executes.
+        """
+        variables = self.variables(self.declarations)
+        if variables:
+            self.lines.append(f"{indent}VAR")
+            self.declare(variables, indent + "   ", ";")
+        visible = variables + visible
+        procedures = list(procedures)
+        if depth < self.nesting:
+            for _ in range(self.procedures):
+                procedures.append(self.procedure(visible, procedures, depth, indent))
+
+        # (text, executed) pairs; variables are assigned before anything else
+        body = [(f"{name} := {self.constant(type)}", 1) for name, type in variables]
+        calls = set(self.random.sample(range(statements), min(self.calls, statements)))
+        budget = self.call_budget
+        for i in range(statements):
+            affordable = [p for p in procedures if p[2] < budget]
+            if i in calls and affordable:
+                name, params, cost = self.random.choice(affordable)
+                args = ", ".join(self.scaled(visible, type)[0] for type in params)
+                body.append((f"{name}({args})", cost + 1))
+                budget -= cost + 1
+            elif visible:
+                name, type = self.random.choice(visible)
+                expr, _ = self.scaled(visible, type)
+                body.append((f"{name} := {expr}", 1))
+
+        self.lines.append(f"{indent}BEGIN")
+        self.compound(body, indent + "   ")
+        self.lines.append(f"{indent}END")
+        return sum(executed for _, executed in body)
+
+    def compound(self, body, indent):
+        """Add body's statements, a few of them in nested compound statements."""
+        i = 0
+        while i < len(body):
+            if self.random.random() < 0.05:
+                group = body[i : i + self.random.randint(1, 4)]
+                self.lines.append(f"{indent}BEGIN")
+                self.compound(group, indent + "   ")
+                self.lines.append(f"{indent}END;")
+                i += len(group)
+            else:
+                self.lines.append(f"{indent}{body[i][0]};")
+                i += 1
+        if body:
+            # the last statement in a list takes no semicolon
+            self.lines[-1] = self.lines[-1][:-1]
+
+    def procedure(self, visible, procedures, depth, indent):
+        """Add a procedure declaration. Returns (name, param types, cost)."""
+        name = f"p{next(self.names)}"
+        params = self.variables(self.params)
+        if params:
+            self.lines.append(f"{indent}PROCEDURE {name}(")
+            self.declare(params, indent + "   ", ";")
+            self.lines[-1] = self.lines[-1][:-1] + ");"
+        else:
+            self.lines.append(f"{indent}PROCEDURE {name};")
+        cost = self.block(
+            params + visible,
+            procedures,
+            depth + 1,
+            self.procedure_statements,
+            indent + "   ",
+        )
+        self.lines[-1] += ";"
+        return name, [type for _, type in params], cost
+
+    def variables(self, count):
+        """count new (name, type) pairs, mostly INTEGERs, in declaration order."""
+        types = [
+            "REAL" if self.random.random() < 0.25 else "INTEGER" for _ in range(count)
+        ]
+        return [(f"v{next(self.names)}", type) for type in sorted(types)]
+
+    def declare(self, variables, indent, end):
+        for type in ("INTEGER", "REAL"):
+            names = [name for name, var_type in variables if var_type == type]
+            if names:
+                self.lines.append(f"{indent}{', '.join(names)} : {type}{end}")
+
+    def constant(self, type):
+        if type == "REAL":
+            return f"{self.random.randint(0, 9)}.{self.random.randint(0, 99)}"
+        return str(self.random.randint(1, 9))
+
+    def scaled(self, visible, type):
+        """
+        An expression for a variable of type, divided by the expression's
+        bound so that it is no bigger than the largest visible variable, plus
+        one. Returns (text, precedence).
+        """
+        text, bound, precedence = self.expression(visible, type, self.expression_size)
+        if bound <= 1:
+            return text, precedence
+        if precedence < 2:
+            text = f"({text})"
+        op = "DIV" if type == "INTEGER" else "/"
+        return f"{text} {op} {int(bound) + 1}", 2
+
+    def expression(self, visible, type, size):
+        """
+        An expression with size operators for a variable of type. Returns
+        (text, bound, precedence), where the value is at most bound times
+        the largest visible variable (or 1) in size.
+        """
+        if size == 0:
+            return self.operand(visible, type)
+        op = self.random.choice("+-*/" if type == "REAL" else "+-*D")
+        if op in "*/D":
+            left, bound, precedence = self.expression(visible, type, size - 1)
+            if precedence < 2:
+                left = f"({left})"
+            k = self.random.randint(2, 9)
+            if op == "*":
+                return f"{left} * {k}", bound * k, 2
+            if op == "/":
+                return f"{left} / {k}", bound / k, 2
+            return f"{left} DIV {k}", bound / k + 1, 2
+        left_size = self.random.randint(0, size - 1)
+        left, left_bound, _ = self.expression(visible, type, left_size)
+        right, right_bound, precedence = self.expression(
+            visible, type, size - 1 - left_size
+        )
+        if precedence < 2:
+            right = f"({right})"
+        return f"{left} {op} {right}", left_bound + right_bound, 1
+
+    def operand(self, visible, type):
+        """A variable or constant for an expression of type, with its bound."""
+        # a REAL expression may use INTEGER variables, not the other way round
+        candidates = [
+            name for name, var_type in visible if var_type in ("INTEGER", type)
+        ]
+        if candidates and self.random.random() < 0.7:
+            text, bound = self.random.choice(candidates), 1
+        else:
+            text = self.constant(type)
+            bound = max(float(text), 1)
+        if self.random.random() < 0.1:
+            return f"-{text}", bound, 3
+        return text, bound, 3
+
+
+#############################################
+# 				  	Helpers					#
+#############################################
+
+
+def best_of(repeat, function, *args):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def count_tokens(lexer):
+    get_token = lexer.get_token
+    count = 0
+    while get_token().type != pascal.EOS:
+        count += 1
+    return count
+
+
+def gc_collections():
+    return sum(stats["collections"] for stats in gc.get_stats())
+
+
+def drain(lexer):
+    tokens = []
+    token = lexer.get_token()
+    while token.type != pascal.EOS:
+        tokens.append((token.type, token.value))
+        token = lexer.get_token()
+    return tokens
+
+
+#############################################
+# 				  Benchmarks				#
+#############################################
+
+
+def bench_lexer():
+    # all engines must agree token-for-token before their speed is compared
+    for text in (SAMPLE_PROGRAM, arithmetic_program(50), ""):
+        expected = drain(pascal.Lexer(text))
+        for name, lexer_class in pascal.LEXERS.items():
+            assert drain(lexer_class(text)) == expected, name
+        # tokens and nested comments crossing chunk boundaries
+        for size in (1, 2, 3, 7, 64):
+            chunks = [text[i : i + size] for i in range(0, len(text), size)]
+            assert drain(pascal.StreamLexer(chunks)) == expected, size
+            data = io.BytesIO(text.encode())
+            assert drain(pascal.StreamLexer(data, chunk_size=size)) == expected, size
+
+    text = arithmetic_program(5000)
+    print(f"lexing {len(text) / 1e6:.2f} MB")
+    results = dict.fromkeys(pascal.LEXERS, float("inf"))
+    # alternate the engines so that all see the same machine load
+    for _ in range(5):
+        for name, lexer_class in pascal.LEXERS.items():
+            seconds = best_of(1, lambda: count_tokens(lexer_class(text)))
+            results[name] = min(results[name], seconds)
+    for name, seconds in results.items():
+        print(f"  {name:<8} {seconds:8.3f}s  {len(text) / seconds / 1e6:6.2f} MB/s")
+    # the bulk tokenizer must pay off
+    assert 1.25 * results["regex"] < results["scan"], results
+
+    with tempfile.TemporaryFile() as file:
+        file.write(text.encode())
+        file.flush()
+
+        def lex_mapped():
+            file.seek(0)
+            count_tokens(pascal.StreamLexer(pascal.map_file(file)))
+
+        seconds = best_of(3, lex_mapped)
+        print(f"  {'mmap':<8} {seconds:8.3f}s  {len(text) / seconds / 1e6:6.2f} MB/s")
+
+
+def parse_only(text):
+    return pascal.Parser(pascal.RegexLexer(text)).parse()
+
+
+def analyze(tree, trace=None):
+    pascal.SemanticAnalyzer(trace).visit(tree)
+    return tree
+
+
+def parse(text):
+    """Parse and check text, ready for Interpreter."""
+    return analyze(parse_only(text))
+
+
+def run(tree, engine, frames=None):
+    interpreter = pascal.Interpreter(tree, engine, frames)
+    interpreter.interpret()
+    return interpreter.GLOBAL_MEMORY
+
+
+def parse_flat(text):
+    """Parse and check text into a FlatTree, ready for FlatInterpreter."""
+    tree = pascal.FlatTree()
+    pascal.Parser(pascal.RegexLexer(text), tree).parse()
+    pascal.FlatSemanticAnalyzer(tree).visit(tree.root)
+    return tree
+
+
+def run_flat(tree, frames=None):
+    interpreter = pascal.FlatInterpreter(tree, frames)
+    interpreter.interpret()
+    return interpreter.GLOBAL_MEMORY
+
+
+def bench_engines():
+    for text in (SAMPLE_PROGRAM, CALL_PROGRAM, arithmetic_program(50)):
+        tree = parse(text)
+        expected = run(tree, "tree")
+        for engine in pascal.Interpreter.ENGINES:
+            assert run(tree, engine) == expected, engine
+
+    statements = 5000
+    tree = parse(arithmetic_program(statements))
+    print(f"running {2 * statements} assignments")
+    for engine in pascal.Interpreter.ENGINES:
+        # first run includes any one-time translation, later runs reuse it
+        interpreter = pascal.Interpreter(tree, engine)
+        first = best_of(1, interpreter.interpret)
+        seconds = best_of(5, interpreter.interpret)
+        print(
+            f"  {engine:<8} first {first:8.4f}s  warm {seconds:8.4f}s"
+            f"  {2 * statements / seconds / 1e6:6.2f} M statements/s"
+        )
+
+
+def count_nodes(node):
+    if isinstance(node, list):
+        return sum(count_nodes(item) for item in node)
+    if not isinstance(node, pascal.AST):
+        return 0
+    # a call's procedure links back to a declaration counted where it stands
+    children = (name for name in node.__slots__ if name != "procedure")
+    return 1 + sum(count_nodes(getattr(node, name)) for name in children)
+
+
+class UncachedInterpreter(pascal.Interpreter):
+    """Interpreter with the original per-visit name building and getattr."""
+
+    def visit(self, node):
+        name = "visit_" + type(node).__name__
+        visitor = getattr(self, name, self.default_visitor)
+        return visitor(node)
+
+
+def bench_dispatch():
+    tree = parse(arithmetic_program(5000))
+    nodes = count_nodes(tree)
+    print(f"walking {nodes} nodes")
+    for interpreter_class in (UncachedInterpreter, pascal.Interpreter):
+        interpreter = interpreter_class(tree)
+        seconds = best_of(5, interpreter.interpret)
+        print(
+            f"  {interpreter_class.__name__:<20} {seconds:8.4f}s"
+            f"  {seconds / nodes * 1e9:6.0f} ns/node"
+        )
+
+
+def bench_memory():
+    text = arithmetic_program(5000)
+    tracemalloc.start()
+    tree = parse_only(text)
+    tree_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    nodes = count_nodes(tree)
+    print(f"source {len(text)} bytes, tree {tree_bytes} bytes, {nodes} nodes")
+    print(
+        f"  {tree_bytes / nodes:6.1f} bytes/node"
+        f"  {tree_bytes / len(text):5.2f}x source"
+    )
+
+
+def signatures(block):
+    """(name, [(param, type name), ...]) of every procedure declared in block."""
+    for declaration in block.declarations:
+        if isinstance(declaration, pascal.ProcedureDeclaration):
+            params = [
+                (param.var_node.value, param.type_node.value)
+                for param in declaration.params
+            ]
+            yield declaration.name, params
+            yield from signatures(declaration.block)
+
+
+def reparsed_signatures(recompiled):
+    """The signatures of the procedure headers in recompiled, parsed again."""
+    headers = [line for line in recompiled.splitlines() if line.startswith("proc")]
+    lines = ["PROGRAM T;"] + [f"{header} BEGIN END;" for header in headers]
+    lines.append("BEGIN END.")
+    return list(signatures(parse_only("\n".join(lines)).block))
+
+
+def bench_flat():
+    declared = []
+    for text in (SAMPLE_PROGRAM, CALL_PROGRAM, arithmetic_program(50)):
+        tree = parse(text)
+        flat = parse_flat(text)
+        assert run_flat(flat) == run(tree, "tree")
+        recompiled, flat_recompiled = io.StringIO(), io.StringIO()
+        recompiler.SourceToSource(recompiled).recompile(tree)
+        recompiler.FlatSourceToSource(flat, flat_recompiled).recompile(flat.root)
+        assert recompiled.getvalue() == flat_recompiled.getvalue()
+        # parameter groups of different types keep their own types
+        expected = list(signatures(tree.block))
+        assert reparsed_signatures(recompiled.getvalue()) == expected
+        declared += expected
+    assert ("add", [("x", "INTEGER"), ("z", "INTEGER"), ("r", "REAL")]) in declared
+
+    def parse_objects(text):
+        return parse_only(text), pascal.Interpreter
+
+    def parse_flat_only(text):
+        tree = pascal.FlatTree()
+        pascal.Parser(pascal.RegexLexer(text), tree).parse()
+        return tree, pascal.FlatInterpreter
+
+    text = arithmetic_program(30000)
+    print(f"parsing and running {count_tokens(pascal.RegexLexer(text))} tokens")
+    for name, parse_text in (("objects", parse_objects), ("flat", parse_flat_only)):
+        gc.collect()
+        collections = gc_collections()
+        start = time.perf_counter()
+        tree, interpreter_class = parse_text(text)
+        parsed = time.perf_counter()
+        collections = gc_collections() - collections
+        if interpreter_class is pascal.Interpreter:
+            analyze(tree)
+        else:
+            pascal.FlatSemanticAnalyzer(tree).visit(tree.root)
+        collections -= gc_collections()
+        run_start = time.perf_counter()
+        interpreter_class(tree).interpret()
+        end = time.perf_counter()
+        collections += gc_collections()
+        del tree
+
+        tracemalloc.start()
+        tree, _ = parse_text(text)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del tree
+        print(
+            f"  {name:<8} parse {parsed - start:6.3f}s  run {end - run_start:6.3f}s"
+            f"  {collections:5} gc collections  peak {peak / 1e6:6.1f} MB"
+        )
+
+
+def bench_fold():
+    for text in (SAMPLE_PROGRAM, constant_program(50)):
+        expected = run(parse(text), "tree")
+        for engine in pascal.Interpreter.ENGINES:
+            assert run(pascal.ConstantFolder().fold(parse(text)), engine) == expected
+
+    statements = 5000
+    text = constant_program(statements)
+    tree = parse(text)
+    nodes = count_nodes(tree)
+    folder = pascal.ConstantFolder()
+    folded = folder.fold(parse(text))
+    print(f"{3 * statements} statements, folded away {folder.removed}/{nodes} nodes")
+    for name, program in (("original", tree), ("folded", folded)):
+        seconds = best_of(5, pascal.Interpreter(program).interpret)
+        print(f"  {name:<8} {seconds:8.4f}s")
+
+
+def bench_analysis():
+    events = []
+
+    def record(level, event, fields):
+        events.append((level, event))
+
+    analyze(parse_only(SAMPLE_PROGRAM), pascal.TraceSink(record))
+    assert (pascal.TRACE_SYMBOLS, "insert") in events
+    scopes = [e for e in events if e[0] == pascal.TRACE_SCOPES]
+    analyze(parse_only(SAMPLE_PROGRAM), pascal.TraceSink(record, pascal.TRACE_SCOPES))
+    assert events[-len(scopes) :] == scopes
+
+    declarations = 100000
+    text = declaration_program(declarations)
+    print(f"analyzing {declarations} declarations")
+    with open(os.devnull, "w") as devnull:
+        for name, trace in (
+            ("off", None),
+            ("scopes", pascal.TraceSink(devnull, pascal.TRACE_SCOPES)),
+            ("symbols", pascal.TraceSink(devnull, pascal.TRACE_SYMBOLS)),
+        ):
+            trees = [parse_only(text) for _ in range(3)]
+            seconds = best_of(3, lambda: analyze(trees.pop(), trace))
+            print(f"  trace {name:<8} {seconds:8.3f}s")
+
+
+def bench_calls():
+    for text in (CALL_PROGRAM, call_program(5)):
+        tree = parse(text)
+        expected = run(tree, "tree")
+        for frames in pascal.FRAMES.values():
+            for engine in pascal.Interpreter.ENGINES:
+                assert run(tree, engine, frames) == expected, (engine, frames)
+            assert run_flat(parse_flat(text), frames) == expected, frames
+
+    levels = 15
+    calls = 2**levels - 1
+    tree = parse(call_program(levels))
+    flat = parse_flat(call_program(levels))
+    print(f"making {calls} procedure calls")
+    for engine in pascal.Interpreter.ENGINES + ("flat",):
+        for name, frames in pascal.FRAMES.items():
+            if engine == "flat":
+                interpret = pascal.FlatInterpreter(flat, frames).interpret
+            else:
+                interpret = pascal.Interpreter(tree, engine, frames).interpret
+            interpret()
+            seconds = best_of(10, interpret)
+            print(
+                f"  {engine:<8} {name:<7} {seconds:8.4f}s"
+                f"  {calls / seconds / 1e6:6.3f} M calls/s"
+                f"  {seconds / calls * 1e9:6.0f} ns/call"
+            )
+            if engine == "compile":
+                break  # Python's own frames, the same either way
+
+
+class TokenReplay:
+    """A lexer handing out already lexed tokens, to time `Parser` alone."""
+
+    def __init__(self, tokens):
+        eos = itertools.repeat(pascal.Token(pascal.EOS, None))
+        self.get_token = itertools.chain(tokens, eos).__next__
+
+
+def lex(text):
+    """The tokens of text, up to but not including EOS."""
+    get_token = pascal.RegexLexer(text).get_token
+    tokens = []
+    token = get_token()
+    while token.type != pascal.EOS:
+        tokens.append(token)
+        token = get_token()
+    return tokens
+
+
+def bench_cache():
+    with tempfile.TemporaryDirectory() as directory:
+        cache = pascal.ParseCache(directory)
+        for text in (SAMPLE_PROGRAM, CALL_PROGRAM):
+            key = cache.key("checked", text)
+            assert cache.get(key) is None
+            expected = run(cache.fetch(key, lambda: parse(text)), "tree")
+            assert run(cache.fetch(key, lambda: None), "tree") == expected
+        flat_key = cache.key("flat", CALL_PROGRAM)
+        cache.put(flat_key, parse_flat(CALL_PROGRAM))
+        assert run_flat(cache.get(flat_key)) == run(parse(CALL_PROGRAM), "tree")
+
+        # damaged entries are detected, dropped and read as misses
+        path = cache.path(key)
+        with open(path, "r+b") as file:
+            file.seek(-10, os.SEEK_END)
+            file.write(b"\0" * 10)
+        assert cache.get(key) is None and cache.corrupt == 1
+        assert not os.path.exists(path)
+        with open(path, "wb") as file:
+            file.write(b"PASCACHE")
+        assert cache.get(key) is None and cache.corrupt == 2
+
+    # least recently used entries go first
+    with tempfile.TemporaryDirectory() as directory:
+        cache = pascal.ParseCache(directory)
+        keys = [cache.key("flat", f"{CALL_PROGRAM} {{ {i} }}") for i in range(5)]
+        for i, key in enumerate(keys[:4]):
+            cache.put(key, parse_flat(CALL_PROGRAM))
+            os.utime(cache.path(key), (i, i))
+        cache.get(keys[0])
+        cache.max_bytes = 3 * os.path.getsize(cache.path(keys[0]))
+        cache.put(keys[4], parse_flat(CALL_PROGRAM))
+        exists = [os.path.exists(cache.path(key)) for key in keys]
+        assert exists == [True, False, False, True, True]
+        assert not any(name.endswith(".tmp") for name in os.listdir(directory))
+
+    text = arithmetic_program(5000)
+    with tempfile.TemporaryDirectory() as directory:
+        cache = pascal.ParseCache(directory)
+        print(f"front end of {len(text) / 1e6:.2f} MB of source")
+        for name, kind, front_end in (
+            ("objects", "checked", parse),
+            ("flat", "flat", parse_flat),
+        ):
+            key = cache.key(kind, text)
+            cold = best_of(1, cache.fetch, key, lambda: front_end(text))
+            warm = best_of(5, cache.fetch, key, lambda: front_end(text))
+            size = os.path.getsize(cache.path(key))
+            print(
+                f"  {name:<8} cold {cold:7.3f}s  cached {warm:7.3f}s"
+                f"  {cold / warm:5.1f}x  entry {size / 1e6:5.1f} MB"
+            )
+
+
+# knobs of the program bench_phases generates; --seed and --set change them
+PHASE_PROGRAM = {"seed": 0, "statements": 5000, "procedure_statements": 20}
+
+
+def bench_phases():
+    """Time each phase on a generated program. Returns the results."""
+    generator = ProgramGenerator(**PHASE_PROGRAM)
+    text = generator.generate()
+    tokens = lex(text)
+    tree = parse(text)
+    nodes = count_nodes(tree)
+    statements = generator.executed
+    expected = run(tree, "tree")
+    for engine in pascal.Interpreter.ENGINES:
+        assert run(tree, engine) == expected, engine
+    print(
+        f"program of {len(text)} bytes, {len(tokens)} tokens, {nodes} nodes,"
+        f" running {statements} statements"
+    )
+
+    phases = {}
+
+    def report(phase, seconds, count, unit):
+        phases[phase] = {"seconds": seconds, f"{unit}/s": count / seconds}
+        print(f"  {phase:<18} {seconds:8.4f}s  {count / seconds / 1e6:7.3f} M {unit}/s")
+
+    for name, lexer_class in pascal.LEXERS.items():
+        seconds = best_of(3, lambda: count_tokens(lexer_class(text)))
+        report(f"lex {name}", seconds, len(tokens), "tokens")
+    seconds = best_of(3, lambda: pascal.Parser(TokenReplay(tokens)).parse())
+    report("parse", seconds, nodes, "nodes")
+    seconds = best_of(3, lambda: analyze(tree))
+    report("analyze", seconds, nodes, "nodes")
+    for engine in pascal.Interpreter.ENGINES:
+        interpreter = pascal.Interpreter(tree, engine)
+        first = best_of(1, interpreter.interpret)
+        seconds = best_of(5, interpreter.interpret)
+        if engine != "tree":
+            phases[f"translate {engine}"] = {"seconds": first - seconds}
+        report(f"interpret {engine}", seconds, statements, "statements")
+    recompile = recompiler.SourceToSource(io.StringIO()).recompile
+    seconds = best_of(3, lambda: recompile(tree))
+    report("source to source", seconds, nodes, "nodes")
+
+    return {
+        "program": {
+            "knobs": PHASE_PROGRAM,
+            "bytes": len(text),
+            "tokens": len(tokens),
+            "nodes": nodes,
+            "statements": statements,
+        },
+        "phases": phases,
+    }
+
+
+# visits by node class profiling CALL_PROGRAM, as a visit per node counts them
+PROFILED_VISITS = {
+    "analysis": {
+        "Program": 1,
+        "Block": 4,
+        "VarDeclaration": 5,
+        "ProcedureDeclaration": 3,
+        "Compound": 4,
+        "Assignment": 7,
+        "ProcedureCall": 6,
+        "BinOp": 6,
+        "UnOp": 0,
+        "Variable": 20,
+        "Num": 8,
+        "Empty": 1,
+    },
+    "run": {
+        "Program": 1,
+        "Block": 9,
+        "VarDeclaration": 7,
+        "ProcedureDeclaration": 4,
+        "Compound": 9,
+        "Assignment": 15,
+        "ProcedureCall": 8,
+        "BinOp": 17,
+        "UnOp": 0,
+        "Variable": 32,
+        "Num": 10,
+        "Empty": 2,
+    },
+}
+
+
+def profiled_visits(profile):
+    visits = dict.fromkeys(PROFILED_VISITS["run"], 0)
+    visits.update((row["name"], row["calls"]) for row in profile.dump()["node_types"])
+    return visits
+
+
+def bench_profile():
+    tree = parse_only(CALL_PROGRAM)
+    profile = pascal.Profile()
+    pascal.SemanticAnalyzer(profile=profile).visit(tree)
+    assert profiled_visits(profile) == PROFILED_VISITS["analysis"]
+    expected = run(tree, "tree")
+    profile = pascal.Profile()
+    interpreter = pascal.Interpreter(tree, profile=profile)
+    interpreter.interpret()
+    assert interpreter.GLOBAL_MEMORY == expected
+    assert profiled_visits(profile) == PROFILED_VISITS["run"]
+    calls = {row["name"]: row["calls"] for row in profile.dump()["statements"]}
+    assert calls["b := b + q * k"] == 4 and calls["add(b, a * 2, y)"] == 1
+    # every node of an expression, however the visitors walk them
+    tree = parse(SAMPLE_PROGRAM)
+    profile = pascal.Profile()
+    pascal.Interpreter(tree, profile=profile).interpret()
+    visits = profiled_visits(profile)
+    names = ("BinOp", "UnOp", "Variable", "Num")
+    assert [visits[name] for name in names] == [9, 2, 7, 7]
+    # without a profile, visit is the plain class method
+    assert "visit" not in vars(pascal.Interpreter(tree))
+
+    tree = parse(ProgramGenerator(**PHASE_PROGRAM).generate())
+    plain = best_of(5, pascal.Interpreter(tree).interpret)
+    profile = pascal.Profile()
+    profiled = best_of(1, pascal.Interpreter(tree, profile=profile).interpret)
+    print("running a generated program")
+    print(f"  plain    {plain:8.4f}s")
+    print(f"  profiled {profiled:8.4f}s  {profiled / plain:5.1f}x")
+    print(profile.report(limit=5))
+
+
+def bench_batch():
+    count = 400
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for seed in range(count):
+            generator = ProgramGenerator(seed, statements=40, procedure_statements=5)
+            path = os.path.join(directory, f"{seed:04}.pas")
+            with open(path, "w") as file:
+                file.write(generator.generate())
+            paths.append(path)
+        expected = [pascal.run_program(path)["globals"] for path in paths]
+
+        script = pascal.__file__
+        sample = paths[:20]
+        start = time.perf_counter()
+        for path in sample:
+            subprocess.run(
+                [sys.executable, script, path], check=True, stdout=subprocess.DEVNULL
+            )
+        per_program = (time.perf_counter() - start) / len(sample)
+        print(f"{count} generated programs")
+        print(f"  main() per program {1 / per_program:8.1f} programs/s")
+
+        jobs = sorted({1, 2, os.cpu_count() or 1})
+        results = {}
+        for threads, workers, ordered in itertools.product(
+            (False, True), jobs, (True, False)
+        ):
+            start = time.perf_counter()
+            batch = pascal.run_batch(paths, workers, ordered=ordered, threads=threads)
+            batch = list(batch)
+            seconds = time.perf_counter() - start
+            batch.sort(key=lambda result: result["source"])
+            # interpreters running side by side in threads don't mix globals
+            assert [result["globals"] for result in batch] == expected
+            name = (
+                f"{workers} {'threads' if threads else 'processes'}"
+                f"{'' if ordered else ', unordered'}"
+            )
+            results[name] = count / seconds
+            print(f"  run_batch {name:<24} {count / seconds:8.1f} programs/s")
+
+        # a program running past its timeout is stopped, the others go on
+        slow = os.path.join(directory, "slow.pas")
+        with open(slow, "w") as file:
+            file.write(arithmetic_program(20000))
+        batch = list(pascal.run_batch([paths[0], slow, paths[1]], 2, timeout=0.2))
+        assert [result["status"] for result in batch] == ["ok", "timeout", "ok"]
+
+    # one interpreter running program after program
+    trees = [parse(text) for text in (SAMPLE_PROGRAM, CALL_PROGRAM)]
+    for engine in pascal.Interpreter.ENGINES:
+        interpreter = pascal.Interpreter(trees[0], engine)
+        for tree in trees + trees:
+            interpreter.reset(tree)
+            interpreter.interpret()
+            assert interpreter.GLOBAL_MEMORY == run(tree, "tree"), engine
+    return {"main programs/s": 1 / per_program, "run_batch programs/s": results}
+
+
+class WriteEachLine(pascal.NodeVisitor):
+    """SourceToSource as it was: a write per line and expressions built by +."""
+
+    def __init__(self, recompiled):
+        self.recompiled = recompiled
+
+    def visit_Program(self, program):
+        self.recompiled.write(f"program {program.name};\n")
+        self.visit(program.block)
+
+    def visit_Block(self, block):
+        for declaration in block.declarations:
+            self.visit(declaration)
+        self.visit(block.compound_statement)
+
+    def visit_VarDeclaration(self, declaration):
+        write = f"var {declaration.var_node.value} : {declaration.type_node.value};\n"
+        self.recompiled.write(write)
+
+    def visit_Compound(self, compound):
+        for statement in compound.statement_list:
+            self.visit(statement)
+
+    def visit_Assignment(self, assignment):
+        expr = self.visit(assignment.expr)
+        self.recompiled.write(f"{assignment.var.value} := {expr};\n")
+
+    def visit_BinOp(self, binop):
+        return self.visit(binop.left) + binop.op.value + self.visit(binop.right)
+
+    def visit_UnOp(self, unop):
+        return unop.op_value + self.visit(unop.expr)
+
+    def visit_Num(self, num):
+        return str(num.value)
+
+    def visit_Variable(self, var):
+        return var.value
+
+    def visit_Empty(self, empty):
+        pass
+
+
+class CountingSink:
+    """A sink that only counts what is written to it."""
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+
+class SyscallSink:
+    """A sink that, like a socket, makes a system call for every write."""
+
+    def __init__(self, path):
+        self.fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC)
+
+    def write(self, text):
+        os.write(self.fd, text.encode())
+
+    def close(self):
+        os.close(self.fd)
+
+
+def long_expression_program(statements, terms):
+    """A program whose statements each sum terms variables."""
+    expression = " + ".join("a" for _ in range(terms))
+    lines = ["PROGRAM Long;", "VAR", "   a : INTEGER;", "BEGIN", "   a := 1;"]
+    lines += [f"   a := {expression} - a;" for _ in range(statements)]
+    lines.append("   a := 1")
+    lines.append("END.")
+    return "\n".join(lines)
+
+
+def bench_output():
+    # 50 MB of output: the statements of a parsed program, repeated
+    tree = parse_only(arithmetic_program(10000))
+    statements = tree.block.compound_statement.statement_list
+    size = CountingSink()
+    recompiler.SourceToSource(size).recompile(tree)
+    statements *= 50 * 10**6 // size.size
+    programs = [("50 MB of short statements", tree)]
+    long_expressions = parse_only(long_expression_program(2000, 400))
+    programs.append(("long expressions", long_expressions))
+    # expressions are written out without recursion, however deep they are
+    deep = io.StringIO()
+    recompiler.SourceToSource(deep).recompile(
+        parse_only(long_expression_program(1, 20000))
+    )
+    assert deep.getvalue().count("a+") == 19999
+
+    results = {}
+    for name, tree in programs:
+        expected = io.StringIO()
+        WriteEachLine(expected).visit(tree)
+        expected = expected.getvalue()
+        chunked = io.StringIO()
+        recompiler.SourceToSource(chunked).recompile(tree)
+        assert chunked.getvalue() == expected
+        megabytes = len(expected) / 1e6
+        print(f"{name}, {megabytes:.1f} MB")
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "recompiled.txt")
+            for sink_name, open_sink in (
+                ("counting", CountingSink),
+                ("StringIO", io.StringIO),
+                ("file", lambda: open(path, "w")),
+                ("syscall", lambda: SyscallSink(path)),
+            ):
+                for emitter, recompile in (
+                    ("write each line", lambda sink: WriteEachLine(sink).visit(tree)),
+                    (
+                        "chunks",
+                        lambda sink: recompiler.SourceToSource(sink).recompile(tree),
+                    ),
+                ):
+
+                    def output():
+                        sink = open_sink()
+                        recompile(sink)
+                        if hasattr(sink, "close"):
+                            sink.close()
+
+                    seconds = best_of(3, output)
+                    results[f"{name}, {sink_name}, {emitter}"] = megabytes / seconds
+                    print(
+                        f"  {sink_name:<8} {emitter:<15} {seconds:7.3f}s"
+                        f"  {megabytes / seconds:6.2f} MB/s"
+                    )
+    return results
+
+
+TYPES_PROGRAM = """\
+PROGRAM Types;
+VAR
+   i, j : INTEGER;
+   x, y : REAL;
+PROCEDURE Halve(n : INTEGER; r : REAL);
+BEGIN
+   x := r / 2;
+   j := n DIV 2
+END;
+BEGIN
+   i := -7;
+   j := i DIV 2;
+   x := 3;
+   y := i / 2 + x;
+   Halve(i, i)
+END.
+"""
+
+
+def python_module(tree, directory):
+    """Translate a checked tree into a Python module and import it."""
+    path = os.path.join(directory, f"{tree.name}.py")
+    with open(path, "w") as file:
+        file.write(recompiler.SourceToPython().module(tree))
+    spec = importlib.util.spec_from_file_location(tree.name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bench_python():
+    with tempfile.TemporaryDirectory() as directory:
+        tree = parse(TYPES_PROGRAM)
+        variables = python_module(tree, directory).run()
+        assert variables == run(tree, "tree")
+        # DIV floors, and REAL variables and parameters hold floats
+        assert variables == {"i": -7, "j": -4, "x": -3.5, "y": -0.5}
+        assert [type(variables[name]) for name in "ijxy"] == [int, int, float, float]
+        try:
+            real_to_integer = parse(TYPES_PROGRAM.replace("-7", "7.5"))
+            recompiler.SourceToPython().module(real_to_integer)
+        except Exception as error:
+            assert "Type error" in str(error)
+        else:
+            raise AssertionError("a REAL was assigned to an INTEGER")
+        for text in (SAMPLE_PROGRAM, CALL_PROGRAM):
+            tree = parse(text)
+            assert python_module(tree, directory).run() == run(tree, "tree")
+
+        tree = parse(ProgramGenerator(**PHASE_PROGRAM).generate())
+        expected = run(tree, "tree")
+        start = time.perf_counter()
+        module = python_module(tree, directory)
+        translate = time.perf_counter() - start
+        assert module.run() == expected
+    print(f"running a generated program (translating and importing: {translate:.3f}s)")
+    results = {}
+    for engine in pascal.Interpreter.ENGINES:
+        interpreter = pascal.Interpreter(tree, engine)
+        interpreter.interpret()
+        results[engine] = best_of(5, interpreter.interpret)
+    results["python module"] = best_of(5, module.run)
+    for name, seconds in results.items():
+        print(
+            f"  {name:<14} {seconds:8.4f}s  {results['tree'] / seconds:6.1f}x tree"
+        )
+    return results
+
+
+class RecursiveParser(pascal.Parser):
+    """
+    Parser with the original recursive descent expr, term and factor,
+    counting operators in self.operators as `Parser.expr` does.
+    """
+
+    def expr(self):
+        self.operators = 0
+        return self.expression()
+
+    def factor(self):
+        token = self.token
+        if token.type in (pascal.INT_CONST, pascal.REAL_CONST):
+            num = self.nodes.Num(token.value, token.type)
+            self.eat(token.type)
+            return num
+        if token.type == pascal.LP:
+            self.eat(pascal.LP)
+            expr = self.expression()
+            self.eat(pascal.RP)
+            return expr
+        if token.type == pascal.PLUS or token.type == pascal.MINUS:
+            self.eat(token.type)
+            self.operators += 1
+            return self.nodes.UnOp(token, self.factor())
+        if token.type == pascal.ID:
+            return self.variable()
+
+    def term(self):
+        node = self.factor()
+        while self.token.type in (pascal.MUL, pascal.INT_DIV, pascal.REAL_DIV):
+            op = self.token
+            self.eat(op.type)
+            self.operators += 1
+            node = self.nodes.BinOp(node, op, self.factor())
+        return node
+
+    def expression(self):
+        node = self.term()
+        while self.token.type == pascal.PLUS or self.token.type == pascal.MINUS:
+            op = self.token
+            self.eat(op.type)
+            self.operators += 1
+            node = self.nodes.BinOp(node, op, self.term())
+        return node
+
+
+def expression_program(expression, statements=1):
+    lines = ["PROGRAM Expressions;", "VAR", "   a : INTEGER;", "BEGIN", "   a := 1;"]
+    lines += [f"   a := {expression};" for _ in range(statements)]
+    lines += ["   a := 1", "END."]
+    return "\n".join(lines)
+
+
+def bench_expressions():
+    # the same trees as before, for objects and FlatTrees
+    texts = [SAMPLE_PROGRAM, CALL_PROGRAM, constant_program(20)]
+    texts += [ProgramGenerator(seed).generate() for seed in range(20)]
+    texts.append(expression_program("-(a - -(+a * (a DIV -2)) / ((a)) - a * -a - 3)"))
+    for text in texts:
+        tokens = lex(text)
+        for builder in (None, pascal.FlatTree):
+            trees = []
+            for parser_class in (pascal.Parser, RecursiveParser):
+                tree = builder() if builder else None
+                root = parser_class(TokenReplay(tokens), tree).parse()
+                trees.append(pickle.dumps(tree if builder else root))
+            assert trees[0] == trees[1]
+    for text in ("a + (a", "a + * a", "(a))"):
+        try:
+            parse_only(expression_program(text))
+        except Exception as error:
+            assert "Parser error" in str(error)
+        else:
+            raise AssertionError(f"parsed {text!r}")
+
+    operands = [f"a * {k}" if k % 3 else f"-a DIV {k}" for k in range(1, 2001)]
+    programs = {
+        "long chains": expression_program(" + ".join(operands), 50),
+        "deep parentheses": expression_program("(" * 50000 + "a" + ")" * 50000),
+        "deep unary": expression_program("- " * 50000 + "a"),
+        "deep right operands": expression_program("a - (" * 20000 + "a" + ")" * 20000),
+    }
+    results = {}
+    for name, text in programs.items():
+        tokens = lex(text)
+        print(f"{name}, {len(tokens)} tokens")
+        results[name] = {}
+        for parser_name, parser_class in (
+            ("recursive", RecursiveParser),
+            ("precedence", pascal.Parser),
+        ):
+            try:
+                seconds = best_of(
+                    3, lambda: parser_class(TokenReplay(tokens)).parse()
+                )
+            except RecursionError:
+                print(f"  {parser_name:<10} RecursionError")
+                continue
+            results[name][parser_name] = len(tokens) / seconds
+            print(f"  {parser_name:<10} {len(tokens) / seconds / 1e6:7.3f} M tokens/s")
+
+    # only memory limits how deep an expression nests
+    tree = pascal.Parser(TokenReplay(lex(programs["deep unary"]))).parse()
+    node, depth = tree.block.compound_statement.statement_list[1].expr, 0
+    while isinstance(node, pascal.UnOp):
+        node, depth = node.expr, depth + 1
+    assert depth == 50000 and node.value == "a"
+    return results
+
+
+class RecursiveInterpreter(pascal.Interpreter):
+    """Interpreter with the original recursive visit_BinOp and visit_UnOp."""
+
+    def visit_expression(self, node, deep):
+        return self.visit(node)
+
+    def visit_BinOp(self, bin_op):
+        left, right = self.visit(bin_op.left), self.visit(bin_op.right)
+        return pascal.OPERATIONS[bin_op.op.type](left, right)
+
+    def visit_UnOp(self, un_op):
+        value = self.visit(un_op.expr)
+        return -value if un_op.op == pascal.MINUS else value
+
+
+class RecursiveFlatInterpreter(pascal.FlatInterpreter):
+    """FlatInterpreter with the original recursive visit_BinOp and visit_UnOp."""
+
+    def visit_expression(self, index, deep):
+        return self.visit(index)
+
+    def visit_BinOp(self, index):
+        left, right = self.visit(self.a[index]), self.visit(self.c[index])
+        return pascal.OPERATIONS[self.b[index]](left, right)
+
+    def visit_UnOp(self, index):
+        value = self.visit(self.b[index])
+        return -value if self.a[index] == pascal.MINUS else value
+
+
+class RecursiveAnalyzer(pascal.SemanticAnalyzer):
+    """SemanticAnalyzer with the original recursive visit_BinOp and visit_UnOp."""
+
+    def visit_expression(self, node, deep):
+        return self.visit(node)
+
+    def visit_BinOp(self, binop):
+        left, right = self.visit(binop.left), self.visit(binop.right)
+        return pascal.binop_type(binop.op.type, left, right)
+
+    def visit_UnOp(self, unop):
+        return self.visit(unop.expr)
+
+
+def deep_program(expression):
+    lines = ["PROGRAM Deep;", "VAR", "   a, b : INTEGER;", "BEGIN", "   a := 1;"]
+    lines += [f"   b := {expression}", "END."]
+    return "\n".join(lines)
+
+
+def bench_deep():
+    # every phase of the tree and flat pipelines, on expressions far deeper
+    # than the recursion limit
+    programs = {
+        "long chain": (" + ".join(["a"] * 100000), 100000),
+        "deep right operands": ("a - (" * 20001 + "a" + ")" * 20001, 0),
+        "deep unary": ("- " * 50001 + "a", -1),
+    }
+    for name, (expression, value) in programs.items():
+        text = deep_program(expression)
+        start = time.perf_counter()
+        tree = pascal.ConstantFolder().fold(parse(text))
+        assert run(tree, "tree")["b"] == value
+        assert run(tree, "bytecode")["b"] == value
+        assert run_flat(parse_flat(text))["b"] == value
+        output = io.StringIO()
+        recompiler.SourceToSource(output).recompile(tree)
+        assert output.getvalue().count("a") > expression.count("a")
+        print(f"  {name:<20} {time.perf_counter() - start:8.4f}s all phases")
+
+    # the same work as the recursive visitors, on ordinary expressions: runs
+    # of the two alternate, as timings on a busy machine drift
+    text = ProgramGenerator(**PHASE_PROGRAM).generate()
+    tree, flat = parse(text), parse_flat(text)
+    results = {}
+    for name, work in (
+        ("Interpreter", lambda cls: cls(tree).interpret()),
+        ("FlatInterpreter", lambda cls: cls(flat).interpret()),
+        ("SemanticAnalyzer", lambda cls: cls().visit(tree)),
+    ):
+        classes = {
+            "recursive": globals()["Recursive" + name.replace("Semantic", "")],
+            "deep-safe": getattr(pascal, name),
+        }
+        seconds = dict.fromkeys(classes, float("inf"))
+        for _ in range(15):
+            for kind, cls in classes.items():
+                seconds[kind] = min(seconds[kind], best_of(1, work, cls))
+        results[name] = seconds
+        print(
+            f"  {name:<16} recursive {seconds['recursive']:8.4f}s"
+            f"  deep-safe {seconds['deep-safe']:8.4f}s"
+            f"  {seconds['recursive'] / seconds['deep-safe']:5.2f}x"
+        )
+        # no slower than recursion, give or take the noise of the timings
+        assert seconds["deep-safe"] < 1.05 * seconds["recursive"], name
+    return results
+
+
+def bench_bytecode():
+    for text in (SAMPLE_PROGRAM, CALL_PROGRAM, call_program(5), constant_program(20)):
+        tree = parse(text)
+        assert run(tree, "bytecode") == run(tree, "tree")
+        bytecode = pascal.BytecodeCompiler().compile(tree)
+        file = io.BytesIO()
+        bytecode.dump(file)
+        file.seek(0)
+        loaded = pascal.Bytecode.load(file)
+        assert loaded.disassemble() == bytecode.disassemble()
+        memory = {}
+        loaded.run(memory)
+        assert memory == run(tree, "tree")
+    # 0.0 and -0.0 are equal, but each needs its own constant
+    text = "PROGRAM Z; VAR x, y : REAL; BEGIN x := 0.0; y := -0.0 * 1.0 END."
+    memory = run(pascal.ConstantFolder().fold(parse(text)), "bytecode")
+    assert math.copysign(1.0, memory["y"]) == -1.0, memory
+
+    programs = {
+        "arithmetic": arithmetic_program(5000),
+        "calls": call_program(14),
+        "generated": ProgramGenerator(**PHASE_PROGRAM).generate(),
+    }
+    results = {}
+    for name, text in programs.items():
+        tree = parse(text)
+        start = time.perf_counter()
+        bytecode = pascal.BytecodeCompiler().compile(tree)
+        compiling = time.perf_counter() - start
+        size = len(bytecode.code) * bytecode.code.itemsize
+        print(
+            f"{name}: {count_nodes(tree)} nodes, {size / 1e3:.1f} kB of code,"
+            f" compiled in {compiling:.4f}s"
+        )
+        interpreters = {
+            engine: pascal.Interpreter(tree, engine) for engine in ("tree", "bytecode")
+        }
+        seconds = {engine: [] for engine in interpreters}
+        # alternate the engines so that both see the same machine load
+        for _ in range(11):
+            for engine, interpreter in interpreters.items():
+                seconds[engine].append(best_of(1, interpreter.interpret))
+        results[name] = {engine: min(times) for engine, times in seconds.items()}
+        tree_seconds, bytecode_seconds = results[name].values()
+        print(
+            f"  tree {tree_seconds:8.4f}s  bytecode {bytecode_seconds:8.4f}s"
+            f"  {tree_seconds / bytecode_seconds:5.2f}x"
+        )
+        # the dispatch loop must beat walking the tree by a clear margin
+        assert 1.1 * bytecode_seconds < tree_seconds, name
+    return results
+
+
+def load_bytecode(path):
+    with open(path, "rb") as file:
+        return pascal.Bytecode.load(file)
+
+
+def bench_load():
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "program.pbc")
+        for text in (SAMPLE_PROGRAM, CALL_PROGRAM, constant_program(20)):
+            tree = parse(text)
+            with open(path, "wb") as file:
+                pascal.BytecodeCompiler().compile(tree).dump(file)
+            memory = {}
+            load_bytecode(path).run(memory)
+            assert memory == run(tree, "tree")
+            assert pascal.Bytecode.load(io.BytesIO(open(path, "rb").read()))
+        # damaged files are refused
+        with open(path, "r+b") as file:
+            file.truncate(os.path.getsize(path) - 1)
+        for data in (b"", b"PASCACHE", open(path, "rb").read()):
+            try:
+                pascal.Bytecode.load(io.BytesIO(data))
+            except ValueError:
+                pass
+            else:
+                raise AssertionError(f"loaded {data[:8]!r}")
+
+        text = ProgramGenerator(**PHASE_PROGRAM).generate()
+        source_path = os.path.join(directory, "program.pas")
+        with open(source_path, "w") as file:
+            file.write(text)
+        cache = pascal.ParseCache(os.path.join(directory, "cache"))
+        key = cache.file_key("checked", source_path)
+        cache.put(key, parse(text))
+
+        def front_end():
+            with open(source_path) as file:
+                return pascal.BytecodeCompiler().compile(parse(file.read()))
+
+        with open(path, "wb") as file:
+            front_end().dump(file)
+        print(
+            f"starting a {len(text) / 1e6:.2f} MB program,"
+            f" compiled to {os.path.getsize(path) / 1e6:.2f} MB"
+        )
+        def first_run():
+            load_bytecode(path).run({})  # a fresh load, so the code is copied
+
+        results = {
+            "front end": best_of(3, front_end),
+            "cached tree": best_of(3, cache.get, key),
+            "compiled file": best_of(3, load_bytecode, path),
+            "load and run": best_of(3, first_run),
+        }
+        for name, seconds in results.items():
+            print(
+                f"  {name:<14} {seconds:8.4f}s"
+                f"  {results['front end'] / seconds:7.1f}x front end"
+            )
+        memory = {}
+        load_bytecode(path).run(memory)
+        assert memory == run(parse(text), "tree")
+    return results
+
+
+def specialize(text):
+    tree = pascal.ConstantFolder().fold(parse(text))
+    return pascal.TypeSpecializer().specialize(tree)
+
+
+def bench_types():
+    for text in ("   a := y", "   a := a / 2", "   P(y)", "   y := 7.5 DIV 2"):
+        lines = [
+            "PROGRAM T;",
+            "VAR a : INTEGER; y : REAL;",
+            "PROCEDURE P(n : INTEGER);",
+        ]
+        lines += ["BEGIN END;", "BEGIN", "   a := 1; y := 1;", text, "END."]
+        try:
+            parse("\n".join(lines))
+        except Exception as error:
+            assert "Type error" in str(error), error
+        else:
+            raise AssertionError(f"checked {text!r}")
+    for text in (SAMPLE_PROGRAM, CALL_PROGRAM, constant_program(20), mixed_program(20)):
+        expected = run(parse(text), "tree")
+        for engine in ("tree", "closure"):
+            memory = run(specialize(text), engine)
+            assert memory == expected, engine
+            # REAL variables hold floats, even when assigned an INTEGER
+            assert isinstance(memory["x" if "x" in memory else "y"], float)
+
+    programs = {
+        "mixed": mixed_program(3000),
+        "generated": ProgramGenerator(**PHASE_PROGRAM).generate(),
+    }
+    results = {}
+    for name, text in programs.items():
+        trees = {
+            "BinOp": pascal.ConstantFolder().fold(parse(text)),
+            "TypedBinOp": specialize(text),
+        }
+        for engine in ("tree", "closure"):
+            interpreters = {
+                kind: pascal.Interpreter(tree, engine) for kind, tree in trees.items()
+            }
+            seconds = {kind: [] for kind in interpreters}
+            for _ in range(7):
+                for kind, interpreter in interpreters.items():
+                    seconds[kind].append(best_of(1, interpreter.interpret))
+            best = {kind: min(times) for kind, times in seconds.items()}
+            results[name, engine] = best
+            plain, typed = best.values()
+            print(
+                f"  {name:<10} {engine:<8} BinOp {plain:8.4f}s"
+                f"  TypedBinOp {typed:8.4f}s  {plain / typed:5.2f}x"
+            )
+        # the closure engine fuses typed operations with their constant and
+        # variable operands
+        plain, typed = results[name, "closure"].values()
+        assert typed < plain, (name, plain, typed)
+    return results
+
+
+BENCHMARKS = {
+    "lexer": bench_lexer,
+    "engines": bench_engines,
+    "dispatch": bench_dispatch,
+    "memory": bench_memory,
+    "flat": bench_flat,
+    "fold": bench_fold,
+    "analysis": bench_analysis,
+    "calls": bench_calls,
+    "cache": bench_cache,
+    "phases": bench_phases,
+    "profile": bench_profile,
+    "batch": bench_batch,
+    "output": bench_output,
+    "python": bench_python,
+    "expressions": bench_expressions,
+    "deep": bench_deep,
+    "bytecode": bench_bytecode,
+    "load": bench_load,
+    "types": bench_types,
+}
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Pascal interpreter benchmarks")
+    arg_parser.add_argument(
+        "names", nargs="*", metavar="name", help=f"any of {', '.join(BENCHMARKS)}"
+    )
+    arg_parser.add_argument("--json", help="save the benchmarks' results here")
+    arg_parser.add_argument("--seed", type=int, help="seed of the generated program")
+    arg_parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KNOB=N",
+        help="set a ProgramGenerator knob of the generated program",
+    )
+    args = arg_parser.parse_args()
+    for name in args.names:
+        if name not in BENCHMARKS:
+            arg_parser.error(f"unknown benchmark {name!r}")
+    if args.seed is not None:
+        PHASE_PROGRAM["seed"] = args.seed
+    for setting in args.set:
+        knob, _, value = setting.partition("=")
+        PHASE_PROGRAM[knob] = int(value)
+
+    results = {}
+    for name in args.names or BENCHMARKS:
+        print(f"== {name}")
+        result = BENCHMARKS[name]()
+        if result is not None:
+            results[name] = result
+
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(
+                {
+                    "python": platform.python_version(),
+                    "implementation": platform.python_implementation(),
+                    "machine": platform.machine(),
+                    "benchmarks": results,
+                },
+                file,
+                indent=2,
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -14,8 +14,10 @@
 # statement_list : statement |
 # 				 statement SEMI statement_list
 # statement : compound_statement
+# 			| proccall_statement
 # 			| assignment_statement
 # 			| empty
+# proccall_statement : ID (LP (expr (COMMA expr)*)? RP)?
 # assignment_statement : variable ASSIGN expr
 # empty :
 # expr : term ((PLUS | MINUS) term)*
@@ -26,7 +28,21 @@
 # 		 | LP expr RP
 # 		 | variable
 # variable: ID
-from collections import OrderedDict
+import codecs
+import hashlib
+import mmap
+import operator
+import os
+import pickle
+import re
+import signal
+import struct
+import sys
+import tempfile
+import threading
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 
 #############################################
 # 					Tokens					#
@@ -34,6 +50,8 @@ from collections import OrderedDict
 
 
 class Token:
+    __slots__ = ("type", "value")
+
     def __init__(self, type, value):
         self.type = type
         self.value = value
@@ -46,36 +64,63 @@ class Token:
             Token(PLUS, '+')
             Token(MUL, '*')
         """
-        return f"Token({self.type}, {repr(self.value)})"
+        return f"Token({TOKEN_NAMES[self.type]}, {repr(self.value)})"
 
     def __repr__(self):
         return self.__str__()
 
 
-# token types
-INTEGER = "INTEGER"
-REAL = "REAL"
-INT_CONST = "INT_CONST"
-REAL_CONST = "REAL_CONST"
-PLUS = "PLUS"
-MINUS = "MINUS"
-MUL = "MUL"
-INT_DIV = "INT_DIV"
-REAL_DIV = "REAL_DIV"
-LP = "LP"
-RP = "RP"
-BEGIN = "BEGIN"
-END = "END"
-COMMA = "COMMA"
-COLON = "COLON"
-DOT = "DOT"
-ID = "ID"
-ASSIGN = "ASSIGN"
-SEMI = "SEMI"
-PROGRAM = "PROGRAM"
-VAR = "VAR"
-PROCEDURE = "PROCEDURE"
-EOS = "EOS"
+# token types are small ints; TOKEN_NAMES maps them back to their names
+TOKEN_NAMES = (
+    "INTEGER",
+    "REAL",
+    "INT_CONST",
+    "REAL_CONST",
+    "PLUS",
+    "MINUS",
+    "MUL",
+    "INT_DIV",
+    "REAL_DIV",
+    "LP",
+    "RP",
+    "BEGIN",
+    "END",
+    "COMMA",
+    "COLON",
+    "DOT",
+    "ID",
+    "ASSIGN",
+    "SEMI",
+    "PROGRAM",
+    "VAR",
+    "PROCEDURE",
+    "EOS",
+)
+(
+    INTEGER,
+    REAL,
+    INT_CONST,
+    REAL_CONST,
+    PLUS,
+    MINUS,
+    MUL,
+    INT_DIV,
+    REAL_DIV,
+    LP,
+    RP,
+    BEGIN,
+    END,
+    COMMA,
+    COLON,
+    DOT,
+    ID,
+    ASSIGN,
+    SEMI,
+    PROGRAM,
+    VAR,
+    PROCEDURE,
+    EOS,
+) = range(len(TOKEN_NAMES))
 
 RESERVED_KEYWORDS = {
     "BEGIN": Token(BEGIN, "BEGIN"),
@@ -98,7 +143,7 @@ class Lexer:
         self.text = text
         self.pos = 0
         self.max_len = len(text)
-        self.ch = text[0]
+        self.ch = text[0] if text else None
 
     def advance(self):
         self.pos += 1
@@ -226,26 +271,256 @@ class Lexer:
             return self.get_token()
 
 
+# leading whitespace and unnested comments are absorbed by each match; the
+# alternatives are tried in order at the first character after them. Nested
+# comments fall through to COMMENT and are skipped by `skip_comment`.
+TOKEN_PATTERN = re.compile(
+    r"""
+    \s*(?:\{[^{}]*\}\s*)*
+    (?:
+        (?P<SYMBOL>[-+*/(),.;]|:(?!=))
+        |(?P<REAL_CONST>\d+\.\d+)
+        |(?P<INT_CONST>\d+)
+        |(?P<ID>_?[^\W_]+|_\Z)
+        |(?P<ASSIGN>:=)
+        |(?P<COMMENT>\{)
+    )
+    """,
+    re.VERBOSE,
+)
+BRACE_PATTERN = re.compile(r"[{}]")
+SKIP_PATTERN = re.compile(r"\s*(?:\{[^{}]*\}\s*)*")
+TRAILING_PATTERN = re.compile(SKIP_PATTERN.pattern + r"\Z")
+
+SYMBOL_TOKENS = {
+    "+": Token(PLUS, "+"),
+    "-": Token(MINUS, "-"),
+    "*": Token(MUL, "*"),
+    "/": Token(REAL_DIV, "/"),
+    "(": Token(LP, "("),
+    ")": Token(RP, ")"),
+    ",": Token(COMMA, ","),
+    ".": Token(DOT, "."),
+    ":": Token(COLON, ":"),
+    ";": Token(SEMI, ";"),
+}
+ASSIGN_TOKEN = Token(ASSIGN, ":=")
+
+
+def id_token(lexeme):
+    id = lexeme.upper()
+    return RESERVED_KEYWORDS.get(id) or Token(ID, id.lower())
+
+
+# a new token for the lexeme of each TOKEN_PATTERN group, by group number
+TOKEN_MAKERS = (
+    None,
+    SYMBOL_TOKENS.__getitem__,
+    lambda lexeme: Token(REAL_CONST, float(lexeme)),
+    lambda lexeme: Token(INT_CONST, int(lexeme)),
+    id_token,
+    lambda lexeme: ASSIGN_TOKEN,
+)
+ID_GROUP = TOKEN_PATTERN.groupindex["ID"]
+COMMENT_GROUP = TOKEN_PATTERN.groupindex["COMMENT"]
+
+
+class RegexLexer:
+    """
+    Drop-in replacement for `Lexer` that scans the whole buffer with
+    `TOKEN_PATTERN` instead of walking it one character at a time.
+    Produces the same token stream as `Lexer` for valid programs.
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self.get_token = self.scan().__next__
+
+    def error(self):
+        raise Exception("Lexer error.")
+
+    def read(self):
+        """Return the next chunk of source text, or "" once it is exhausted."""
+        return ""
+
+    def skip_comment(self, text, pos):
+        """
+        Skip the comment whose `{` ends at pos, reading more source if the
+        comment runs past the end of text.
+        Returns the text and position just past the closing `}`.
+        """
+        depth = 1
+        search = BRACE_PATTERN.search
+        while depth:
+            brace = search(text, pos)
+            if brace is None:
+                text = self.read()
+                pos = 0
+                if not text:
+                    raise Exception("Unclosed comment.")
+                continue
+            depth += 1 if brace.group() == "{" else -1
+            pos = brace.end()
+        return text, pos
+
+    def scan(self):
+        # the text is all there, so each match is a whole token: a scanner
+        # matches from where its last match ended, up to a nested comment.
+        # Every occurrence of a lexeme gets the same token.
+        text, makers = self.text, TOKEN_MAKERS
+        tokens = {}
+        get = tokens.get
+        pos = 0
+        while True:
+            m = None
+            for m in iter(TOKEN_PATTERN.scanner(text, pos).match, None):
+                index = m.lastindex
+                lexeme = m[index]
+                token = get(lexeme)
+                if token is None:
+                    if index == COMMENT_GROUP:
+                        break
+                    token = tokens[lexeme] = makers[index](lexeme)
+                yield token
+            else:
+                if m is not None:
+                    pos = m.end()
+                break
+            text, pos = self.skip_comment(text, m.end())
+        if TRAILING_PATTERN.match(text, pos) is None:
+            self.error()
+
+        while True:
+            yield Token(EOS, None)
+
+
+def iter_chunks(source, chunk_size=1 << 16, encoding="utf-8"):
+    """
+    Yield the text of source in non-empty chunks.
+    source can be a str, a file object or mmap (anything with `read`), or an
+    iterable of str or bytes chunks. Bytes are decoded incrementally, so a
+    multi-byte character may be split across chunks.
+    """
+    if isinstance(source, str):
+        chunks = [source]
+    elif hasattr(source, "read"):
+        chunks = iter(lambda: source.read(chunk_size), source.read(0))
+    else:
+        chunks = source
+
+    decoder = codecs.getincrementaldecoder(encoding)()
+    for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray, memoryview)):
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    tail = decoder.decode(b"", final=True)
+    if tail:
+        yield tail
+
+
+class StreamLexer(RegexLexer):
+    """
+    `RegexLexer` that pulls its source a chunk at a time (see `iter_chunks`),
+    so only the current chunk and any token or comment crossing into the next
+    one are held in memory.
+    """
+
+    def __init__(self, source, chunk_size=1 << 16, encoding="utf-8"):
+        self.chunks = iter_chunks(source, chunk_size, encoding)
+        super().__init__("")
+
+    def read(self):
+        return next(self.chunks, "")
+
+    def scan(self):
+        text = self.text
+        match, skip, makers = TOKEN_PATTERN.match, SKIP_PATTERN.match, TOKEN_MAKERS
+        # identifiers only: the numbers of an endless stream are endless
+        ids = {}
+        pos = 0
+        # a match ending past limit may still grow with the next chunk
+        # (`12.` + `5`, `:` + `=`, identifiers and whitespace)
+        limit = len(text) - 2
+        exhausted = False
+        while True:
+            m = match(text, pos)
+            if m is None:
+                # past whitespace and comments, no more source can turn two
+                # characters that match nothing into a token
+                pos = skip(text, pos).end()
+                if len(text) - pos >= 2:
+                    self.error()
+            if m is None or m.end() > limit:
+                if not exhausted:
+                    chunk = self.read()
+                    if chunk:
+                        text = text[pos:] + chunk
+                        pos = 0
+                        limit = len(text) - 2
+                    else:
+                        exhausted = True
+                    continue
+                if m is None:
+                    if TRAILING_PATTERN.match(text, pos) is None:
+                        self.error()
+                    break
+            pos = m.end()
+            index = m.lastindex
+            if index == ID_GROUP:
+                lexeme = m[index]
+                token = ids.get(lexeme)
+                if token is None:
+                    token = ids[lexeme] = id_token(lexeme)
+                yield token
+            elif index == COMMENT_GROUP:
+                text, pos = self.skip_comment(text, pos)
+                limit = len(text) - 2
+            else:
+                yield makers[index](m[index])
+
+        while True:
+            yield Token(EOS, None)
+
+
+def map_file(file):
+    """Memory-map an open binary file, or return it as is if it can't be mapped."""
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (ValueError, OSError):  # empty files, pipes
+        return file
+
+
+LEXERS = {"scan": Lexer, "regex": RegexLexer, "stream": StreamLexer}
+
+
 #############################################
 # 					 AST					#
 #############################################
 class AST:
-    pass
+    __slots__ = ()
 
 
 class Program(AST):
+    __slots__ = ("name", "block", "scope")
+
     def __init__(self, name, block):
         self.name = name
         self.block = block
+        self.scope = None  # global ScopedSymbolTable, set by SemanticAnalyzer
 
 
 class Block(AST):
+    __slots__ = ("declarations", "compound_statement")
+
     def __init__(self, declarations, compound_statement):
         self.declarations = declarations
         self.compound_statement = compound_statement
 
 
 class VarDeclaration(AST):
+    __slots__ = ("var_node", "type_node")
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
@@ -258,23 +533,33 @@ class VarDeclaration(AST):
 
 
 class ProcedureDeclaration(AST):
+    __slots__ = ("name", "params", "block", "scope")
+
     def __init__(self, name, params, block):
         self.name = name
         self.params = params  # list of param nodes
         self.block = block
+        self.scope = None  # set by SemanticAnalyzer
 
 
 class Param(AST):
+    __slots__ = ("var_node", "type_node")
+
     def __init__(self, var_node, type_node):
         self.var_node = var_node
         self.type_node = type_node
 
 
 class Type(AST):
+    __slots__ = ("value",)
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
 
+    @property
+    def token(self):
+        return RESERVED_KEYWORDS[self.value]
+
     def __str__(self):
         return f"Variable (token: {self.token}, value: {self.value})"
 
@@ -283,16 +568,20 @@ class Type(AST):
 
 
 class Compound(AST):
+    __slots__ = ("statement_list",)
+
     def __init__(self, statement_list):
         self.statement_list = statement_list
-        param_nodes = []
 
 
 class Assignment(AST):
-    def __init__(self, var, op, expr):
+    __slots__ = ("var", "op", "expr", "deep")
+
+    def __init__(self, var, op, expr, deep=False):
         self.var = var
         self.op = op  # why is this needed?
         self.expr = expr
+        self.deep = deep  # whether expr is too deep to visit by recursion
 
     def __str__(self):
         return f"Assignment(var: {self.var}, op: {self.op}, expr: {self.expr})"
@@ -301,20 +590,43 @@ class Assignment(AST):
         return self.__str__()
 
 
+class ProcedureCall(AST):
+    __slots__ = ("name", "actual_params", "procedure", "deep")
+
+    def __init__(self, name, actual_params, deep=False):
+        self.name = name
+        self.actual_params = actual_params  # list of expr nodes
+        self.procedure = None  # called ProcedureDeclaration, set by SemanticAnalyzer
+        self.deep = deep  # whether an actual param is too deep for recursion
+
+    def __str__(self):
+        return f"ProcedureCall (name: {self.name}, params: {self.actual_params})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class UnOp(AST):
+    __slots__ = ("op", "expr")
+
     def __init__(self, op, expr):
         self.op = op.type
-        self.op_value = op.value
         self.expr = expr
 
+    @property
+    def op_value(self):
+        return "+" if self.op == PLUS else "-"
+
     def __str__(self):
-        return f"Variable (op: {self.op}, expr: {self.expr})"
+        return f"Variable (op: {TOKEN_NAMES[self.op]}, expr: {self.expr})"
 
     def __repr__(self):
         return self.__str__()
 
 
 class BinOp(AST):
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left, op, right):
         self.left = left
         self.op = op
@@ -327,22 +639,60 @@ class BinOp(AST):
         return self.__str__()
 
 
+class TypedBinOp(AST):
+    """
+    A BinOp that `TypeSpecializer` has specialized for its operator and
+    result type: kind names the specialization (IntAdd, RealMul, ... see
+    TYPED_BINOPS) and operation is the Python function computing it. The
+    one-operand kinds, IntNeg, RealNeg and IntToReal, multiply by a constant
+    right operand. A single class for every kind keeps evaluating them to
+    one class test, and CPython's attribute caches on them warm.
+    `ClosureCompiler` compiles each into one closure applying operation, its
+    constant and variable operands read in that closure.
+    """
+
+    __slots__ = ("kind", "left", "operation", "right")
+
+    def __init__(self, kind, left, operation, right):
+        self.kind = kind
+        self.left = left
+        self.operation = operation
+        self.right = right
+
+    def __str__(self):
+        return f"{self.kind} (left: {self.left}, right: {self.right})"
+
+    def __repr__(self):
+        return self.__str__()
+
+
 class Num(AST):
+    __slots__ = ("value", "type")
+
     def __init__(self, value, type):
         self.value = value
         self.type = type
 
     def __str__(self):
-        return f"Num (value: {self.value}; type: {self.type})"
+        return f"Num (value: {self.value}; type: {TOKEN_NAMES[self.type]})"
 
     def __repr__(self):
         return self.__str__()
 
 
 class Variable(AST):
+    __slots__ = ("value", "depth", "slot")
+
     def __init__(self, token):
-        self.token = token
         self.value = token.value
+        # set by SemanticAnalyzer: index of the variable's frame in the
+        # interpreter's display (0 is global) and of its slot in that frame
+        self.depth = None
+        self.slot = None
+
+    @property
+    def token(self):
+        return Token(ID, self.value)
 
     def __str__(self):
         return f"Variable (token: {self.token}, name: {self.value})"
@@ -352,22 +702,221 @@ class Variable(AST):
 
 
 class Empty(AST):
-    pass
+    __slots__ = ()
+
+
+#############################################
+# 				  Flat AST					#
+#############################################
+
+# node kinds of a FlatTree, named after the matching AST classes
+NODE_KINDS = (
+    "Program",
+    "Block",
+    "VarDeclaration",
+    "ProcedureDeclaration",
+    "Param",
+    "Type",
+    "Compound",
+    "Assignment",
+    "ProcedureCall",
+    "UnOp",
+    "BinOp",
+    "Num",
+    "Variable",
+    "Empty",
+)
+(
+    PROGRAM_NODE,
+    BLOCK_NODE,
+    VAR_DECLARATION_NODE,
+    PROCEDURE_DECLARATION_NODE,
+    PARAM_NODE,
+    TYPE_NODE,
+    COMPOUND_NODE,
+    ASSIGNMENT_NODE,
+    PROCEDURE_CALL_NODE,
+    UNOP_NODE,
+    BINOP_NODE,
+    NUM_NODE,
+    VARIABLE_NODE,
+    EMPTY_NODE,
+) = range(len(NODE_KINDS))
+
+
+class FlatTree:
+    """
+    A whole program's AST stored in parallel typed arrays instead of linked
+    node objects, so a large program costs a few arrays rather than one
+    Python object per node.
+
+    Node i has kind kinds[i] and operands a[i], b[i] and c[i]. Names are
+    indices into names, numbers indices into constants, and lists of nodes
+    runs of children. Operands by kind:
+        Program               name, block
+        Block                 declarations start, count, compound statement
+        VarDeclaration        variable, type
+        ProcedureDeclaration  name, start of params followed by block, count
+        Param                 variable, type
+        Type                  name
+        Compound              statements start, count
+        Assignment            variable, expr, deep
+        ProcedureCall         name, start of args followed by the called
+                              ProcedureDeclaration and deep, count
+        UnOp                  operator token type, expr
+        BinOp                 left, operator token type, right
+        Num                   constant, token type
+        Variable              name, depth, slot
+        Empty                 -
+
+    Its methods mirror the AST classes, so a FlatTree is built by passing it
+    to `Parser` as the builder. `FlatSemanticAnalyzer` fills in the called
+    procedures and variable depths and slots, and puts the symbol tables of
+    the Program and ProcedureDeclaration nodes in scopes by node index.
+    """
+
+    def __init__(self):
+        self.kinds = array("B")
+        self.a = array("i")
+        self.b = array("i")
+        self.c = array("i")
+        self.children = array("i")
+        self.names = []
+        self.name_indices = {}
+        self.constants = []
+        self.constant_indices = {}
+        self.scopes = {}
+        self.root = None
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, a=0, b=0, c=0):
+        self.kinds.append(kind)
+        self.a.append(a)
+        self.b.append(b)
+        self.c.append(c)
+        return len(self.kinds) - 1
+
+    def name(self, name):
+        index = self.name_indices.get(name)
+        if index is None:
+            index = self.name_indices[name] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def constant(self, value, type):
+        key = (type, value)
+        index = self.constant_indices.get(key)
+        if index is None:
+            index = self.constant_indices[key] = len(self.constants)
+            self.constants.append(value)
+        return index
+
+    def run(self, nodes):
+        start = len(self.children)
+        self.children.extend(nodes)
+        return start
+
+    def child_nodes(self, start, count):
+        return self.children[start : start + count]
+
+    # builder methods, one per AST class
+
+    def Program(self, name, block):
+        self.root = self.add(PROGRAM_NODE, self.name(name), block)
+        return self.root
+
+    def Block(self, declarations, compound_statement):
+        start = self.run(declarations)
+        return self.add(BLOCK_NODE, start, len(declarations), compound_statement)
+
+    def VarDeclaration(self, var_node, type_node):
+        return self.add(VAR_DECLARATION_NODE, var_node, type_node)
+
+    def ProcedureDeclaration(self, name, params, block):
+        start = self.run(params + [block])
+        name = self.name(name)
+        return self.add(PROCEDURE_DECLARATION_NODE, name, start, len(params))
+
+    def Param(self, var_node, type_node):
+        return self.add(PARAM_NODE, var_node, type_node)
+
+    def Type(self, token):
+        return self.add(TYPE_NODE, self.name(token.value))
+
+    def Compound(self, statement_list):
+        start = self.run(statement_list)
+        return self.add(COMPOUND_NODE, start, len(statement_list))
+
+    def Assignment(self, var, op, expr, deep=False):
+        return self.add(ASSIGNMENT_NODE, var, expr, deep)
+
+    def ProcedureCall(self, name, actual_params, deep=False):
+        start = self.run(actual_params + [-1, deep])
+        name = self.name(name)
+        return self.add(PROCEDURE_CALL_NODE, name, start, len(actual_params))
+
+    def UnOp(self, op, expr):
+        return self.add(UNOP_NODE, op.type, expr)
+
+    def BinOp(self, left, op, right):
+        return self.add(BINOP_NODE, left, op.type, right)
+
+    def Num(self, value, type):
+        return self.add(NUM_NODE, self.constant(value, type), type)
+
+    def Variable(self, token):
+        return self.add(VARIABLE_NODE, self.name(token.value))
+
+    def Empty(self):
+        return self.add(EMPTY_NODE)
 
 
 #############################################
 # 					Parser					#
 #############################################
 
+# visitors walk the expressions of a statement with more operators than
+# this by `NodeVisitor.postorder` instead of by recursion
+EXPRESSION_DEPTH = 100
+
+
+class TreeBuilder:
+    """The node constructors `Parser` builds its tree with."""
+
+    Program = Program
+    Block = Block
+    VarDeclaration = VarDeclaration
+    ProcedureDeclaration = ProcedureDeclaration
+    Param = Param
+    Type = Type
+    Compound = Compound
+    Assignment = Assignment
+    ProcedureCall = ProcedureCall
+    UnOp = UnOp
+    BinOp = BinOp
+    Num = Num
+    Variable = Variable
+    Empty = Empty
+
 
 class Parser:
-    def __init__(self, lexer):
+    """
+    builder supplies the node constructors, `TreeBuilder` by default. Pass a
+    `FlatTree` to get the program as parallel arrays instead; `parse` then
+    returns the index of its root node.
+    """
+
+    def __init__(self, lexer, builder=None):
         self.lexer = lexer
+        self.nodes = builder if builder is not None else TreeBuilder
         self.token = lexer.get_token()
 
     def error(self, type=None):
+        expected = TOKEN_NAMES[type] if type is not None else None
         raise Exception(
-            f"Parser error. Expected type {type} but got Token: {self.token}"
+            f"Parser error. Expected type {expected} but got Token: {self.token}"
         )
 
     def eat(self, type):
@@ -379,11 +928,11 @@ class Parser:
     def program(self):
         """program : PROGRAM variable SEMI block DOT"""
         self.eat(PROGRAM)
-        var = self.variable()
-        program_name = var.value
+        program_name = self.token.value
+        self.eat(ID)
         self.eat(SEMI)
         block = self.block()
-        program = Program(program_name, block)
+        program = self.nodes.Program(program_name, block)
 
         self.eat(DOT)
         return program
@@ -394,7 +943,7 @@ class Parser:
         """
         declarations = self.declarations()
         statement = self.compound_statement()
-        return Block(declarations, statement)
+        return self.nodes.Block(declarations, statement)
 
     def declarations(self):
         """
@@ -425,7 +974,9 @@ class Parser:
 
                 self.eat(SEMI)
                 block = self.block()
-                declarations.append(ProcedureDeclaration(procedure_name, params, block))
+                declarations.append(
+                    self.nodes.ProcedureDeclaration(procedure_name, params, block)
+                )
                 self.eat(SEMI)
 
             else:
@@ -438,15 +989,15 @@ class Parser:
         variable_declaration : ID ((COMMA ID)* COLON
             type_spec)
         """
-        variables = [Variable(self.token)]
+        variables = [self.nodes.Variable(self.token)]
         self.eat(ID)
         while self.token.type == COMMA:
             self.eat(COMMA)
-            variables.append(Variable(self.token))
+            variables.append(self.nodes.Variable(self.token))
             self.eat(ID)
         self.eat(COLON)
         type = self.type_spec()
-        return [VarDeclaration(variable, type) for variable in variables]
+        return [self.nodes.VarDeclaration(variable, type) for variable in variables]
 
     def type_spec(self):
         """
@@ -456,10 +1007,10 @@ class Parser:
         token = self.token
         if token.type == INTEGER:
             self.eat(INTEGER)
-            return Type(token)
+            return self.nodes.Type(token)
         if token.type == REAL:
             self.eat(REAL)
-            return Type(token)
+            return self.nodes.Type(token)
 
     def formal_parameter_list(self):
         """
@@ -471,7 +1022,7 @@ class Parser:
             return []
 
         param_list = self.formal_parameters()
-        if self.token == SEMI:
+        while self.token.type == SEMI:
             self.eat(SEMI)
             param_list.extend(self.formal_parameters())
 
@@ -489,7 +1040,10 @@ class Parser:
             self.eat(ID)
         self.eat(COLON)
         param_type = self.type_spec()
-        param_list = [Param(Variable(var), param_type) for var in param_tokens]
+        param_list = [
+            self.nodes.Param(self.nodes.Variable(var), param_type)
+            for var in param_tokens
+        ]
 
         return param_list
 
@@ -499,7 +1053,7 @@ class Parser:
         """
         self.eat(BEGIN)
         statements = self.statement_list()
-        root = Compound(statements)
+        root = self.nodes.Compound(statements)
         self.eat(END)
         return root
 
@@ -517,28 +1071,54 @@ class Parser:
     def statement(self):
         """
         statement : compound_statement
+                  | proccall_statement
                   | assignment_statement
                   | empty
         """
         if self.token.type == ID:
-            return self.assigment_statement()
+            token = self.token
+            self.eat(ID)
+            if self.token.type == ASSIGN:
+                return self.assigment_statement(token)
+            return self.proccall_statement(token)
         elif self.token.type == BEGIN:
             return self.compound_statement()
         else:
             return self.empty()
 
-    def assigment_statement(self):
+    def proccall_statement(self, token):
+        """
+        proccall_statement : ID (LP (expr (COMMA expr)*)? RP)?
+        token is the already eaten ID.
+        """
+        actual_params = []
+        deep = False
+        if self.token.type == LP:
+            self.eat(LP)
+            if self.token.type != RP:
+                actual_params.append(self.expr())
+                deep = self.operators > EXPRESSION_DEPTH
+                while self.token.type == COMMA:
+                    self.eat(COMMA)
+                    actual_params.append(self.expr())
+                    deep = deep or self.operators > EXPRESSION_DEPTH
+            self.eat(RP)
+        return self.nodes.ProcedureCall(token.value, actual_params, deep)
+
+    def assigment_statement(self, token):
         """
         assignment_statement : variable ASSIGN expr
+        token is the variable's already eaten ID.
         """
-        var = self.variable()
+        var = self.nodes.Variable(token)
         op = self.token
         self.eat(ASSIGN)
         expr = self.expr()
-        return Assignment(var, op, expr)
+        deep = self.operators > EXPRESSION_DEPTH
+        return self.nodes.Assignment(var, op, expr, deep)
 
     def empty(self):
-        return Empty()
+        return self.nodes.Empty()
 
     def variable(self):
         """
@@ -546,55 +1126,86 @@ class Parser:
         """
         var = self.token
         self.eat(ID)
-        return Variable(var)
+        return self.nodes.Variable(var)
+
+    # binding power of the binary operators, and of unary + and -; other
+    # tokens end an operand, and an open parenthesis waits for its RP
+    PRECEDENCE = {PLUS: 1, MINUS: 1, MUL: 2, INT_DIV: 2, REAL_DIV: 2}
+    UNARY = 3
+    OPEN_PAREN = (-1, None, None)
 
-    def factor(self):
+    def expr(self):
         """
+        expr : term ((PLUS | MINUS) term)*
+        term : factor ((MUL | INT_DIV | REAL_DIV) factor)*
         factor : (PLUS | MINUS)factor
                | INT_CONST
                | REAL_CONST
                | LP expr RP
                | variable
-        """
-        token = self.token
-        if token.type in (INT_CONST, REAL_CONST):
-            num = Num(token.value, token.type)
-            self.eat(token.type)
-            return num
-        if token.type == LP:
-            self.eat(LP)
-            expr = self.expr()
-            self.eat(RP)
-            return expr
-        if token.type == PLUS or token.type == MINUS:
-            self.eat(token.type)
-            return UnOp(token, self.factor())
-        if token.type == ID:
-            return self.variable()
-
-    def term(self):
-        """
-        term : factor ((MUL | INT_DIV | REAL_DIV) factor)*
-        """
-        node = self.factor()
-        while self.token.type in (MUL, INT_DIV, REAL_DIV):
-            op = self.token
-            self.eat(op.type)
-            right_term = self.factor()
-            node = BinOp(node, op, right_term)
-        return node
 
-    def expr(self):
-        """
-        expr : term ((PLUS | MINUS) term)*
+        Parsed by operator precedence in one loop instead of a call per
+        rule, so that neither long chains nor deep nesting cost Python
+        frames. The stack holds the operators still waiting for their right
+        operand as (precedence, token, left operand) entries: left is None
+        for unary operators, and an open parenthesis is (-1, None, None).
+        The number of operators in the expression, a bound on its depth, is
+        left in self.operators.
         """
-        node = self.term()
-        while self.token.type == PLUS or self.token.type == MINUS:
-            op = self.token
-            self.eat(op.type)
-            right_term = self.term()
-            node = BinOp(node, op, right_term)
-        return node
+        nodes = self.nodes
+        get_token = self.lexer.get_token
+        precedences = self.PRECEDENCE
+        unary, open_paren = self.UNARY, self.OPEN_PAREN
+        stack = []
+        pop, push = stack.pop, stack.append
+        open_parens = operators = 0
+        token = self.token
+        while True:
+            # an operand: prefix operators and parentheses, then a leaf
+            type = token.type
+            while type == PLUS or type == MINUS or type == LP:
+                if type == LP:
+                    push(open_paren)
+                    open_parens += 1
+                else:
+                    push((unary, token, None))
+                token = get_token()
+                type = token.type
+            if type == ID:
+                node = nodes.Variable(token)
+            elif type == INT_CONST or type == REAL_CONST:
+                node = nodes.Num(token.value, type)
+            else:
+                self.token = token
+                self.error()
+            token = get_token()
+
+            # closing parentheses and binary operators after it
+            while True:
+                type = token.type
+                precedence = precedences.get(type, 0)
+                # finish the operators binding at least as tightly as this one
+                while stack and stack[-1][0] >= precedence:
+                    _, op, left = pop()
+                    operators += 1
+                    if left is None:
+                        node = nodes.UnOp(op, node)
+                    else:
+                        node = nodes.BinOp(left, op, node)
+                if precedence:
+                    push((precedence, token, node))
+                    token = get_token()
+                    break
+                if type == RP and open_parens:
+                    pop()  # open_paren
+                    open_parens -= 1
+                    token = get_token()
+                    continue
+                self.token = token
+                if open_parens:
+                    self.error(RP)
+                self.operators = operators
+                return node
 
     def parse(self):
         tree = self.program()
@@ -609,14 +1220,186 @@ class Parser:
 
 
 class NodeVisitor:
+    """
+    Dispatches `visit(node)` to the visitor's `visit_<node class name>`
+    method, or to `default_visitor` if there is none. The method for each
+    node class is resolved once per visitor class and cached in `_dispatch`.
+    """
+
+    _dispatch = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = {}
+
     def visit(self, node):
-        name = "visit_" + type(node).__name__
-        visitor = getattr(self, name, self.default_visitor)
-        return visitor(node)
+        try:
+            method = self._dispatch[node.__class__]
+        except KeyError:
+            method = self._resolve(node.__class__)
+        return method(self, node)
+
+    @classmethod
+    def _resolve(cls, node_class):
+        method = getattr(cls, "visit_" + node_class.__name__, cls.default_visitor)
+        cls._dispatch[node_class] = method
+        return method
 
     def default_visitor(self, node):
         raise Exception(f"No method named visit_{type(node).__name__}.")
 
+    def visit_expression(self, node, deep):
+        """
+        Visit the expression node, the root of an expression, with `visit`,
+        or with `postorder` if it is deep: if its statement has an
+        expression of more than EXPRESSION_DEPTH operators, as the parser
+        records. Visitors whose visit_BinOp and visit_UnOp recurse, the
+        fastest way for the expressions programs are made of, visit their
+        expressions with this method.
+        """
+        return self.postorder(node) if deep else self.visit(node)
+
+    def postorder(self, node):
+        """
+        Visit the expression node without recursing into its BinOp and UnOp
+        nodes: each is handed the results of its operands, once they are
+        visited, by `leave_BinOp(node, left, right)` or
+        `leave_UnOp(node, operand)`. Other nodes go to `visit`. A visitor
+        sets its visit_BinOp and visit_UnOp to this method to handle
+        expressions however deep they are at a constant Python stack depth.
+        """
+        # as in `Interpreter.postorder`, which specializes this to evaluation
+        visit, leave_bin_op = self.visit, self.leave_BinOp
+        if node.__class__ is BinOp:
+            left, right = node.left, node.right
+            if (
+                left.__class__ is not BinOp
+                and left.__class__ is not UnOp
+                and right.__class__ is not BinOp
+                and right.__class__ is not UnOp
+            ):
+                # most expressions are a single operation on two leaves
+                return leave_bin_op(node, visit(left), visit(right))
+        leave_un_op = self.leave_UnOp
+        stack = []
+        push, pop = stack.append, stack.pop
+        while True:
+            node_class = node.__class__
+            while node_class is BinOp or node_class is UnOp:
+                push(node)
+                node = node.left if node_class is BinOp else node.expr
+                node_class = node.__class__
+            result = visit(node)
+            while stack:
+                node = pop()
+                node_class = node.__class__
+                if node_class is BinOp:
+                    right = node.right
+                    right_class = right.__class__
+                    if right_class is BinOp:
+                        left, operand = right.left, right.right
+                        if (
+                            left.__class__ is BinOp
+                            or left.__class__ is UnOp
+                            or operand.__class__ is BinOp
+                            or operand.__class__ is UnOp
+                        ):
+                            push((result, node))
+                            node = right
+                            break
+                        # a right operand on two leaves needs no stack
+                        right_result = leave_bin_op(right, visit(left), visit(operand))
+                        result = leave_bin_op(node, result, right_result)
+                    elif right_class is UnOp:
+                        push((result, node))
+                        node = right
+                        break
+                    else:
+                        result = leave_bin_op(node, result, visit(right))
+                elif node_class is UnOp:
+                    result = leave_un_op(node, result)
+                else:
+                    left, node = node
+                    result = leave_bin_op(node, left, result)
+            else:
+                return result
+
+
+class FlatVisitor:
+    """
+    NodeVisitor for a `FlatTree`: `visit(index)` dispatches on the node's
+    kind to `visit_<kind name>(index)`. The dispatch table is built once per
+    visitor class.
+    """
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._dispatch = tuple(
+            getattr(cls, "visit_" + kind, cls.default_visitor) for kind in NODE_KINDS
+        )
+
+    def __init__(self, tree):
+        self.tree = tree
+        self.kinds = tree.kinds
+        self.a = tree.a
+        self.b = tree.b
+        self.c = tree.c
+
+    def visit(self, index):
+        return self._dispatch[self.kinds[index]](self, index)
+
+    def default_visitor(self, index):
+        kind = NODE_KINDS[self.kinds[index]]
+        raise Exception(f"No method named visit_{kind}.")
+
+    def name(self, index):
+        """The name of the Variable, Type or Program node at index."""
+        return self.tree.names[self.a[index]]
+
+    def visit_expression(self, index, deep):
+        """`NodeVisitor.visit_expression` for the node at index."""
+        return self.postorder(index) if deep else self.visit(index)
+
+    def postorder(self, index):
+        """`NodeVisitor.postorder` for the node at index."""
+        visit, leave_bin_op = self.visit, self.leave_BinOp
+        kinds, a, b, c = self.kinds, self.a, self.b, self.c
+        if kinds[index] == BINOP_NODE:
+            left, right = a[index], c[index]
+            if (
+                kinds[left] != BINOP_NODE
+                and kinds[left] != UNOP_NODE
+                and kinds[right] != BINOP_NODE
+                and kinds[right] != UNOP_NODE
+            ):
+                return leave_bin_op(index, visit(left), visit(right))
+        leave_un_op = self.leave_UnOp
+        stack = []
+        push, pop = stack.append, stack.pop
+        while True:
+            kind = kinds[index]
+            while kind == BINOP_NODE or kind == UNOP_NODE:
+                push(index)
+                index = a[index] if kind == BINOP_NODE else b[index]
+                kind = kinds[index]
+            result = visit(index)
+            while stack:
+                index = pop()
+                if index.__class__ is tuple:
+                    left, index = index
+                    result = leave_bin_op(index, left, result)
+                elif kinds[index] == BINOP_NODE:
+                    right = c[index]
+                    if kinds[right] == BINOP_NODE or kinds[right] == UNOP_NODE:
+                        push((result, index))
+                        index = right
+                        break
+                    result = leave_bin_op(index, result, visit(right))
+                else:
+                    result = leave_un_op(index, result)
+            else:
+                return result
+
 
 #############################################
 # 				    Symbols					#
@@ -640,6 +1423,9 @@ class BuiltInTypeSymbol(Symbol):
 class VariableSymbol(Symbol):
     def __init__(self, name, type_symbol):
         super().__init__(name, type_symbol)
+        # where the variable lives at run time, set by ScopedSymbolTable.define
+        self.scope_level = None
+        self.slot = None
 
     def __str__(self):
         return f"<{self.name} : {self.type_symbol}>"
@@ -651,6 +1437,7 @@ class ProcedureSymbol(Symbol):
     def __init__(self, name, params=None):
         super(ProcedureSymbol, self).__init__(name)
         self.params = params if params is not None else []
+        self.declaration = None  # the declaration's node, set by SemanticAnalyzer
 
     def __str__(self):
         return (
@@ -660,34 +1447,103 @@ class ProcedureSymbol(Symbol):
     __repr__ = __str__
 
 
+#############################################
+# 				  	Tracing					#
+#############################################
+
+TRACE_SCOPES = 1  # entering and leaving scopes, with a dump of each scope
+TRACE_SYMBOLS = 2  # every symbol definition and lookup as well
+
+TRACE_FORMATS = {
+    "enter": "ENTER scope: {scope}",
+    "exit": "EXIT scope: {scope}",
+    "scope": "{table}",
+    "insert": "Insert: {symbol}.",
+    "lookup": "Lookup: {name}. Scope: {scope}",
+}
+
+
+class TraceSink:
+    """
+    Opt-in destination for the symbol table and semantic analyzer trace;
+    without one nothing is traced. Events above level are dropped. target
+    is either a callable, called as target(level, event, fields) with the
+    event's fields in a dict, or a file object, which gets one formatted
+    line per event.
+    """
+
+    def __init__(self, target, level=TRACE_SYMBOLS):
+        self.target = target
+        self.level = level
+
+    def emit(self, level, event, **fields):
+        if level > self.level:
+            return
+        if callable(self.target):
+            self.target(level, event, fields)
+        else:
+            self.target.write(TRACE_FORMATS[event].format(**fields) + "\n")
+
+
 #############################################
 # 				  Symbol Table				#
 #############################################
 class ScopedSymbolTable:
-    def __init__(self, scope_name, scope_level, enclosing_scope=None):
-        self.symbol_table = OrderedDict()
+    def __init__(self, scope_name, scope_level, enclosing_scope=None, trace=None):
+        self.symbol_table = {}
         self.scope_name = scope_name
         self.scope_level = scope_level
         self.enclosing_scope = enclosing_scope
+        self.trace = trace
+        self.slot_count = 0
         self.initBuiltIns()
 
+    def __getstate__(self):
+        # a trace sink's file can't be pickled, so pickled tables are untraced
+        state = self.__dict__.copy()
+        state["trace"] = None
+        return state
+
     def initBuiltIns(self):
-        self.define(BuiltInTypeSymbol(INTEGER))
-        self.define(BuiltInTypeSymbol(REAL))
+        self.define(BuiltInTypeSymbol("INTEGER"))
+        self.define(BuiltInTypeSymbol("REAL"))
 
     def define(self, symbol):
-        print(f"Insert: {symbol}.")
+        if self.trace is not None:
+            self.trace.emit(TRACE_SYMBOLS, "insert", symbol=symbol)
+        if isinstance(symbol, VariableSymbol):
+            symbol.scope_level = self.scope_level
+            symbol.slot = self.slot_count
+            self.slot_count += 1
         self.symbol_table[symbol.name] = symbol
 
     def lookup(self, name, current_scope_only=False):
-        print(f"Lookup: {name}. Scope: {self.scope_name}")
-        symbol = self.symbol_table.get(name)
-        if symbol is not None:
-            return symbol
-        if current_scope_only:
-            return None
-        if self.enclosing_scope is not None:
-            return self.enclosing_scope.lookup(name)
+        scope = self
+        while scope is not None:
+            if self.trace is not None:
+                self.trace.emit(
+                    TRACE_SYMBOLS, "lookup", name=name, scope=scope.scope_name
+                )
+            symbol = scope.symbol_table.get(name)
+            if symbol is not None or current_scope_only:
+                return symbol
+            scope = scope.enclosing_scope
+
+    def slot_names(self):
+        """Names of this scope's variables, indexed by slot."""
+        return [
+            symbol.name
+            for symbol in self.symbol_table.values()
+            if isinstance(symbol, VariableSymbol)
+        ]
+
+    def slot_types(self):
+        """Type names of this scope's variables, indexed by slot."""
+        return [
+            symbol.type_symbol.name
+            for symbol in self.symbol_table.values()
+            if isinstance(symbol, VariableSymbol)
+        ]
 
     def __str__(self):
         header0 = "SCOPE (SCOPED SYMBOL TABLE)"
@@ -713,22 +1569,80 @@ class ScopedSymbolTable:
     __repr__ = __str__
 
 
+CONST_TYPES = {INT_CONST: "INTEGER", REAL_CONST: "REAL"}
+
+
+def binop_type(op, left, right):
+    """
+    Type of a binary operation on operands of type left and right: DIV
+    takes INTEGERs only, / always gives a REAL, and otherwise an INTEGER
+    mixed with a REAL is promoted to REAL.
+    """
+    if op == INT_DIV:
+        if left == right == "INTEGER":
+            return left
+    elif left == right and op != REAL_DIV:
+        return left
+    elif left in ("INTEGER", "REAL") and right in ("INTEGER", "REAL"):
+        return "REAL"
+    raise Exception(
+        f"Type error: applying {TOKEN_NAMES[op]} to a {left} and a {right}"
+    )
+
+
+def check_assignment(name, var_type, expr_type):
+    """
+    Check that a value of expr_type can be assigned to the variable name of
+    var_type. As in a call, an INTEGER may be assigned to a REAL.
+    """
+    if expr_type != var_type and (expr_type, var_type) != ("INTEGER", "REAL"):
+        raise Exception(f"Type error: assigning a {expr_type} to {name} : {var_type}")
+
+
+def check_call(procedure_symbol, arg_types):
+    """
+    Check a call's argument types against the procedure's parameters. An
+    INTEGER may be passed for a REAL parameter; nothing else converts.
+    """
+    params = procedure_symbol.params
+    if len(arg_types) != len(params):
+        raise Exception(
+            f"Procedure {procedure_symbol.name} takes {len(params)} arguments"
+            f" but got {len(arg_types)}."
+        )
+    for param, arg_type in zip(params, arg_types):
+        param_type = param.type_symbol.name
+        if arg_type != param_type and (arg_type, param_type) != ("INTEGER", "REAL"):
+            raise Exception(
+                f"Type error: passing a {arg_type} for {param.name} : {param_type}"
+            )
+
+
 class SemanticAnalyzer(NodeVisitor):
-    def __init__(self):
+    def __init__(self, trace=None, profile=None):
         self.current_scope = None
+        self.trace = trace
+        if profile is not None:
+            profile.attach(self)
 
     def visit_Program(self, program):
-        print("ENTER scope: global")
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "enter", scope="global")
         global_scope = ScopedSymbolTable(
-            scope_name="global", scope_level=1, enclosing_scope=self.current_scope
+            scope_name="global",
+            scope_level=1,
+            enclosing_scope=self.current_scope,
+            trace=self.trace,
         )
         self.current_scope = global_scope
+        program.scope = global_scope
 
         self.visit(program.block)
 
-        print(global_scope)
         self.current_scope = self.current_scope.enclosing_scope
-        print("exit scope: global")
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "scope", table=global_scope)
+            self.trace.emit(TRACE_SCOPES, "exit", scope="global")
 
     def visit_Block(self, block):
         for declaration in block.declarations:
@@ -738,45 +1652,67 @@ class SemanticAnalyzer(NodeVisitor):
     def visit_ProcedureDeclaration(self, procedure):
         procedure_name = procedure.name
         procedure_symbol = ProcedureSymbol(procedure_name)
+        procedure_symbol.declaration = procedure
         self.current_scope.define(procedure_symbol)
 
-        print(f"ENTER scope: {procedure_name}")
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "enter", scope=procedure_name)
         procedure_scope = ScopedSymbolTable(
             scope_name=procedure_name,
             scope_level=self.current_scope.scope_level + 1,
             enclosing_scope=self.current_scope,
+            trace=self.trace,
         )
 
         self.current_scope = procedure_scope
+        procedure.scope = procedure_scope
 
         for param in procedure.params:
             param_type = self.current_scope.lookup(param.type_node.value)
             param_name = param.var_node.value
             var_symbol = VariableSymbol(param_name, param_type)
             self.current_scope.define(var_symbol)
+            self.resolve(param.var_node, var_symbol)
             procedure_symbol.params.append(var_symbol)
 
         self.visit(procedure.block)
 
-        print(procedure_scope)
         self.current_scope = self.current_scope.enclosing_scope
-
-        print(f"EXIT scope: {procedure_name}")
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "scope", table=procedure_scope)
+            self.trace.emit(TRACE_SCOPES, "exit", scope=procedure_name)
 
     def visit_Compound(self, compound):
         for statement in compound.statement_list:
             self.visit(statement)
 
     def visit_Assignment(self, assignment):
-        self.visit(assignment.var)
-        self.visit(assignment.expr)
+        var_type = self.visit(assignment.var)
+        expr_type = self.visit_expression(assignment.expr, assignment.deep)
+        check_assignment(assignment.var.value, var_type, expr_type)
+
+    def visit_ProcedureCall(self, call):
+        procedure_symbol = self.current_scope.lookup(call.name)
+        if not isinstance(procedure_symbol, ProcedureSymbol):
+            raise NameError(repr(call.name))
+        arg_types = [
+            self.visit_expression(arg, call.deep) for arg in call.actual_params
+        ]
+        check_call(procedure_symbol, arg_types)
+        call.procedure = procedure_symbol.declaration
 
     def visit_Variable(self, variable):
         var_name = variable.value
         var_symbol = self.current_scope.lookup(var_name)
-        if var_symbol is None:
+        if not isinstance(var_symbol, VariableSymbol):
             raise NameError(repr(variable))
-        # return var_symbol.type_symbol
+        self.resolve(variable, var_symbol)
+        return var_symbol.type_symbol.name
+
+    def resolve(self, variable, var_symbol):
+        """Annotate a Variable node with where its symbol lives at run time."""
+        variable.depth = var_symbol.scope_level - 1
+        variable.slot = var_symbol.slot
 
     def visit_VarDeclaration(self, declaration):
         var_name = declaration.var_node.value
@@ -786,136 +1722,2376 @@ class SemanticAnalyzer(NodeVisitor):
             raise Exception(f"Variable {var_name} declared twice in the same scope.")
         var_symbol = VariableSymbol(var_name, type_symbol)
         self.current_scope.define(var_symbol)
+        self.resolve(declaration.var_node, var_symbol)
 
     def visit_Type(self, type):
         pass
 
+    def visit_BinOp(self, binop):
+        # BinOp and Num operands are checked on the spot, without `visit`
+        left, right = binop.left, binop.right
+        left_class, right_class = left.__class__, right.__class__
+        if left_class is BinOp:
+            left = self.visit_BinOp(left)
+        elif left_class is Num:
+            left = CONST_TYPES[left.type]
+        else:
+            left = self.visit(left)
+        if right_class is BinOp:
+            right = self.visit_BinOp(right)
+        elif right_class is Num:
+            right = CONST_TYPES[right.type]
+        else:
+            right = self.visit(right)
+        return binop_type(binop.op.type, left, right)
+
     def visit_UnOp(self, unop):
         return self.visit(unop.expr)
 
-    def visit_BinOp(self, binop):
-        left = self.visit(binop.left)
-        right = self.visit(binop.right)
-        if left == right:
-            return left
-        else:
-            raise Exception(
-                f"Type error: applying {binop.op} to a {left} and a {right}"
-            )
+    # for `postorder` and a `Profile`
+    def leave_UnOp(self, unop, operand):
+        return operand
+
+    def leave_BinOp(self, binop, left, right):
+        return binop_type(binop.op.type, left, right)
 
     def visit_Num(self, num):
-        type = num.type
-        if type == INT_CONST:
-            return INTEGER
-        if type == REAL_CONST:
-            return REAL
+        return CONST_TYPES[num.type]
 
     def visit_Empty(self, empty):
         pass
 
 
-#############################################
-# 				  Interpreter				#
-#############################################
-
+class FlatSemanticAnalyzer(FlatVisitor):
+    """SemanticAnalyzer for a `FlatTree`."""
 
-class Interpreter(NodeVisitor):
-    GLOBAL_MEMORY = {}
+    def __init__(self, tree, trace=None):
+        super().__init__(tree)
+        self.current_scope = None
+        self.trace = trace
 
-    def __init__(self, tree):
-        self.tree = tree
+    def visit_Program(self, index):
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "enter", scope="global")
+        global_scope = ScopedSymbolTable(
+            scope_name="global",
+            scope_level=1,
+            enclosing_scope=self.current_scope,
+            trace=self.trace,
+        )
+        self.current_scope = global_scope
+        self.tree.scopes[index] = global_scope
 
-    def interpret(self):
-        if self.tree is None:
-            return ""
-        return self.visit(self.tree)
+        self.visit(self.b[index])
 
-    def visit_Program(self, program):
-        return self.visit(program.block)
+        self.current_scope = self.current_scope.enclosing_scope
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "scope", table=global_scope)
+            self.trace.emit(TRACE_SCOPES, "exit", scope="global")
 
-    def visit_Block(self, block):
-        for declaration in block.declarations:
+    def visit_Block(self, index):
+        for declaration in self.tree.child_nodes(self.a[index], self.b[index]):
             self.visit(declaration)
+        self.visit(self.c[index])
 
-        return self.visit(block.compound_statement)
+    def visit_ProcedureDeclaration(self, index):
+        procedure_name = self.tree.names[self.a[index]]
+        procedure_symbol = ProcedureSymbol(procedure_name)
+        procedure_symbol.declaration = index
+        self.current_scope.define(procedure_symbol)
 
-    def visit_VarDeclaration(self, declaration):
-        pass
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "enter", scope=procedure_name)
+        procedure_scope = ScopedSymbolTable(
+            scope_name=procedure_name,
+            scope_level=self.current_scope.scope_level + 1,
+            enclosing_scope=self.current_scope,
+            trace=self.trace,
+        )
 
-    def visit_ProcedureDeclaration(self, procedure):
-        pass
+        self.current_scope = procedure_scope
+        self.tree.scopes[index] = procedure_scope
 
-    def visit_Type(self, type_node):
-        pass
+        start, count = self.b[index], self.c[index]
+        for param in self.tree.child_nodes(start, count):
+            param_type = self.current_scope.lookup(self.name(self.b[param]))
+            param_name = self.name(self.a[param])
+            var_symbol = VariableSymbol(param_name, param_type)
+            self.current_scope.define(var_symbol)
+            self.resolve(self.a[param], var_symbol)
+            procedure_symbol.params.append(var_symbol)
 
-    def visit_Compound(self, compound):
-        for statement in compound.statement_list:
-            self.visit(statement)
+        self.visit(self.tree.children[start + count])
 
-    def visit_Assignment(self, assignment):
-        var_name = assignment.var.value
-        self.GLOBAL_MEMORY[var_name] = self.visit(assignment.expr)
+        self.current_scope = self.current_scope.enclosing_scope
+        if self.trace is not None:
+            self.trace.emit(TRACE_SCOPES, "scope", table=procedure_scope)
+            self.trace.emit(TRACE_SCOPES, "exit", scope=procedure_name)
 
-    def visit_Variable(self, var_node):
-        var_name = var_node.value
-        val = self.GLOBAL_MEMORY.get(var_name)
-        if val == None:
+    def visit_Compound(self, index):
+        for statement in self.tree.child_nodes(self.a[index], self.b[index]):
+            self.visit(statement)
+
+    def visit_Assignment(self, index):
+        var = self.a[index]
+        expr_type = self.visit_expression(self.b[index], self.c[index])
+        check_assignment(self.name(var), self.visit(var), expr_type)
+
+    def visit_ProcedureCall(self, index):
+        procedure_name = self.name(index)
+        procedure_symbol = self.current_scope.lookup(procedure_name)
+        if not isinstance(procedure_symbol, ProcedureSymbol):
+            raise NameError(repr(procedure_name))
+        start, count = self.b[index], self.c[index]
+        args = self.tree.child_nodes(start, count)
+        deep = self.tree.children[start + count + 1]
+        check_call(procedure_symbol, [self.visit_expression(arg, deep) for arg in args])
+        self.tree.children[start + count] = procedure_symbol.declaration
+
+    def visit_Variable(self, index):
+        var_name = self.name(index)
+        var_symbol = self.current_scope.lookup(var_name)
+        if not isinstance(var_symbol, VariableSymbol):
             raise NameError(repr(var_name))
+        self.resolve(index, var_symbol)
+        return var_symbol.type_symbol.name
+
+    def resolve(self, index, var_symbol):
+        """Store the depth and slot of a Variable node's symbol in the node."""
+        self.b[index] = var_symbol.scope_level - 1
+        self.c[index] = var_symbol.slot
+
+    def visit_VarDeclaration(self, index):
+        var_name = self.name(self.a[index])
+        type_name = self.name(self.b[index])
+        type_symbol = self.current_scope.lookup(type_name)
+        if self.current_scope.lookup(var_name, current_scope_only=True) is not None:
+            raise Exception(f"Variable {var_name} declared twice in the same scope.")
+        var_symbol = VariableSymbol(var_name, type_symbol)
+        self.current_scope.define(var_symbol)
+        self.resolve(self.a[index], var_symbol)
+
+    def visit_Type(self, index):
+        pass
+
+    def visit_BinOp(self, index):
+        # like SemanticAnalyzer.visit_BinOp
+        kinds, b = self.kinds, self.b
+        left, right = self.a[index], self.c[index]
+        left_kind, right_kind = kinds[left], kinds[right]
+        if left_kind == BINOP_NODE:
+            left = self.visit_BinOp(left)
+        elif left_kind == NUM_NODE:
+            left = CONST_TYPES[b[left]]
         else:
-            return val
+            left = self.visit(left)
+        if right_kind == BINOP_NODE:
+            right = self.visit_BinOp(right)
+        elif right_kind == NUM_NODE:
+            right = CONST_TYPES[b[right]]
+        else:
+            right = self.visit(right)
+        return binop_type(b[index], left, right)
 
-    def visit_BinOp(self, bin_op):
-        left = bin_op.left
-        op = bin_op.op.type
-        right = bin_op.right
-        if op == PLUS:
-            return self.visit(left) + self.visit(right)
-        if op == MINUS:
-            return self.visit(left) - self.visit(right)
-        if op == MUL:
-            return self.visit(left) * self.visit(right)
-        if op == INT_DIV:
-            return self.visit(left) // self.visit(right)
-        if op == REAL_DIV:
-            return self.visit(left) / self.visit(right)
+    def visit_UnOp(self, index):
+        return self.visit(self.b[index])
 
-    def visit_UnOp(self, un_op):
-        if un_op.op == PLUS:
-            return self.visit(un_op.expr)
-        if un_op.op == MINUS:
-            return -self.visit(un_op.expr)
+    # for `postorder`
+    def leave_UnOp(self, index, operand):
+        return operand
 
-    def visit_Num(self, num_node):
-        return num_node.value
+    def leave_BinOp(self, index, left, right):
+        return binop_type(self.b[index], left, right)
 
-    def visit_Empty(self, node):
+    def visit_Num(self, index):
+        return CONST_TYPES[self.b[index]]
+
+    def visit_Empty(self, index):
         pass
 
 
 #############################################
-# 				  	Main					#
+# 				  Optimizer					#
 #############################################
 
 
-def main():
-    import sys
+# what the binary operators compute, for `ConstantFolder` and `Interpreter`
+OPERATIONS = {
+    PLUS: operator.add,
+    MINUS: operator.sub,
+    MUL: operator.mul,
+    INT_DIV: operator.floordiv,
+    REAL_DIV: operator.truediv,
+}
 
-    print("=" * 41)
-    print("Welcome to your Simple Pascal Interpreter")
-    print("=" * 41)
 
-    text = open(
-        "/Users/paultalma/Programming/simple-interpreters/pascal-interpreter/test.txt",
-        "r",
-    ).read()
-    lexer = Lexer(text)
-    parser = Parser(lexer)
-    tree = parser.parse()
-    symbol_table_builder = SemanticAnalyzer()
-    symbol_table_builder.visit_Program(tree)
-
-    interpreter = Interpreter(tree)
-    result = interpreter.interpret()
+class ConstantFolder(NodeVisitor):
+    """
+    Folds constant BinOp and UnOp subtrees into Num nodes and drops the
+    identities x * 1, 1 * x, x + 0, 0 + x, x - 0, +x and - -x.
+
+    Constants are combined with the same Python operators `Interpreter`
+    uses, so DIV stays floor division, / always gives a REAL and mixing
+    INTEGER and REAL gives a REAL. Only INTEGER 0 and 1 count as identities,
+    since e.g. x * 1.0 would turn an INTEGER x into a REAL. A constant
+    division by zero is left for the interpreter to report.
+
+    Statements are rewritten in place; `removed` counts the dropped nodes.
+    """
+
+    def __init__(self):
+        self.removed = 0
+
+    def fold(self, tree):
+        self.visit(tree)
+        return tree
+
+    def visit_Program(self, program):
+        self.visit(program.block)
+
+    def visit_Block(self, block):
+        for declaration in block.declarations:
+            self.visit(declaration)
+        self.visit(block.compound_statement)
+
+    def visit_VarDeclaration(self, declaration):
+        pass
+
+    def visit_ProcedureDeclaration(self, procedure):
+        self.visit(procedure.block)
+
+    def visit_Compound(self, compound):
+        for statement in compound.statement_list:
+            self.visit(statement)
+
+    def visit_Assignment(self, assignment):
+        assignment.expr = self.visit(assignment.expr)
+
+    def visit_ProcedureCall(self, call):
+        call.actual_params = [self.visit(arg) for arg in call.actual_params]
+
+    def visit_Empty(self, empty):
+        pass
+
+    # expressions: each returns the node that replaces it
+
+    visit_BinOp = visit_UnOp = NodeVisitor.postorder
+
+    def leave_BinOp(self, bin_op, left, right):
+        bin_op.left, bin_op.right = left, right
+        op = bin_op.op.type
+        if isinstance(left, Num) and isinstance(right, Num):
+            try:
+                value = OPERATIONS[op](left.value, right.value)
+            except ZeroDivisionError:
+                return bin_op
+            self.removed += 2
+            return Num(value, INT_CONST if isinstance(value, int) else REAL_CONST)
+
+        if (op == PLUS or op == MINUS) and is_integer(right, 0) or (
+            op == MUL and is_integer(right, 1)
+        ):
+            self.removed += 2
+            return left
+        if op == PLUS and is_integer(left, 0) or op == MUL and is_integer(left, 1):
+            self.removed += 2
+            return right
+        return bin_op
+
+    def leave_UnOp(self, un_op, expr):
+        un_op.expr = expr
+        if un_op.op == PLUS:
+            self.removed += 1
+            return expr
+        if isinstance(expr, Num):
+            self.removed += 1
+            return Num(-expr.value, expr.type)
+        if isinstance(expr, UnOp) and expr.op == MINUS:
+            self.removed += 2
+            return expr.expr
+        return un_op
+
+    def visit_Num(self, num):
+        return num
+
+    def visit_Variable(self, var):
+        return var
+
+
+def is_integer(node, value):
+    """Whether node is the INTEGER constant value."""
+    return isinstance(node, Num) and node.type == INT_CONST and node.value == value
+
+
+# (operator, result type): the kind of TypedBinOp computing it, and how
+TYPED_BINOPS = {
+    (PLUS, "INTEGER"): ("IntAdd", operator.add),
+    (MINUS, "INTEGER"): ("IntSub", operator.sub),
+    (MUL, "INTEGER"): ("IntMul", operator.mul),
+    (INT_DIV, "INTEGER"): ("IntDiv", operator.floordiv),
+    (PLUS, "REAL"): ("RealAdd", operator.add),
+    (MINUS, "REAL"): ("RealSub", operator.sub),
+    (MUL, "REAL"): ("RealMul", operator.mul),
+    (REAL_DIV, "REAL"): ("RealDiv", operator.truediv),
+}
+# the one-operand kinds, as a multiplication by a constant right operand:
+# exact for ints and floats, -0.0 and infinities included
+NEGATIONS = {"INTEGER": ("IntNeg", -1), "REAL": ("RealNeg", -1.0)}
+INT_TO_REAL = ("IntToReal", 1.0)
+
+
+class TypeSpecializer(NodeVisitor):
+    """
+    Rewrites the expressions of a checked tree into `TypedBinOp` nodes, one
+    kind per operator and result type (IntAdd, RealMul, ...), using the
+    types `SemanticAnalyzer` infers. +x becomes x and -x the IntNeg or
+    RealNeg of x. An INTEGER assigned to a REAL variable or passed for a
+    REAL parameter is converted by an IntToReal node, or becomes a REAL
+    constant if it is one. Operands within an expression aren't converted:
+    Python's mixed int and float arithmetic already gives what converting
+    the int first would.
+
+    Variable types are looked up in the Program and ProcedureDeclaration
+    scopes the analyzer leaves on the tree. Only the tree and closure
+    engines of `Interpreter` run the result; fold constants before, as
+    `ConstantFolder` doesn't know TypedBinOp.
+    """
+
+    def specialize(self, tree):
+        self.types = []  # type names of each frame's slots, by depth
+        self.visit(tree)
+        return tree
+
+    def visit_Program(self, program):
+        self.types[:] = [checked_scope(program).slot_types()]
+        self.visit(program.block)
+
+    def visit_Block(self, block):
+        for declaration in block.declarations:
+            self.visit(declaration)
+        self.visit(block.compound_statement)
+
+    def visit_VarDeclaration(self, declaration):
+        pass
+
+    def visit_ProcedureDeclaration(self, procedure):
+        scope = checked_scope(procedure)
+        enclosing = self.types[: scope.scope_level - 1]
+        self.types[:] = enclosing + [scope.slot_types()]
+        self.visit(procedure.block)
+        self.types[:] = enclosing
+
+    def visit_Compound(self, compound):
+        for statement in compound.statement_list:
+            self.visit(statement)
+
+    def visit_Assignment(self, assignment):
+        var = assignment.var
+        var_type = self.types[var.depth][var.slot]
+        assignment.expr = self.converted(self.visit(assignment.expr), var_type)
+
+    def visit_ProcedureCall(self, call):
+        param_types = checked_scope(call.procedure).slot_types()
+        call.actual_params = [
+            self.converted(self.visit(arg), param_type)
+            for arg, param_type in zip(call.actual_params, param_types)
+        ]
+
+    def visit_Empty(self, empty):
+        pass
+
+    def converted(self, typed_expr, to_type, constants_only=False):
+        """
+        The expr of an (expr, type) pair, converted to to_type, unless it is
+        not a constant and constants_only is true.
+        """
+        expr, type = typed_expr
+        if type == to_type:
+            return expr
+        if isinstance(expr, Num):
+            return Num(float(expr.value), REAL_CONST)
+        return expr if constants_only else self.scaled(INT_TO_REAL, expr)
+
+    @staticmethod
+    def scaled(kind, expr):
+        """The TypedBinOp of kind, a (name, factor) pair, on expr."""
+        name, factor = kind
+        type = INT_CONST if factor.__class__ is int else REAL_CONST
+        return TypedBinOp(name, expr, operator.mul, Num(factor, type))
+
+    # expressions: each returns (the node that replaces it, its type)
+
+    visit_BinOp = visit_UnOp = NodeVisitor.postorder
+
+    def leave_BinOp(self, bin_op, left, right):
+        (left, left_type), (right, right_type) = left, right
+        op = bin_op.op.type
+        type = binop_type(op, left_type, right_type)
+        if type == "REAL" and op != REAL_DIV:
+            # an INTEGER constant mixed with a REAL is converted once, here,
+            # rather than by Python on every run; int / int stays exact
+            left = self.converted((left, left_type), "REAL", constants_only=True)
+            right = self.converted((right, right_type), "REAL", constants_only=True)
+        kind, operation = TYPED_BINOPS[op, type]
+        return TypedBinOp(kind, left, operation, right), type
+
+    def leave_UnOp(self, un_op, operand):
+        if un_op.op == PLUS:
+            return operand
+        expr, type = operand
+        return self.scaled(NEGATIONS[type], expr), type
+
+    def visit_Num(self, num):
+        return num, "INTEGER" if num.type == INT_CONST else "REAL"
+
+    def visit_Variable(self, var):
+        return var, self.types[var.depth][var.slot]
+
+
+#############################################
+# 				  Interpreter				#
+#############################################
+
+
+class Interpreter(NodeVisitor):
+    """
+    Runs a Program tree. engine selects how:
+        "tree"     walk the tree with the visit_* methods below
+        "closure"  call the closure tree built by `ClosureCompiler`
+        "compile"  run the Python function built by `PythonCompiler`
+        "bytecode" run the `Bytecode` built by `BytecodeCompiler`
+    The closure, compile and bytecode engines translate the tree on the
+    first call to `interpret` and reuse the translation afterwards. Given a
+    `Profile`, the tree engine records its visits in it. Only the tree and
+    closure engines run trees rewritten by `TypeSpecializer`.
+
+    The tree must have been checked by `SemanticAnalyzer`, which resolves
+    every variable to a slot. The tree, closure and bytecode engines keep
+    one list of slots per scope (the display, global scope first); after a
+    run the assigned global variables are copied into GLOBAL_MEMORY by
+    name. A procedure call takes a frame from the procedure's frames (an
+    instance of the frames class, `Frames` or `FramePool`), swaps it into
+    the display at the procedure's depth for the length of the call and
+    hands it back afterwards.
+
+    All of this state, GLOBAL_MEMORY included, belongs to the instance: any
+    number of interpreters can run at once, in different threads too, and
+    share a checked tree, but each one runs a single program at a time.
+    Running again adds to GLOBAL_MEMORY; `reset` starts over with an empty
+    one, and can switch to another tree while keeping the engine, frames
+    and profile.
+    """
+
+    ENGINES = ("tree", "closure", "compile", "bytecode")
+
+    def __init__(self, tree, engine="tree", frames=None, profile=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine {engine!r}.")
+        self.tree = tree
+        self.engine = engine
+        self.frames = frames if frames is not None else Frames
+        self.compiled = None
+        self.GLOBAL_MEMORY = {}
+        if profile is not None:
+            if engine != "tree":
+                raise ValueError("Only the tree engine can be profiled.")
+            profile.attach(self)
+
+    def interpret(self):
+        if self.tree is None:
+            return ""
+        if self.engine == "tree":
+            return self.visit(self.tree)
+        if self.compiled is None:
+            self.compiled = self.compile()
+        return self.compiled(self.GLOBAL_MEMORY)
+
+    def reset(self, tree=None):
+        """
+        Get ready for another run, with a new GLOBAL_MEMORY (the old one is
+        left as it is), of tree if given, or else of the same tree.
+        """
+        self.GLOBAL_MEMORY = {}
+        self.display = None
+        self.procedure_frames = {}
+        if tree is not None:
+            self.tree = tree
+            self.compiled = None
+
+    def compile(self):
+        if self.engine == "closure":
+            return ClosureCompiler(self.frames).compile(self.tree)
+        if self.engine == "bytecode":
+            bytecode = BytecodeCompiler().compile(self.tree)
+            return lambda memory: bytecode.run(memory, self.frames)
+        return PythonCompiler().compile(self.tree)
+
+    def visit_Program(self, program):
+        scope = checked_scope(program)
+        self.display = new_display(scope, display_size(program.block))
+        self.procedure_frames = {}
+        result = self.visit(program.block)
+        store_globals(scope, self.display[0], self.GLOBAL_MEMORY)
+        return result
+
+    def visit_Block(self, block):
+        for declaration in block.declarations:
+            self.visit(declaration)
+
+        return self.visit(block.compound_statement)
+
+    def visit_VarDeclaration(self, declaration):
+        pass
+
+    def visit_ProcedureDeclaration(self, procedure):
+        pass
+
+    def visit_Type(self, type_node):
+        pass
+
+    def visit_Compound(self, compound):
+        for statement in compound.statement_list:
+            self.visit(statement)
+
+    def visit_Assignment(self, assignment):
+        var, expr = assignment.var, assignment.expr
+        self.display[var.depth][var.slot] = self.visit_expression(expr, assignment.deep)
+
+    def visit_ProcedureCall(self, call):
+        procedure = call.procedure
+        frames = self.procedure_frames.get(procedure)
+        if frames is None:
+            frames = self.procedure_frames[procedure] = self.frames.of(procedure)
+        args = [self.visit_expression(arg, call.deep) for arg in call.actual_params]
+        frame = frames.acquire(args)
+        display, depth = self.display, frames.depth
+        caller_frame = display[depth]
+        display[depth] = frame
+        self.visit(procedure.block)
+        display[depth] = caller_frame
+        frames.release(frame)
+
+    def visit_Variable(self, var_node):
+        val = self.display[var_node.depth][var_node.slot]
+        if val is None:
+            raise NameError(repr(var_node.value))
+        else:
+            return val
+
+    def evaluate(self, node):
+        """
+        The value of the expression node, by recursion without `visit`, with
+        Variable and Num operands read on the spot.
+        """
+        node_class = node.__class__
+        if node_class is BinOp:
+            left, right = self.evaluate(node.left), self.evaluate(node.right)
+            return OPERATIONS[node.op.type](left, right)
+        if node_class is Variable:
+            value = self.display[node.depth][node.slot]
+            if value is None:
+                raise NameError(repr(node.value))
+            return value
+        if node_class is Num:
+            return node.value
+        if node_class is UnOp:
+            value = self.evaluate(node.expr)
+            return -value if node.op == MINUS else value
+        return self.visit(node)
+
+    visit_BinOp = visit_UnOp = evaluate
+
+    def postorder(self, node):
+        """
+        `NodeVisitor.postorder` specialized to `evaluate` expressions too
+        deep for recursion. Going down to the leftmost leaf, the BinOp and
+        UnOp nodes above it wait on a stack; a BinOp whose left operand has
+        a value waits as a (value, node) pair while its right operand is
+        evaluated, unless that is a leaf, which is read on the spot.
+        """
+        if node.__class__ is TypedBinOp:
+            return self.postorder_typed(node)
+        display = self.display
+        stack = []
+        push, pop = stack.append, stack.pop
+        while True:
+            node_class = node.__class__
+            while node_class is BinOp or node_class is UnOp:
+                push(node)
+                node = node.left if node_class is BinOp else node.expr
+                node_class = node.__class__
+            if node_class is Variable:
+                value = display[node.depth][node.slot]
+                if value is None:
+                    raise NameError(repr(node.value))
+            elif node_class is Num:
+                value = node.value
+            else:
+                value = self.visit(node)
+            while stack:
+                node = pop()
+                node_class = node.__class__
+                if node_class is BinOp:
+                    right = node.right
+                    right_class = right.__class__
+                    if right_class is Variable:
+                        right_value = display[right.depth][right.slot]
+                        if right_value is None:
+                            raise NameError(repr(right.value))
+                    elif right_class is Num:
+                        right_value = right.value
+                    else:
+                        push((value, node))
+                        node = right
+                        break
+                    value = OPERATIONS[node.op.type](value, right_value)
+                elif node_class is UnOp:
+                    if node.op == MINUS:
+                        value = -value
+                else:
+                    left, node = node
+                    value = OPERATIONS[node.op.type](left, value)
+            else:
+                return value
+
+    # for a `Profile`, which visits every node of an expression itself
+    def leave_BinOp(self, bin_op, left, right):
+        return OPERATIONS[bin_op.op.type](left, right)
+
+    def leave_UnOp(self, un_op, operand):
+        return -operand if un_op.op == MINUS else operand
+
+    def evaluate_typed(self, node):
+        """
+        `evaluate` for expressions rewritten by `TypeSpecializer`, where
+        every operator is a TypedBinOp applying its own operation.
+        """
+        node_class = node.__class__
+        if node_class is TypedBinOp:
+            left, right = self.evaluate_typed(node.left), node.right
+            # the right operand of a negation or conversion is a constant
+            if right.__class__ is Num:
+                return node.operation(left, right.value)
+            return node.operation(left, self.evaluate_typed(right))
+        if node_class is Variable:
+            value = self.display[node.depth][node.slot]
+            if value is None:
+                raise NameError(repr(node.value))
+            return value
+        if node_class is Num:
+            return node.value
+        return self.visit(node)
+
+    visit_TypedBinOp = evaluate_typed
+
+    def postorder_typed(self, node):
+        """`postorder` for expressions rewritten by `TypeSpecializer`."""
+        display = self.display
+        stack = []
+        push, pop = stack.append, stack.pop
+        while True:
+            node_class = node.__class__
+            while node_class is TypedBinOp:
+                push(node)
+                node = node.left
+                node_class = node.__class__
+            if node_class is Variable:
+                value = display[node.depth][node.slot]
+                if value is None:
+                    raise NameError(repr(node.value))
+            elif node_class is Num:
+                value = node.value
+            else:
+                value = self.visit(node)
+            while stack:
+                node = pop()
+                if node.__class__ is TypedBinOp:
+                    right = node.right
+                    right_class = right.__class__
+                    if right_class is Variable:
+                        right_value = display[right.depth][right.slot]
+                        if right_value is None:
+                            raise NameError(repr(right.value))
+                    elif right_class is Num:
+                        right_value = right.value
+                    else:
+                        push((value, node))
+                        node = right
+                        break
+                    value = node.operation(value, right_value)
+                else:
+                    left, node = node
+                    value = node.operation(left, value)
+            else:
+                return value
+
+    def visit_Num(self, num_node):
+        return num_node.value
+
+    def visit_Empty(self, node):
+        pass
+
+
+def checked_scope(program):
+    if program.scope is None:
+        raise Exception("Run SemanticAnalyzer over the program first.")
+    return program.scope
+
+
+def display_size(block):
+    """Frames in the display of a program with this block, one per level."""
+    procedures = [
+        declaration.block
+        for declaration in block.declarations
+        if isinstance(declaration, ProcedureDeclaration)
+    ]
+    return 1 + max(map(display_size, procedures), default=0)
+
+
+def new_display(scope, size):
+    """A display of size frames holding a fresh frame for the global scope."""
+    return [[None] * scope.slot_count] + [None] * (size - 1)
+
+
+class Frames:
+    """
+    The activation records of one procedure: fixed-size slot lists holding
+    its parameters (slots 0 to params - 1) and then its local variables.
+    `acquire` builds a new frame for each call in a single allocation.
+    """
+
+    __slots__ = ("depth", "params", "locals")
+
+    def __init__(self, depth, params, slot_count):
+        self.depth = depth
+        self.params = params
+        self.locals = [None] * (slot_count - params)
+
+    @classmethod
+    def of(cls, procedure):
+        scope = checked_scope(procedure)
+        return cls(scope.scope_level - 1, len(procedure.params), scope.slot_count)
+
+    def acquire(self, args):
+        """A frame holding args, with its local variables unassigned."""
+        return args + self.locals
+
+    def release(self, frame):
+        pass
+
+
+class FramePool(Frames):
+    """
+    `Frames` that keeps released frames on a free list and reuses them, so
+    the list only grows as deep as the procedure recurses. CPython already
+    recycles list objects on a free list of its own, so on CPython this is
+    no faster than `Frames`, and slower in the closure engine (see
+    benchmark.py calls).
+    """
+
+    __slots__ = ("free",)
+
+    def __init__(self, depth, params, slot_count):
+        super().__init__(depth, params, slot_count)
+        self.free = []
+
+    def acquire(self, args):
+        try:
+            frame = self.free.pop()
+        except IndexError:
+            return args + self.locals
+        frame[: self.params] = args
+        frame[self.params :] = self.locals
+        return frame
+
+    def release(self, frame):
+        self.free.append(frame)
+
+
+FRAMES = {"new": Frames, "pooled": FramePool}
+
+
+def store_globals(scope, frame, memory):
+    """Copy the assigned variables of the global frame into memory by name."""
+    for name, value in zip(scope.slot_names(), frame):
+        if value is not None:
+            memory[name] = value
+
+
+class FlatInterpreter(FlatVisitor):
+    """
+    Tree-walking Interpreter for a `FlatTree` checked by
+    `FlatSemanticAnalyzer`, running on a display like `Interpreter`. Like
+    an Interpreter, it has a GLOBAL_MEMORY of its own and can be `reset`.
+    """
+
+    def __init__(self, tree, frames=None):
+        super().__init__(tree)
+        self.frames = frames if frames is not None else Frames
+        self.GLOBAL_MEMORY = {}
+
+    def reset(self, tree=None):
+        """Like `Interpreter.reset`."""
+        self.GLOBAL_MEMORY = {}
+        self.display = None
+        self.procedure_frames = {}
+        if tree is not None:
+            super().__init__(tree)
+
+    def interpret(self):
+        if self.tree.root is None:
+            return ""
+        return self.visit(self.tree.root)
+
+    def visit_Program(self, index):
+        scopes = self.tree.scopes
+        if index not in scopes:
+            raise Exception("Run FlatSemanticAnalyzer over the tree first.")
+        size = max(scope.scope_level for scope in scopes.values())
+        self.display = new_display(scopes[index], size)
+        self.procedure_frames = {}
+        result = self.visit(self.b[index])
+        store_globals(scopes[index], self.display[0], self.GLOBAL_MEMORY)
+        return result
+
+    def visit_Block(self, index):
+        for declaration in self.tree.child_nodes(self.a[index], self.b[index]):
+            self.visit(declaration)
+
+        return self.visit(self.c[index])
+
+    def visit_VarDeclaration(self, index):
+        pass
+
+    def visit_ProcedureDeclaration(self, index):
+        pass
+
+    def visit_Compound(self, index):
+        for statement in self.tree.child_nodes(self.a[index], self.b[index]):
+            self.visit(statement)
+
+    def visit_Assignment(self, index):
+        var, expr, deep = self.a[index], self.b[index], self.c[index]
+        self.display[self.b[var]][self.c[var]] = self.visit_expression(expr, deep)
+
+    def visit_ProcedureCall(self, index):
+        start, count = self.b[index], self.c[index]
+        children = self.tree.children
+        procedure = children[start + count]
+        frames = self.procedure_frames.get(procedure)
+        if frames is None:
+            scope = self.tree.scopes[procedure]
+            params = self.c[procedure]
+            frames = self.frames(scope.scope_level - 1, params, scope.slot_count)
+            self.procedure_frames[procedure] = frames
+        args, deep = children[start : start + count], children[start + count + 1]
+        args = [self.visit_expression(arg, deep) for arg in args]
+        frame = frames.acquire(args)
+        display, depth = self.display, frames.depth
+        caller_frame = display[depth]
+        display[depth] = frame
+        self.visit(children[self.b[procedure] + self.c[procedure]])
+        display[depth] = caller_frame
+        frames.release(frame)
+
+    def visit_Variable(self, index):
+        val = self.display[self.b[index]][self.c[index]]
+        if val is None:
+            raise NameError(repr(self.name(index)))
+        return val
+
+    def evaluate(self, index):
+        """`Interpreter.evaluate` for the node at index."""
+        kind = self.kinds[index]
+        if kind == BINOP_NODE:
+            left, right = self.evaluate(self.a[index]), self.evaluate(self.c[index])
+            return OPERATIONS[self.b[index]](left, right)
+        if kind == VARIABLE_NODE:
+            value = self.display[self.b[index]][self.c[index]]
+            if value is None:
+                raise NameError(repr(self.name(index)))
+            return value
+        if kind == NUM_NODE:
+            return self.tree.constants[self.a[index]]
+        if kind == UNOP_NODE:
+            value = self.evaluate(self.b[index])
+            return -value if self.a[index] == MINUS else value
+        return self.visit(index)
+
+    visit_BinOp = visit_UnOp = evaluate
+
+    def postorder(self, index):
+        """`Interpreter.postorder` for the node at index."""
+        display, constants = self.display, self.tree.constants
+        kinds, a, b, c = self.kinds, self.a, self.b, self.c
+        stack = []
+        push, pop = stack.append, stack.pop
+        while True:
+            kind = kinds[index]
+            while kind == BINOP_NODE or kind == UNOP_NODE:
+                push(index)
+                index = a[index] if kind == BINOP_NODE else b[index]
+                kind = kinds[index]
+            if kind == VARIABLE_NODE:
+                value = display[b[index]][c[index]]
+                if value is None:
+                    raise NameError(repr(self.name(index)))
+            elif kind == NUM_NODE:
+                value = constants[a[index]]
+            else:
+                value = self.visit(index)
+            while stack:
+                index = pop()
+                if index.__class__ is tuple:
+                    left, index = index
+                    value = OPERATIONS[b[index]](left, value)
+                elif kinds[index] == BINOP_NODE:
+                    right = c[index]
+                    kind = kinds[right]
+                    if kind == VARIABLE_NODE:
+                        right_value = display[b[right]][c[right]]
+                        if right_value is None:
+                            raise NameError(repr(self.name(right)))
+                    elif kind == NUM_NODE:
+                        right_value = constants[a[right]]
+                    else:
+                        push((value, index))
+                        index = right
+                        break
+                    value = OPERATIONS[b[index]](value, right_value)
+                elif a[index] == MINUS:
+                    value = -value
+            else:
+                return value
+
+    def visit_Num(self, index):
+        return self.tree.constants[self.a[index]]
+
+    def visit_Empty(self, index):
+        pass
+
+
+#############################################
+# 				  Compiler					#
+#############################################
+
+
+class ClosureCompiler(NodeVisitor):
+    """
+    Translates a checked Program tree into a tree of closures, one per node,
+    each specialized for its node's operator. Statement and expression
+    closures take the display (see `Interpreter`). Calling the compiled
+    program with a memory dict runs it without any further visitor dispatch
+    and stores its global variables in that memory. frames is the class
+    procedure calls get their frames from, `Frames` by default.
+    """
+
+    def __init__(self, frames=None):
+        self.frames = frames if frames is not None else Frames
+
+    def compile(self, program):
+        self.procedure_frames = {}
+        self.bodies = {}
+        return self.visit(program)
+
+    def visit_Program(self, program):
+        scope = checked_scope(program)
+        block = self.visit(program.block)
+        size = display_size(program.block)
+
+        def run_program(memory):
+            display = new_display(scope, size)
+            block(display)
+            store_globals(scope, display[0], memory)
+
+        return run_program
+
+    def visit_Block(self, block):
+        for declaration in block.declarations:
+            self.visit(declaration)
+        return self.visit(block.compound_statement)
+
+    def visit_VarDeclaration(self, declaration):
+        pass
+
+    def visit_ProcedureDeclaration(self, procedure):
+        # calls compiled before the body (recursive ones) find it in body[0]
+        _, body = self.procedure(procedure)
+        body[0] = self.visit(procedure.block)
+
+    def procedure(self, procedure):
+        """The procedure's frames and the one-item list holding its body."""
+        if procedure not in self.bodies:
+            self.procedure_frames[procedure] = self.frames.of(procedure)
+            self.bodies[procedure] = [None]
+        return self.procedure_frames[procedure], self.bodies[procedure]
+
+    def visit_Compound(self, compound):
+        statements = [self.visit(statement) for statement in compound.statement_list]
+        statements = [statement for statement in statements if statement is not None]
+
+        def run_compound(env):
+            for statement in statements:
+                statement(env)
+
+        return run_compound
+
+    def visit_Assignment(self, assignment):
+        depth, slot = assignment.var.depth, assignment.var.slot
+        expr = self.visit(assignment.expr)
+
+        def run_assignment(env):
+            env[depth][slot] = expr(env)
+
+        return run_assignment
+
+    def visit_ProcedureCall(self, call):
+        frames, body = self.procedure(call.procedure)
+        args = [self.visit(arg) for arg in call.actual_params]
+        acquire, release, depth = frames.acquire, frames.release, frames.depth
+
+        def run_call(env):
+            frame = acquire([arg(env) for arg in args])
+            caller_frame = env[depth]
+            env[depth] = frame
+            body[0](env)
+            env[depth] = caller_frame
+            release(frame)
+
+        return run_call
+
+    def visit_Empty(self, empty):
+        return None
+
+    def visit_BinOp(self, bin_op):
+        left = self.visit(bin_op.left)
+        right = self.visit(bin_op.right)
+        op = bin_op.op.type
+        if op == PLUS:
+            return lambda env: left(env) + right(env)
+        if op == MINUS:
+            return lambda env: left(env) - right(env)
+        if op == MUL:
+            return lambda env: left(env) * right(env)
+        if op == INT_DIV:
+            return lambda env: left(env) // right(env)
+        if op == REAL_DIV:
+            return lambda env: left(env) / right(env)
+
+    def visit_UnOp(self, un_op):
+        expr = self.visit(un_op.expr)
+        if un_op.op == PLUS:
+            return expr
+        if un_op.op == MINUS:
+            return lambda env: -expr(env)
+
+    def visit_TypedBinOp(self, bin_op):
+        # the node's kind fixes its operation, so a constant or variable
+        # operand is read in the operation's closure instead of one of its own
+        operation, left, right = bin_op.operation, bin_op.left, bin_op.right
+        if right.__class__ is Num:
+            value = right.value
+            if left.__class__ is Variable:
+                var_name, depth, slot = left.value, left.depth, left.slot
+
+                def run_variable_constant(env):
+                    left = env[depth][slot]
+                    if left is None:
+                        raise NameError(repr(var_name))
+                    return operation(left, value)
+
+                return run_variable_constant
+            left = self.visit(left)
+            return lambda env: operation(left(env), value)
+        if right.__class__ is Variable:
+            var_name, depth, slot = right.value, right.depth, right.slot
+            left = self.visit(left)
+
+            def run_variable(env):
+                right = env[depth][slot]
+                if right is None:
+                    raise NameError(repr(var_name))
+                return operation(left(env), right)
+
+            return run_variable
+        right = self.visit(right)
+        if left.__class__ is Num:
+            value = left.value
+            return lambda env: operation(value, right(env))
+        left = self.visit(left)
+        return lambda env: operation(left(env), right(env))
+
+    def visit_Num(self, num):
+        value = num.value
+        return lambda env: value
+
+    def visit_Variable(self, var):
+        var_name, depth, slot = var.value, var.depth, var.slot
+
+        def run_variable(env):
+            value = env[depth][slot]
+            if value is None:
+                raise NameError(repr(var_name))
+            return value
+
+        return run_variable
+
+
+class PythonCompiler(NodeVisitor):
+    """
+    Translates a checked Program tree into Python source for a single
+    function and compiles it. Program variables become the function's
+    locals, procedures nested functions (so Python's own frames serve as
+    their activation records) and operators native Python operators.
+    Calling the compiled function with a memory dict runs the program and
+    stores the variables it assigned in that memory.
+    """
+
+    # operator: (python operator, precedence)
+    BIN_OPS = {
+        PLUS: ("+", 1),
+        MINUS: ("-", 1),
+        MUL: ("*", 2),
+        INT_DIV: ("//", 2),
+        REAL_DIV: ("/", 2),
+    }
+    UN_OPS = {PLUS: "+", MINUS: "-"}
+    UNARY = 3
+    ATOM = 4
+    TYPES = {"INTEGER": "int", "REAL": "float"}
+
+    def compile(self, program):
+        # locals are prefixed with "_" so Pascal names can't clash with Python
+        # keywords; "__" can't start a Pascal identifier, so neither can the
+        # function's own names. Procedures are named _<name>_, which no
+        # Pascal name turns into either.
+        lines = ["def __program__():"]
+        lines.extend(f"    {statement}" for statement in self.body(program))
+        lines.append("    return __locals__()")
+        source = "\n".join(lines) + "\n"
+
+        namespace = {"__builtins__": {}, "__locals__": locals}
+        exec(compile(source, f"<pascal {program.name}>", "exec"), namespace)
+        function = namespace["__program__"]
+
+        def run(memory):
+            for name, value in function().items():
+                if not callable(value):
+                    memory[name[1:]] = value
+
+        run.source = source
+        return run
+
+    def body(self, program):
+        """The lines of the Python function running program."""
+        self.depth = 0
+        self.nonlocals = set()
+        return self.visit(program)
+
+    # statements: each returns a list of lines of Python source
+
+    def visit_Program(self, program):
+        return self.visit(program.block)
+
+    def visit_Block(self, block):
+        statements = []
+        for declaration in block.declarations:
+            statements.extend(self.visit(declaration))
+        statements.extend(self.visit(block.compound_statement))
+        return statements
+
+    def visit_VarDeclaration(self, declaration):
+        # binds the name in this function even if only nested procedures
+        # assign it, so their nonlocal statements find it
+        type_name = self.TYPES[declaration.type_node.value]
+        return [f"_{declaration.var_node.value}: {type_name}"]
+
+    def visit_ProcedureDeclaration(self, procedure):
+        depth, nonlocals = self.depth, self.nonlocals
+        self.depth = checked_scope(procedure).scope_level - 1
+        self.nonlocals = set()
+        body = self.visit(procedure.block)
+        params = ", ".join(f"_{param.var_node.value}" for param in procedure.params)
+        lines = [f"def _{procedure.name}_({params}):"]
+        if self.nonlocals:
+            lines.append(f"    nonlocal {', '.join(sorted(self.nonlocals))}")
+        lines.extend(f"    {statement}" for statement in body or ["pass"])
+        self.depth, self.nonlocals = depth, nonlocals
+        return lines
+
+    def visit_Compound(self, compound):
+        statements = []
+        for statement in compound.statement_list:
+            statements.extend(self.visit(statement))
+        return statements
+
+    def visit_Assignment(self, assignment):
+        var = assignment.var
+        if var.depth < self.depth:
+            self.nonlocals.add(f"_{var.value}")
+        expr, _ = self.visit(assignment.expr)
+        return [f"_{var.value} = {expr}"]
+
+    def visit_ProcedureCall(self, call):
+        args = ", ".join(self.visit(arg)[0] for arg in call.actual_params)
+        return [f"_{call.name}_({args})"]
+
+    def visit_Empty(self, empty):
+        return []
+
+    # expressions: each returns (python source, precedence), parenthesizing
+    # operands only where precedence requires it, so long left-leaning chains
+    # don't nest parentheses
+
+    def visit_BinOp(self, bin_op):
+        op, precedence = self.BIN_OPS[bin_op.op.type]
+        left, left_precedence = self.visit(bin_op.left)
+        right, right_precedence = self.visit(bin_op.right)
+        if left_precedence < precedence:
+            left = f"({left})"
+        if right_precedence <= precedence:
+            right = f"({right})"
+        return f"{left} {op} {right}", precedence
+
+    def visit_UnOp(self, un_op):
+        expr, precedence = self.visit(un_op.expr)
+        if precedence < self.UNARY:
+            expr = f"({expr})"
+        return f"{self.UN_OPS[un_op.op]}{expr}", self.UNARY
+
+    def visit_Num(self, num):
+        return repr(num.value), self.ATOM
+
+    def visit_Variable(self, var):
+        return f"_{var.value}", self.ATOM
+
+
+# instructions of a `Bytecode` program, with the number of operands
+# following each in its code
+INSTRUCTIONS = (
+    ("LOAD", 3),  # depth, slot, name: push display[depth][slot]
+    ("CONST", 1),  # constant: push constants[constant]
+    # operator, then the operands of LOAD or CONST: apply the operator (a
+    # token type) to the top of the stack and what they would push
+    ("OPERATE_LOAD", 4),
+    ("OPERATE_CONST", 2),
+    # LOAD's operands, then OPERATE_CONST's: push the variable's value with
+    # the operator applied to it and the constant
+    ("LOAD_OPERATE_CONST", 5),
+    ("ADD", 0),
+    ("SUB", 0),
+    ("MUL", 0),
+    ("INT_DIV", 0),
+    ("REAL_DIV", 0),
+    ("NEG", 0),
+    ("STORE", 2),  # depth, slot: pop into display[depth][slot]
+    ("CALL", 1),  # procedure: run it, its arguments popped from the stack
+    ("RETURN", 0),
+    ("HALT", 0),
+)
+(
+    LOAD_OP,
+    CONST_OP,
+    OPERATE_LOAD_OP,
+    OPERATE_CONST_OP,
+    LOAD_OPERATE_CONST_OP,
+    ADD_OP,
+    SUB_OP,
+    MUL_OP,
+    INT_DIV_OP,
+    REAL_DIV_OP,
+    NEG_OP,
+    STORE_OP,
+    CALL_OP,
+    RETURN_OP,
+    HALT_OP,
+) = range(len(INSTRUCTIONS))
+
+BINOP_INSTRUCTIONS = {
+    PLUS: ADD_OP,
+    MINUS: SUB_OP,
+    MUL: MUL_OP,
+    INT_DIV: INT_DIV_OP,
+    REAL_DIV: REAL_DIV_OP,
+}
+
+
+class Bytecode:
+    """
+    A checked program compiled by `BytecodeCompiler` for a stack machine:
+    its instructions (see INSTRUCTIONS) in the int array code, the numbers
+    they push in constants and the names of the variables they load in
+    names. The main program starts at 0 and ends with HALT; each procedure
+    is a (entry, depth, params, slot_count) tuple in procedures, its code
+    after the main program's, ending with RETURN. global_names holds the names
+    of the global variables by slot and display_size the number of frames
+    in the display (see `Interpreter`).
+
+    It needs no tree to run: `run(memory)` executes it and stores the
+    assigned global variables in memory. `dump` writes it to a file in the
+    compiled format below and `load` reads it back, so a program can be
+    checked and compiled once and then run without the front end.
+
+    A compiled file is a HEADER (MAGIC, VERSION, display_size, then the
+    number of procedures, code items and constants and the sizes in bytes
+    of the name sections) followed by its sections, all little-endian:
+        procedures    4 int32 per procedure
+        code          int32 per item
+        constants     a struct format character per constant, "q" for an
+                      INTEGER and "d" for a REAL, then their 8-byte values
+        names         names, then global_names, "\n"-separated UTF-8
+    Loaded from a file that can be memory-mapped, code is a memoryview of
+    the mapping rather than an array. The first run copies it to a list,
+    which is faster to index, and later runs reuse that list.
+    """
+
+    MAGIC = b"PASCODE\0"
+    VERSION = 2
+    HEADER = struct.Struct("<8sIIIIIII")
+
+    __slots__ = (
+        "code",
+        "constants",
+        "names",
+        "procedures",
+        "global_names",
+        "display_size",
+        "items",
+    )
+
+    def __init__(self, code, constants, names, procedures, global_names, display_size):
+        self.code = code
+        self.items = None  # code as a list, made by the first run
+        self.constants = constants
+        self.names = names
+        self.procedures = procedures
+        self.global_names = global_names
+        self.display_size = display_size
+
+    def run(self, memory, frames=None):
+        """
+        Execute the code, calls taking frames from instances of frames
+        (`Frames` by default), one per procedure.
+        """
+        frames = frames if frames is not None else Frames
+        if self.items is None:
+            self.items = self.code.tolist()
+        code, constants = self.items, self.constants
+        # the operations by operator token type, faster to index than a dict
+        operations = [OPERATIONS.get(type) for type in range(max(OPERATIONS) + 1)]
+        procedures = [
+            (entry, frames(depth, params, slot_count))
+            for entry, depth, params, slot_count in self.procedures
+        ]
+        display = [[None] * len(self.global_names)]
+        display += [None] * (self.display_size - 1)
+        # the top of the stack is kept in top, the rest in stack. An empty
+        # stack's top is garbage: pushing a value pushes it onto stack, and
+        # STORE and CALL pop it back off
+        stack, calls = [], []
+        push, pop = stack.append, stack.pop
+        top = None
+        pc = 0
+        # the most frequent instructions first
+        while True:
+            op = code[pc]
+            if op == OPERATE_CONST_OP:
+                top = operations[code[pc + 1]](top, constants[code[pc + 2]])
+                pc += 3
+            elif op == LOAD_OP:
+                push(top)
+                top = display[code[pc + 1]][code[pc + 2]]
+                if top is None:
+                    raise NameError(repr(self.names[code[pc + 3]]))
+                pc += 4
+            elif op == STORE_OP:
+                display[code[pc + 1]][code[pc + 2]] = top
+                top = pop()
+                pc += 3
+            elif op == LOAD_OPERATE_CONST_OP:
+                push(top)
+                top = display[code[pc + 1]][code[pc + 2]]
+                if top is None:
+                    raise NameError(repr(self.names[code[pc + 3]]))
+                top = operations[code[pc + 4]](top, constants[code[pc + 5]])
+                pc += 6
+            elif op == OPERATE_LOAD_OP:
+                value = display[code[pc + 2]][code[pc + 3]]
+                if value is None:
+                    raise NameError(repr(self.names[code[pc + 4]]))
+                top = operations[code[pc + 1]](top, value)
+                pc += 5
+            elif op == ADD_OP:
+                top = pop() + top
+                pc += 1
+            elif op == SUB_OP:
+                top = pop() - top
+                pc += 1
+            elif op == CONST_OP:
+                push(top)
+                top = constants[code[pc + 1]]
+                pc += 2
+            elif op == NEG_OP:
+                top = -top
+                pc += 1
+            elif op == MUL_OP:
+                top = pop() * top
+                pc += 1
+            elif op == INT_DIV_OP:
+                top = pop() // top
+                pc += 1
+            elif op == REAL_DIV_OP:
+                top = pop() / top
+                pc += 1
+            elif op == CALL_OP:
+                entry, procedure_frames = procedures[code[pc + 1]]
+                params, depth = procedure_frames.params, procedure_frames.depth
+                if params:
+                    push(top)
+                    args = stack[len(stack) - params :]
+                    del stack[len(stack) - params :]
+                    top = pop()
+                else:
+                    args = []
+                frame = procedure_frames.acquire(args)
+                calls.append((pc + 2, procedure_frames, frame, display[depth]))
+                display[depth] = frame
+                pc = entry
+            elif op == RETURN_OP:
+                pc, procedure_frames, frame, caller_frame = calls.pop()
+                display[procedure_frames.depth] = caller_frame
+                procedure_frames.release(frame)
+            elif op == HALT_OP:
+                break
+            else:
+                raise ValueError(f"Bad instruction {op} at {pc}.")
+        for name, value in zip(self.global_names, display[0]):
+            if value is not None:
+                memory[name] = value
+
+    def dump(self, file):
+        """Write the program to the binary file in the compiled format."""
+        formats = "".join(
+            "d" if type(value) is float else "q" for value in self.constants
+        )
+        try:
+            constants = struct.pack("<" + formats, *self.constants)
+        except struct.error:
+            raise ValueError("An INTEGER constant doesn't fit in 64 bits.") from None
+        names = "\n".join(self.names).encode()
+        global_names = "\n".join(self.global_names).encode()
+        procedures = array("i", [item for entry in self.procedures for item in entry])
+        code = array("i", self.code)
+        if sys.byteorder == "big":
+            procedures.byteswap()
+            code.byteswap()
+        file.write(
+            self.HEADER.pack(
+                self.MAGIC,
+                self.VERSION,
+                self.display_size,
+                len(self.procedures),
+                len(code),
+                len(self.constants),
+                len(names),
+                len(global_names),
+            )
+        )
+        for section in (procedures, code, formats.encode(), constants):
+            file.write(section)
+        file.write(names)
+        file.write(global_names)
+
+    @classmethod
+    def load(cls, file):
+        """Read a program in the compiled format from the binary file."""
+        data = map_file(file)
+        if data is file:
+            data = file.read()
+        view = memoryview(data)
+        if len(view) < cls.HEADER.size or view[:8] != cls.MAGIC:
+            raise ValueError("Not a compiled Pascal program.")
+        (
+            _,
+            version,
+            display_size,
+            procedure_count,
+            code_size,
+            constant_count,
+            names_size,
+            global_names_size,
+        ) = cls.HEADER.unpack_from(view)
+        if version != cls.VERSION:
+            raise ValueError(
+                f"Compiled format version {version}, this interpreter reads"
+                f" {cls.VERSION}."
+            )
+        offsets = [cls.HEADER.size]
+        for size in (
+            16 * procedure_count,
+            4 * code_size,
+            constant_count,
+            8 * constant_count,
+            names_size,
+            global_names_size,
+        ):
+            offsets.append(offsets[-1] + size)
+        if offsets[-1] != len(view):
+            raise ValueError("Truncated or damaged compiled Pascal program.")
+        sections = [view[start:end] for start, end in zip(offsets, offsets[1:])]
+        procedures, code, formats, constants, names, global_names = sections
+        if sys.byteorder == "big":
+            procedures, code = array("i", procedures), array("i", code)
+            procedures.byteswap()
+            code.byteswap()
+        else:
+            procedures, code = procedures.cast("i"), code.cast("i")
+        procedures = procedures.tolist()
+        formats = "<" + bytes(formats).decode()
+        return cls(
+            code,
+            list(struct.unpack(formats, constants)),
+            bytes(names).decode().split("\n") if names_size else [],
+            [tuple(procedures[i : i + 4]) for i in range(0, len(procedures), 4)],
+            bytes(global_names).decode().split("\n") if global_names_size else [],
+            display_size,
+        )
+
+    def disassemble(self):
+        """A listing of the program, one line per instruction."""
+        lines = [
+            f"compiled Pascal program, format version {self.VERSION}",
+            f"display size {self.display_size},"
+            f" globals {', '.join(self.global_names) or '-'}",
+            f"{len(self.code)} code items, {len(self.constants)} constants,"
+            f" {len(self.procedures)} procedures",
+        ]
+        entries = {}
+        for index, (entry, depth, params, slot_count) in enumerate(self.procedures):
+            entries[entry] = index
+            lines.append(
+                f"procedure {index}: entry {entry}, depth {depth},"
+                f" {params} params, {slot_count} slots"
+            )
+        code, pc = self.code, 0
+        while pc < len(code):
+            if pc == 0 or pc in entries:
+                lines.append("main:" if pc == 0 else f"procedure {entries[pc]}:")
+            name, operand_count = INSTRUCTIONS[code[pc]]
+            operands = list(code[pc + 1 : pc + 1 + operand_count])
+            if name.startswith("OPERATE_"):
+                operands[0] = TOKEN_NAMES[operands[0]]
+            if name == "LOAD_OPERATE_CONST":
+                operands[2] = f"({self.names[operands[2]]})"
+                operands[3] = TOKEN_NAMES[operands[3]]
+            if name.endswith("LOAD"):
+                operands[-1] = f" ({self.names[operands[-1]]})"
+            elif name.endswith("CONST"):
+                operands[-1] = f"{operands[-1]}  ({self.constants[operands[-1]]!r})"
+            elif name == "CALL":
+                entry = self.procedures[operands[-1]][0]
+                operands[-1] = f"{operands[-1]}  (entry {entry})"
+            lines.append(f"{pc:8}  {name:<18} {' '.join(map(str, operands))}".rstrip())
+            pc += 1 + operand_count
+        return lines
+
+
+class BytecodeCompiler(NodeVisitor):
+    """
+    Translates a checked Program tree into a `Bytecode` program. Statements
+    compile to instructions in order; expressions to the instructions
+    computing their operands, then their operator's.
+    """
+
+    def compile(self, program):
+        self.code = array("i")
+        self.constants, self.constant_indices = [], {}
+        self.names, self.name_indices = [], {}
+        self.called, self.procedure_indices = [], {}
+        self.visit(program.block)
+        self.code.append(HALT_OP)
+        procedures = []
+        # compiling a procedure appends the ones it calls to self.called, so
+        # this reaches every procedure that can run
+        for procedure in self.called:
+            scope = checked_scope(procedure)
+            entry = len(self.code)
+            procedures.append(
+                (entry, scope.scope_level - 1, len(procedure.params), scope.slot_count)
+            )
+            self.visit(procedure.block)
+            self.code.append(RETURN_OP)
+        return Bytecode(
+            self.code,
+            self.constants,
+            self.names,
+            procedures,
+            checked_scope(program).slot_names(),
+            display_size(program.block),
+        )
+
+    def visit_Block(self, block):
+        self.visit(block.compound_statement)
+
+    def visit_Compound(self, compound):
+        for statement in compound.statement_list:
+            self.visit(statement)
+
+    def visit_Assignment(self, assignment):
+        var = assignment.var
+        self.visit(assignment.expr)
+        self.code.extend((STORE_OP, var.depth, var.slot))
+
+    def visit_ProcedureCall(self, call):
+        for arg in call.actual_params:
+            self.visit(arg)
+        procedure = call.procedure
+        index = self.procedure_indices.get(procedure)
+        if index is None:
+            index = self.procedure_indices[procedure] = len(self.called)
+            self.called.append(procedure)
+        self.code.extend((CALL_OP, index))
+
+    def visit_Empty(self, empty):
+        pass
+
+    visit_BinOp = visit_UnOp = NodeVisitor.postorder
+
+    def leave_BinOp(self, bin_op, left, right):
+        # a leaf right operand, just compiled, is fused with the operator,
+        # and a variable left operand, compiled just before it, with both
+        code, op = self.code, bin_op.op.type
+        if bin_op.right.__class__ is Variable:
+            code[-4:] = array("i", (OPERATE_LOAD_OP, op, *code[-3:]))
+        elif bin_op.right.__class__ is Num:
+            if bin_op.left.__class__ is Variable:
+                load = (LOAD_OPERATE_CONST_OP, *code[-5:-2], op, code[-1])
+                code[-6:] = array("i", load)
+            else:
+                code[-2:] = array("i", (OPERATE_CONST_OP, op, code[-1]))
+        else:
+            code.append(BINOP_INSTRUCTIONS[op])
+
+    def leave_UnOp(self, un_op, expr):
+        if un_op.op == MINUS:
+            self.code.append(NEG_OP)
+
+    def visit_Num(self, num):
+        # by repr, not value: 0.0 == -0.0, and 1 == 1.0 as well
+        key = (type(num.value), repr(num.value))
+        index = self.constant_indices.get(key)
+        if index is None:
+            index = self.constant_indices[key] = len(self.constants)
+            self.constants.append(num.value)
+        self.code.extend((CONST_OP, index))
+
+    def visit_Variable(self, var):
+        index = self.name_indices.get(var.value)
+        if index is None:
+            index = self.name_indices[var.value] = len(self.names)
+            self.names.append(var.value)
+        self.code.extend((LOAD_OP, var.depth, var.slot, index))
+
+
+#############################################
+# 				  	Profiler				#
+#############################################
+
+
+class Profile:
+    """
+    Visit counts and cumulative and self times by node class and by
+    statement, recorded by the visitors it is attached to (pass it to
+    `Interpreter` or `SemanticAnalyzer` as profile).
+
+    `attach` shadows the visitor's `visit` with a timing wrapper in the
+    instance's own dict, so visitors without a profile run the plain
+    class method with no check for one. Cumulative time counts only the
+    outermost of nested visits of the same node class or statement, as
+    cProfile does for recursive functions.
+
+    The visitors evaluate and check expressions without a visit per BinOp,
+    UnOp and TypedBinOp node, so the wrapper visits those itself, by
+    recursion, and hands their operands to the visitor's leave_BinOp and
+    leave_UnOp or the TypedBinOp's operation: every node of an expression
+    is counted and timed. It shadows the visitor's `postorder` too, for
+    expressions too deep for recursion, with a walk that counts and times
+    them the same way.
+    """
+
+    STATEMENTS = (Assignment, ProcedureCall)
+
+    def __init__(self):
+        # node class or statement node: [calls, cumulative, self]
+        self.node_types = {}
+        self.statements = {}
+
+    def attach(self, visitor):
+        original = type(visitor).visit.__get__(visitor)
+        leave_bin_op, leave_un_op = visitor.leave_BinOp, visitor.leave_UnOp
+        perf_counter = time.perf_counter
+        node_types, statements = self.node_types, self.statements
+        statement_classes = self.STATEMENTS
+        children_time = [0.0]  # time spent in the children of each open visit
+        active = {}  # open visits by node class and by statement
+
+        def record(stats, key, elapsed, self_time):
+            entry = stats.get(key)
+            if entry is None:
+                entry = stats[key] = [0, 0.0, 0.0]
+            entry[0] += 1
+            active[key] -= 1
+            if not active[key]:
+                entry[1] += elapsed
+            entry[2] += self_time
+
+        def leave(node_class, start):
+            elapsed = perf_counter() - start
+            self_time = elapsed - children_time.pop()
+            children_time[-1] += elapsed
+            record(node_types, node_class, elapsed, self_time)
+
+        def visit(node):
+            node_class = node.__class__
+            is_statement = node_class in statement_classes
+            active[node_class] = active.get(node_class, 0) + 1
+            if is_statement:
+                active[node] = active.get(node, 0) + 1
+            children_time.append(0.0)
+            start = perf_counter()
+            try:
+                if node_class is BinOp:
+                    return leave_bin_op(node, visit(node.left), visit(node.right))
+                if node_class is UnOp:
+                    return leave_un_op(node, visit(node.expr))
+                if node_class is TypedBinOp:
+                    return node.operation(visit(node.left), visit(node.right))
+                return original(node)
+            finally:
+                elapsed = perf_counter() - start
+                self_time = elapsed - children_time.pop()
+                children_time[-1] += elapsed
+                record(node_types, node_class, elapsed, self_time)
+                if is_statement:
+                    record(statements, node, elapsed, self_time)
+
+        operators = (BinOp, UnOp, TypedBinOp)
+
+        def postorder(node):
+            # the operators being visited wait on the stack as
+            # (node, start, operand values) until their operands have values
+            stack = []
+            try:
+                while True:
+                    node_class = node.__class__
+                    while node_class in operators:
+                        active[node_class] = active.get(node_class, 0) + 1
+                        children_time.append(0.0)
+                        stack.append((node, perf_counter(), []))
+                        node = node.expr if node_class is UnOp else node.left
+                        node_class = node.__class__
+                    value = visit(node)
+                    while stack:
+                        node, start, operands = stack[-1]
+                        operands.append(value)
+                        node_class = node.__class__
+                        if node_class is not UnOp and len(operands) == 1:
+                            node = node.right
+                            break
+                        stack.pop()
+                        if node_class is BinOp:
+                            value = leave_bin_op(node, *operands)
+                        elif node_class is UnOp:
+                            value = leave_un_op(node, *operands)
+                        else:
+                            value = node.operation(*operands)
+                        leave(node_class, start)
+                    else:
+                        return value
+            finally:
+                # the visits still open when an operation raises
+                while stack:
+                    node, start, _ = stack.pop()
+                    leave(node.__class__, start)
+
+        visitor.visit = visit
+        visitor.postorder = postorder
+
+    def node_type_rows(self):
+        """(name, calls, cumulative, self) per node class, most self time first."""
+        rows = [(key.__name__, *entry) for key, entry in self.node_types.items()]
+        return sorted(rows, key=lambda row: row[3], reverse=True)
+
+    def statement_rows(self):
+        """
+        (source, calls, cumulative, self) per statement, most cumulative time
+        first: a statement's own time is mostly spent in its expressions.
+        """
+        rows = [(self.label(key), *entry) for key, entry in self.statements.items()]
+        return sorted(rows, key=lambda row: row[2], reverse=True)
+
+    @staticmethod
+    def label(statement):
+        """The source of the statement, cut short if it is too deep to write."""
+        if not statement.deep:
+            return source(statement)
+        if isinstance(statement, Assignment):
+            return f"{statement.var.value} := ..."
+        return f"{statement.name}(...)"
+
+    def report(self, limit=20):
+        """
+        A text report of the node classes and the top limit statements. Per
+        call is the time they are sorted by divided by the calls.
+        """
+        lines = []
+        for title, rows, column in (
+            ("node type", self.node_type_rows(), 3),
+            ("statement", self.statement_rows()[:limit], 2),
+        ):
+            lines.append(
+                f"{title:<40} {'calls':>9} {'cumulative':>11} {'self':>11}"
+                f" {'per call':>11}"
+            )
+            for row in rows:
+                name, calls, cumulative, self_time = row
+                if len(name) > 40:
+                    name = name[:37] + "..."
+                lines.append(
+                    f"{name:<40} {calls:9} {cumulative:10.4f}s {self_time:10.4f}s"
+                    f" {row[column] / calls * 1e6:9.2f}us"
+                )
+            lines.append("")
+        return "\n".join(lines)
+
+    def dump(self):
+        """The rows of the profile as JSON-ready dicts."""
+        fields = ("name", "calls", "cumulative", "self")
+        return {
+            "node_types": [dict(zip(fields, row)) for row in self.node_type_rows()],
+            "statements": [dict(zip(fields, row)) for row in self.statement_rows()],
+        }
+
+
+# operator: (source, precedence)
+SOURCE_OPS = {
+    PLUS: ("+", 1),
+    MINUS: ("-", 1),
+    MUL: ("*", 2),
+    INT_DIV: ("DIV", 2),
+    REAL_DIV: ("/", 2),
+}
+
+
+def source(node, precedence=0):
+    """Pascal source of a statement or expression node, to label it with."""
+    if isinstance(node, Assignment):
+        return f"{node.var.value} := {source(node.expr)}"
+    if isinstance(node, ProcedureCall):
+        return f"{node.name}({', '.join(map(source, node.actual_params))})"
+    if isinstance(node, BinOp):
+        op, op_precedence = SOURCE_OPS[node.op.type]
+        text = (
+            f"{source(node.left, op_precedence)} {op}"
+            f" {source(node.right, op_precedence + 1)}"
+        )
+        return f"({text})" if op_precedence < precedence else text
+    if isinstance(node, UnOp):
+        return node.op_value + source(node.expr, 3)
+    if isinstance(node, TypedBinOp):
+        return f"{node.kind}({source(node.left)}, {source(node.right)})"
+    if isinstance(node, Num):
+        return str(node.value)
+    if isinstance(node, Variable):
+        return node.value
+    return type(node).__name__
+
+
+#############################################
+# 				  	Cache					#
+#############################################
+
+
+class ParseCache:
+    """
+    On-disk cache of front end results (checked trees, FlatTrees), so that
+    runs over unchanged programs skip lexing, parsing and analysis.
+
+    Entries are pickles named after a hash of the source text, the kind of
+    result and the interpreter's own source, so editing the interpreter
+    invalidates every entry. Each file starts with MAGIC and the SHA-256 of
+    its pickle; an entry that fails the check or doesn't unpickle counts as
+    corrupt, is deleted and reads as a miss. Entries are written to a
+    temporary file and renamed into place, so readers never see half an
+    entry. Reading an entry marks it used; after each write the least
+    recently used entries are deleted until the directory holds at most
+    max_bytes of entries.
+
+    Only point a cache at a directory you trust: loading an entry unpickles
+    it.
+    """
+
+    MAGIC = b"PASCACHE"
+    SUFFIX = ".ast"
+
+    def __init__(self, directory, max_bytes=256 << 20):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        with open(__file__, "rb") as file:
+            self.version = hashlib.sha256(file.read()).digest()
+        self.hits = self.misses = self.corrupt = 0
+
+    def hasher(self, kind):
+        hasher = hashlib.sha256(self.version)
+        hasher.update(kind.encode() + b"\0")
+        return hasher
+
+    def key(self, kind, source):
+        """Key for the kind of result built from source, a str or bytes."""
+        hasher = self.hasher(kind)
+        hasher.update(source.encode() if isinstance(source, str) else source)
+        return hasher.hexdigest()
+
+    def file_key(self, kind, path, chunk_size=1 << 20):
+        """Key for the kind of result built from the file at path."""
+        hasher = self.hasher(kind)
+        with open(path, "rb") as file:
+            for chunk in iter(lambda: file.read(chunk_size), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.SUFFIX)
+
+    def get(self, key):
+        """The entry stored under key, or None."""
+        path = self.path(key)
+        try:
+            with open(path, "rb") as file:
+                data = file.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        header = len(self.MAGIC) + 32
+        payload = data[header:]
+        try:
+            if data[:header] != self.MAGIC + hashlib.sha256(payload).digest():
+                raise ValueError("bad header or checksum")
+            value = pickle.loads(payload)
+        except Exception:
+            self.corrupt += 1
+            self.misses += 1
+            self.remove(path)
+            return None
+        self.hits += 1
+        try:
+            os.utime(path)
+        except FileNotFoundError:  # evicted by another process since the read
+            pass
+        return value
+
+    def put(self, key, value):
+        """Store value under key. Values too deep to pickle aren't cached."""
+        try:
+            payload = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            return
+        digest = hashlib.sha256(payload).digest()
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                file.write(self.MAGIC + digest + payload)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            self.remove(temp_path)
+            raise
+        self.evict()
+
+    def fetch(self, key, build):
+        """The entry stored under key, or build() stored under key."""
+        value = self.get(key)
+        if value is None:
+            value = build()
+            self.put(key, value)
+        return value
+
+    def evict(self):
+        """Delete the least recently used entries down to max_bytes."""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:  # evicted by another process
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+
+    @staticmethod
+    def remove(path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+#############################################
+# 				  	Batch					#
+#############################################
+
+
+class ProgramTimeout(Exception):
+    pass
+
+
+def raise_timeout(signum, frame):
+    raise ProgramTimeout()
+
+
+def check_and_run(lexer, engine, fold):
+    """Parse, check, fold and run; return the global variables."""
+    tree = Parser(lexer).parse()
+    SemanticAnalyzer().visit(tree)
+    if fold:
+        tree = ConstantFolder().fold(tree)
+    interpreter = Interpreter(tree, engine)
+    interpreter.interpret()
+    return interpreter.GLOBAL_MEMORY
+
+
+def run_program(path, timeout=None, lexer="scan", engine="tree", fold=True):
+    """
+    Run the program in path from scratch and return what happened as a dict:
+        source   path
+        status   "ok", "error" or "timeout"
+        globals  the global variables after the run ("ok" only)
+        error    the exception, as text ("error" only)
+        seconds  how long the program took, front end included
+    A program still running after timeout seconds is stopped by SIGALRM, so
+    timeouts only work where there is one, and only in the main thread.
+    """
+    start = time.perf_counter()
+    result = {"source": path}
+    alarm = (
+        timeout is not None
+        and hasattr(signal, "SIGALRM")
+        and threading.current_thread() is threading.main_thread()
+    )
+    if alarm:
+        previous = signal.signal(signal.SIGALRM, raise_timeout)
+    try:
+        try:
+            if alarm:
+                signal.setitimer(signal.ITIMER_REAL, timeout)
+            if lexer == "stream":
+                with open(path, "rb") as file:
+                    memory = check_and_run(StreamLexer(map_file(file)), engine, fold)
+            else:
+                with open(path, "r") as file:
+                    text = file.read()
+                memory = check_and_run(LEXERS[lexer](text), engine, fold)
+        finally:
+            # disarmed before anything else, so an alarm can only interrupt
+            # the program, and one that fires on the way out is a timeout too
+            if alarm:
+                signal.setitimer(signal.ITIMER_REAL, 0)
+        result["status"] = "ok"
+        result["globals"] = memory
+    except ProgramTimeout:
+        result["status"] = "timeout"
+    except Exception as error:
+        result["status"] = "error"
+        result["error"] = f"{type(error).__name__}: {error}"
+    finally:
+        if alarm:
+            signal.signal(signal.SIGALRM, previous)
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def run_programs(paths, timeout=None, **options):
+    return [run_program(path, timeout, **options) for path in paths]
+
+
+def program_paths(source):
+    """
+    The programs in source: the files in it, sorted by name, if it is a
+    directory, or else the paths it lists one per line, relative to itself.
+    Blank lines and lines starting with # are skipped.
+    """
+    if os.path.isdir(source):
+        return sorted(
+            entry.path
+            for entry in os.scandir(source)
+            if entry.is_file() and not entry.name.startswith(".")
+        )
+    directory = os.path.dirname(source)
+    with open(source, "r") as file:
+        lines = [line.strip() for line in file]
+    return [
+        os.path.join(directory, line)
+        for line in lines
+        if line and not line.startswith("#")
+    ]
+
+
+def run_batch(
+    paths,
+    jobs=None,
+    timeout=None,
+    ordered=True,
+    chunk_size=None,
+    threads=False,
+    **options,
+):
+    """
+    Run the programs in paths with `run_program` across a pool of jobs
+    processes (one per CPU by default) and yield their results, in the order
+    of paths or, if not ordered, as they finish. Every worker imports this
+    module once and then runs many programs, each in its own Interpreter.
+    Programs are sent to the workers chunk_size at a time; by default about
+    four chunks per worker, and at most 64 programs per chunk. A chunk's
+    results arrive together when its last program ends, so unordered results
+    come a chunk at a time, in the chunk's order.
+    With threads, the workers are threads of this process instead. The GIL
+    keeps them from running Python in parallel, and timeouts don't work in
+    them, but they share every module and the interpreters stay isolated.
+    The other keyword arguments are passed on to `run_program`.
+    """
+    paths = list(paths)
+    jobs = jobs or os.cpu_count() or 1
+    if chunk_size is None:
+        chunk_size = max(1, min(64, len(paths) // (4 * jobs)))
+    chunks = [paths[i : i + chunk_size] for i in range(0, len(paths), chunk_size)]
+    executor = ThreadPoolExecutor if threads else ProcessPoolExecutor
+    with executor(jobs) as pool:
+        futures = [
+            pool.submit(run_programs, chunk, timeout, **options) for chunk in chunks
+        ]
+        for future in futures if ordered else as_completed(futures):
+            yield from future.result()
+
+
+#############################################
+# 				  	Main					#
+#############################################
+
+
+def main():
+    import argparse
+    import json
+
+    arg_parser = argparse.ArgumentParser(description="Simple Pascal Interpreter")
+    arg_parser.add_argument(
+        "source",
+        nargs="?",
+        default="/Users/paultalma/Programming/simple-interpreters/pascal-interpreter/test.txt",
+    )
+    arg_parser.add_argument("--lexer", choices=LEXERS, default="scan")
+    arg_parser.add_argument("--engine", choices=Interpreter.ENGINES, default="tree")
+    arg_parser.add_argument(
+        "--frames",
+        choices=FRAMES,
+        default="new",
+        help="how procedure calls get their frames (tree and closure engines)",
+    )
+    arg_parser.add_argument(
+        "--flat", action="store_true", help="parse into a FlatTree (tree engine only)"
+    )
+    arg_parser.add_argument(
+        "--no-fold", action="store_true", help="skip constant folding"
+    )
+    arg_parser.add_argument(
+        "--specialize",
+        action="store_true",
+        help="run type-specialized arithmetic nodes (tree and closure engines)",
+    )
+    arg_parser.add_argument(
+        "--trace",
+        choices=("scopes", "symbols"),
+        help="trace the semantic analyzer's scopes, or its scopes and symbols",
+    )
+    arg_parser.add_argument("--trace-file", help="write the trace here, not stdout")
+    arg_parser.add_argument(
+        "--cache-dir", help="reuse checked trees cached here (not while tracing)"
+    )
+    arg_parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="profile the analyzer and the (tree engine) run, and print a report",
+    )
+    arg_parser.add_argument("--profile-json", help="save the profiles here as JSON")
+    arg_parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="source is a directory of programs, or a file listing them; run them"
+        " all in a process pool and print a JSON line for each",
+    )
+    arg_parser.add_argument(
+        "--jobs", type=int, help="worker processes for --batch (default: CPUs)"
+    )
+    arg_parser.add_argument(
+        "--timeout", type=float, help="seconds each --batch program may take"
+    )
+    arg_parser.add_argument(
+        "--threads",
+        action="store_true",
+        help="run --batch programs in threads, not processes (no --timeout)",
+    )
+    arg_parser.add_argument(
+        "--unordered",
+        action="store_true",
+        help="print --batch results as they finish, not in program order (a"
+        " chunk of up to 64 programs at a time)",
+    )
+    arg_parser.add_argument(
+        "--save-bytecode",
+        metavar="FILE",
+        help="also compile the checked program for the bytecode engine into FILE",
+    )
+    arg_parser.add_argument(
+        "--bytecode",
+        action="store_true",
+        help="source is a program compiled by --save-bytecode; run it as it is",
+    )
+    arg_parser.add_argument(
+        "--inspect",
+        action="store_true",
+        help="source is a program compiled by --save-bytecode; list it",
+    )
+    args = arg_parser.parse_args()
+    if args.flat and args.engine != "tree":
+        arg_parser.error("--flat only runs on the tree engine")
+    if args.flat and args.save_bytecode is not None:
+        arg_parser.error("--save-bytecode compiles objects, not --flat trees")
+    if args.specialize and (args.flat or args.engine not in ("tree", "closure")):
+        arg_parser.error("--specialize only runs on the tree and closure engines")
+    profiling = args.profile or args.profile_json is not None
+    if profiling and (args.flat or args.engine != "tree"):
+        arg_parser.error("--profile only works with the tree engine and objects")
+    if args.batch:
+        if (
+            args.flat
+            or args.trace
+            or args.cache_dir
+            or profiling
+            or args.frames != "new"
+            or args.specialize
+            or args.save_bytecode is not None
+        ):
+            arg_parser.error(
+                "--batch can't be combined with --flat, --trace, --cache-dir,"
+                " --profile, --frames, --specialize or --save-bytecode"
+            )
+        if args.threads and args.timeout is not None:
+            arg_parser.error("--timeout needs worker processes, not --threads")
+        results = run_batch(
+            program_paths(args.source),
+            args.jobs,
+            args.timeout,
+            not args.unordered,
+            threads=args.threads,
+            lexer=args.lexer,
+            engine=args.engine,
+            fold=not args.no_fold,
+        )
+        for result in results:
+            print(json.dumps(result), flush=True)
+        return
+    if args.bytecode or args.inspect:
+        if args.flat or args.trace or args.cache_dir or profiling:
+            arg_parser.error(
+                "--bytecode and --inspect can't be combined with --flat, --trace,"
+                " --cache-dir or --profile"
+            )
+        with open(args.source, "rb") as file:
+            bytecode = Bytecode.load(file)
+        if args.inspect:
+            print("\n".join(bytecode.disassemble()))
+        else:
+            bytecode.run({}, FRAMES[args.frames])
+        return
+
+    print("=" * 41)
+    print("Welcome to your Simple Pascal Interpreter")
+    print("=" * 41)
+
+    def open_lexer():
+        if args.lexer == "stream":
+            return StreamLexer(map_file(open(args.source, "rb")))
+        with open(args.source, "r") as file:
+            return LEXERS[args.lexer](file.read())
+
+    trace = trace_file = None
+    if args.trace is not None:
+        level = TRACE_SCOPES if args.trace == "scopes" else TRACE_SYMBOLS
+        if args.trace_file:
+            trace_file = open(args.trace_file, "w")
+        trace = TraceSink(trace_file or sys.stdout, level)
+
+    def check_flat():
+        tree = FlatTree()
+        Parser(open_lexer(), tree).parse()
+        FlatSemanticAnalyzer(tree, trace).visit(tree.root)
+        return tree
+
+    profiles = {"analysis": Profile(), "run": Profile()} if profiling else {}
+
+    def check():
+        parser = Parser(open_lexer())
+        tree = parser.parse()
+        symbol_table_builder = SemanticAnalyzer(trace, profiles.get("analysis"))
+        symbol_table_builder.visit(tree)
+        return tree
+
+    front_end = check_flat if args.flat else check
+    try:
+        if args.cache_dir is not None and trace is None and not profiling:
+            cache = ParseCache(args.cache_dir)
+            key = cache.file_key("flat" if args.flat else "checked", args.source)
+            tree = cache.fetch(key, front_end)
+        else:
+            tree = front_end()
+    finally:
+        # only the analyzer traces, so the file is done with
+        if trace_file is not None:
+            trace_file.close()
+
+    if args.flat:
+        result = FlatInterpreter(tree, FRAMES[args.frames]).interpret()
+        return
+
+    if not args.no_fold:
+        folder = ConstantFolder()
+        tree = folder.fold(tree)
+        print(f"Constant folding removed {folder.removed} nodes.")
+
+    if args.save_bytecode is not None:
+        with open(args.save_bytecode, "wb") as file:
+            BytecodeCompiler().compile(tree).dump(file)
+    if args.specialize:
+        tree = TypeSpecializer().specialize(tree)
+
+    interpreter = Interpreter(
+        tree, args.engine, FRAMES[args.frames], profiles.get("run")
+    )
+    result = interpreter.interpret()
+
+    if args.profile:
+        for name, profile in profiles.items():
+            print(f"\nProfile of the {name}:\n")
+            print(profile.report())
+    if args.profile_json is not None:
+        with open(args.profile_json, "w") as file:
+            json.dump({name: p.dump() for name, p in profiles.items()}, file, indent=2)
 
 
 if __name__ == "__main__":
@@ -1,773 +1,210 @@
-# grammar:
-# program : PROGRAM variable SEMI block DOT
-# block : declarations compound_statement
-# declarations : VAR (variable_declaration SEMI)+
-# 			   | (PROCEDURE ID (LP formal_parameter_list RP)? SEMI block SEMI)*
-# 			   | empty
-# variable_declaration : ID ((COMMA ID)* COLON type_spec)
-# type_spec : INTEGER
-# 			| REAL
-# formal_parameter_list : formal_parameters
-# 						| formal_parameters SEMI formal_parameter_list
-# formal_parameter : ID (COMMA ID)* COLON type_spec
-# compound_statement : BEGIN statement_list END
-# statement_list : statement |
-# 				 statement SEMI statement_list
-# statement : compound_statement
-# 			| assignment_statement
-# 			| empty
-# assignment_statement : variable ASSIGN expr
-# empty :
-# expr : term ((PLUS | MINUS) term)*
-# term : factor ((MUL | INT_DIV | REAL_DIV) factor)*
-# factor : (PLUS | MINUS)factor
-# 		 | INT_CONST
-# 		 | REAL_CONST
-# 		 | LP expr RP
-# 		 | variable
-# variable: ID
-from collections import OrderedDict
+# Source to source compiler: recompiles a Pascal program to Pascal.
+# The lexer, parser and AST (and its grammar) live in pascal-interpreter.py.
+import importlib.util
+import itertools
+import os
+import sys
+
+
+def load_interpreter():
+    """Import pascal-interpreter.py, whose name can't be used in an import."""
+    if "pascal_interpreter" in sys.modules:
+        return sys.modules["pascal_interpreter"]
+    directory = os.path.dirname(os.path.abspath(__file__))
+    path = os.path.join(directory, "pascal-interpreter.py")
+    spec = importlib.util.spec_from_file_location("pascal_interpreter", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules["pascal_interpreter"] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+load_interpreter()
+from pascal_interpreter import (
+    BINOP_NODE,
+    BinOp,
+    ConstantFolder,
+    FlatTree,
+    FlatVisitor,
+    INT_CONST,
+    INT_DIV,
+    LEXERS,
+    MINUS,
+    MUL,
+    NUM_NODE,
+    NodeVisitor,
+    Num,
+    PLUS,
+    ParseCache,
+    Parser,
+    PythonCompiler,
+    REAL_DIV,
+    SemanticAnalyzer,
+    StreamLexer,
+    UNOP_NODE,
+    UnOp,
+    VARIABLE_NODE,
+    Variable,
+    binop_type,
+    checked_scope,
+    map_file,
+)
 
 #############################################
-# 					Tokens					#
+# 				  Recompiler				#
 #############################################
 
 
-class Token:
-    def __init__(self, type, value):
-        self.type = type
-        self.value = value
-
-    def __str__(self):
-        """String representation of the class instance.
-
-        Examples:
-            Token(INTEGER, 3)
-            Token(PLUS, '+')
-            Token(MUL, '*')
-        """
-        return f"Token({self.type}, {repr(self.value)})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-# token types
-INTEGER = "INTEGER"
-REAL = "REAL"
-INT_CONST = "INT_CONST"
-REAL_CONST = "REAL_CONST"
-PLUS = "PLUS"
-MINUS = "MINUS"
-MUL = "MUL"
-INT_DIV = "INT_DIV"
-REAL_DIV = "REAL_DIV"
-LP = "LP"
-RP = "RP"
-BEGIN = "BEGIN"
-END = "END"
-COMMA = "COMMA"
-COLON = "COLON"
-DOT = "DOT"
-ID = "ID"
-ASSIGN = "ASSIGN"
-SEMI = "SEMI"
-PROGRAM = "PROGRAM"
-VAR = "VAR"
-PROCEDURE = "PROCEDURE"
-EOS = "EOS"
-
-RESERVED_KEYWORDS = {
-    "BEGIN": Token(BEGIN, "BEGIN"),
-    "END": Token(END, "END"),
-    "DIV": Token(INT_DIV, "DIV"),
-    "VAR": Token(VAR, "VAR"),
-    "INTEGER": Token(INTEGER, "INTEGER"),
-    "REAL": Token(REAL, "REAL"),
-    "PROGRAM": Token(PROGRAM, "PROGRAM"),
-    "PROCEDURE": Token(PROCEDURE, "PROCEDURE"),
-}
-
-#############################################
-# 					Lexer					#
-#############################################
-
-
-class Lexer:
-    def __init__(self, text):
-        self.text = text
-        self.pos = 0
-        self.max_len = len(text)
-        self.ch = text[0]
-
-    def advance(self):
-        self.pos += 1
-        if self.pos < self.max_len:
-            self.ch = self.text[self.pos]
-        else:
-            self.ch = None
-
-    def skip_spaces(self):
-        while self.ch is not None and self.ch.isspace():
-            self.advance()
-
-    def get_num(self):
-        num = ""
-        while self.ch is not None and self.ch.isdigit():
-            num += self.ch
-            self.advance()
-
-        if self.ch == "." and self.peek().isdigit():
-            num += self.ch
-            self.advance()
-            while self.ch is not None and self.ch.isdigit():
-                num += self.ch
-                self.advance()
-            return Token(REAL_CONST, float(num))
-
-        return Token(INT_CONST, int(num))
-
-    def peek(self):
-        if self.pos + 1 < self.max_len:
-            return self.text[self.pos + 1]
-        else:
-            return None
-
-    def error(self):
-        raise Exception("Lexer error.")
-
-    def skip_comment(self):
-        stack = ["{"]
-        while stack:
-            self.advance()
-            if self.ch is not None and self.ch == "{":
-                stack.append(self.ch)
-            if self.ch is not None and self.ch == "}":
-                stack.pop()
-            if self.ch is None:
-                raise Exception("Unclosed comment.")
-        self.advance()
-
-    def _id(self):
-        id = ""
-        if self.ch == "_":
-            if self.peek() is not None and not self.peek().isalnum():
-                self.error()
-            id += self.ch
-            self.advance()
-        while self.ch is not None and self.ch.isalnum():
-            id += self.ch.upper()
-            self.advance()
-
-        token = RESERVED_KEYWORDS.get(id, Token(ID, id.lower()))
-        return token
-
-    def get_token(self):
-        if self.pos >= self.max_len:
-            return Token(EOS, None)
-
-        if self.ch.isspace():
-            self.skip_spaces()
-            return self.get_token()
-
-        if self.ch.isdigit():
-            return self.get_num()
-
-        if self.ch == "+":
-            self.advance()
-            return Token(PLUS, "+")
-
-        if self.ch == "-":
-            self.advance()
-            return Token(MINUS, "-")
-
-        if self.ch == "*":
-            self.advance()
-            return Token(MUL, "*")
-
-        if self.ch == "/":
-            self.advance()
-            return Token(REAL_DIV, "/")
-
-        if self.ch == "(":
-            self.advance()
-            return Token(LP, "(")
-
-        if self.ch == ")":
-            self.advance()
-            return Token(RP, ")")
-
-        if self.ch == ",":
-            self.advance()
-            return Token(COMMA, ",")
-
-        if self.ch == ".":
-            self.advance()
-            return Token(DOT, ".")
-
-        if self.ch == ":" and self.peek() == "=":
-            self.advance()
-            self.advance()
-            return Token(ASSIGN, ":=")
-
-        if self.ch == ":":
-            self.advance()
-            return Token(COLON, ":")
-
-        if self.ch == ";":
-            self.advance()
-            return Token(SEMI, ";")
-
-        if self.ch.isalpha() or self.ch == "_":
-            return self._id()
-
-        if self.ch == "{":  # supports nexsted comments
-            self.skip_comment()
-            return self.get_token()
-
-
-#############################################
-# 					 AST					#
-#############################################
-class AST:
-    pass
-
-
-class Program(AST):
-    def __init__(self, name, block):
-        self.name = name
-        self.block = block
-
-
-class Block(AST):
-    def __init__(self, declarations, compound_statement):
-        self.declarations = declarations
-        self.compound_statement = compound_statement
-
-
-class VarDeclaration(AST):
-    def __init__(self, var_node, type_node):
-        self.var_node = var_node
-        self.type_node = type_node
-
-    def __str__(self):
-        return f"Variable (token: {self.var_node}, type: {self.type_node})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class ProcedureDeclaration(AST):
-    def __init__(self, name, params, block):
-        self.name = name
-        self.params = params  # list of param nodes
-        self.block = block
-
-
-class Param(AST):
-    def __init__(self, var_node, type_node):
-        self.var_node = var_node
-        self.type_node = type_node
-
-
-class Type(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
-
-    def __str__(self):
-        return f"Variable (token: {self.token}, value: {self.value})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class Compound(AST):
-    def __init__(self, statement_list):
-        self.statement_list = statement_list
-        param_nodes = []
-
-
-class Assignment(AST):
-    def __init__(self, var, op, expr):
-        self.var = var
-        self.op = op  # why is this needed?
-        self.expr = expr
-
-    def __str__(self):
-        return f"Assignment(var: {self.var}, op: {self.op}, expr: {self.expr})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class UnOp(AST):
-    def __init__(self, op, expr):
-        self.op = op.type
-        self.expr = expr
-
-    def __str__(self):
-        return f"Variable (op: {self.op}, expr: {self.expr})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class BinOp(AST):
-    def __init__(self, left, op, right):
-        self.left = left
-        self.op = op
-        self.right = right
-
-    def __str__(self):
-        return f"BinOp (left: {self.left}, op: {self.op}, right: {self.right})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class Num(AST):
-    def __init__(self, value, type):
-        self.value = value
-        self.type = type
-
-    def __str__(self):
-        return f"Num (value: {self.value}; type: {self.type})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class Variable(AST):
-    def __init__(self, token):
-        self.token = token
-        self.value = token.value
-
-    def __str__(self):
-        return f"Variable (token: {self.token}, name: {self.value})"
-
-    def __repr__(self):
-        return self.__str__()
-
-
-class Empty(AST):
-    pass
-
-
-#############################################
-# 					Parser					#
-#############################################
-
-
-class Parser:
-    def __init__(self, lexer):
-        self.lexer = lexer
-        self.token = lexer.get_token()
-
-    def error(self, type=None):
-        raise Exception(
-            f"Parser error. Expected type {type} but got Token: {self.token}"
-        )
-
-    def eat(self, type):
-        if self.token.type == type:
-            self.token = self.lexer.get_token()
-        else:
-            self.error(type)
-
-    def program(self):
-        """program : PROGRAM variable SEMI block DOT"""
-        self.eat(PROGRAM)
-        var = self.variable()
-        program_name = var.value
-        self.eat(SEMI)
-        block = self.block()
-        program = Program(program_name, block)
-
-        self.eat(DOT)
-        return program
-
-    def block(self):
-        """
-        block : declarations compound_statement
-        """
-        declarations = self.declarations()
-        statement = self.compound_statement()
-        return Block(declarations, statement)
-
-    def declarations(self):
-        """
-        declarations : VAR (variable_declaration SEMI)+
-                     | (PROCEDURE ID (LP formal_parameter_list
-                     RP)? SEMI block SEMI)*
-                    | empry
-        """
-        declarations = []
-
-        while True:
-            if self.token.type == VAR:
-                self.eat(VAR)
-                while self.token.type == ID:
-                    declarations.extend(self.variable_declaration())
-                    self.eat(SEMI)
-
-            elif self.token.type == PROCEDURE:
-                self.eat(PROCEDURE)
-                procedure_name = self.token.value
-                self.eat(ID)
-                params = []
-
-                if self.token.type == LP:
-                    self.eat(LP)
-                    params = self.formal_parameter_list()
-                    self.eat(RP)
-
-                self.eat(SEMI)
-                block = self.block()
-                declarations.append(ProcedureDeclaration(procedure_name, params, block))
-                self.eat(SEMI)
-
-            else:
-                break
-
-        return declarations
-
-    def variable_declaration(self):
-        """
-        variable_declaration : ID ((COMMA ID)* COLON
-            type_spec)
-        """
-        variables = [Variable(self.token)]
-        self.eat(ID)
-        while self.token.type == COMMA:
-            self.eat(COMMA)
-            variables.append(Variable(self.token))
-            self.eat(ID)
-        self.eat(COLON)
-        type = self.type_spec()
-        return [VarDeclaration(variable, type) for variable in variables]
-
-    def type_spec(self):
-        """
-        type_spec : INTEGER
-                  | REAL
-        """
-        token = self.token
-        if token.type == INTEGER:
-            self.eat(INTEGER)
-            return Type(token)
-        if token.type == REAL:
-            self.eat(REAL)
-            return Type(token)
-
-    def formal_parameter_list(self):
-        """
-        formal_parameter_list : formal_parameters
-                              | formal_parameters SEMI
-            formal_parameter_list
-        """
-        if not self.token.type == ID:
-            return []
-
-        param_list = self.formal_parameters()
-        if self.token == SEMI:
-            self.eat(SEMI)
-            param_list.extend(self.formal_parameters())
-
-        return param_list
-
-    def formal_parameters(self):
-        """
-        formal_parameter : ID (COMMA ID)* COLON type_spec
-        """
-        param_tokens = [self.token]
-        self.eat(ID)
-        while self.token.type == COMMA:
-            self.eat(COMMA)
-            param_tokens.append(self.token)
-            self.eat(ID)
-        self.eat(COLON)
-        type = self.type_spec()
-        param_list = [Param(Variable(var), type) for var in param_tokens]
-
-        return param_list
-
-    def compound_statement(self):
-        """
-        compound_statement : BEGIN statement_list END
-        """
-        self.eat(BEGIN)
-        statements = self.statement_list()
-        root = Compound(statements)
-        self.eat(END)
-        return root
-
-    def statement_list(self):
-        """
-        statement_list : statement
-                       | statement SEMI statement_list
-        """
-        statements = [self.statement()]
-        while self.token.type == SEMI:
-            self.eat(SEMI)
-            statements.append(self.statement())
-        return statements
-
-    def statement(self):
-        """
-        statement : compound_statement
-                  | assignment_statement
-                  | empty
-        """
-        if self.token.type == ID:
-            return self.assigment_statement()
-        elif self.token.type == BEGIN:
-            return self.compound_statement()
+def parameter_list(params):
+    """
+    The formal parameter list of (name, type name) pairs, with consecutive
+    parameters of a type grouped: "x, z : INTEGER; r : REAL".
+    """
+    groups = itertools.groupby(params, key=lambda param: param[1])
+    return "; ".join(
+        f"{', '.join(name for name, _ in group)} : {type_name}"
+        for type_name, group in groups
+    )
+
+
+# expressions nested deeper than this are built by `deep_source` in a single
+# loop, so that they can be as deep as memory allows
+SOURCE_DEPTH = 64
+
+
+def expression_source(node, depth=0):
+    """The source of the expression node, as `SourceToSource` writes it."""
+    node_class = node.__class__
+    if node_class is Variable:
+        return node.value
+    if node_class is Num:
+        return str(node.value)
+    if depth < SOURCE_DEPTH:
+        if node_class is BinOp:
+            left = expression_source(node.left, depth + 1)
+            return f"{left}{node.op.value}{expression_source(node.right, depth + 1)}"
+        if node_class is UnOp:
+            return node.op_value + expression_source(node.expr, depth + 1)
+    return deep_source(node)
+
+
+def deep_source(node):
+    """`expression_source` for an expression of any depth, without recursion."""
+    # a stack of nodes still to write out and of operators (strings)
+    pieces = []
+    emit = pieces.append
+    stack = [node]
+    pop, push = stack.pop, stack.append
+    while stack:
+        node = pop()
+        node_class = node.__class__
+        if node_class is str:
+            emit(node)
+        elif node_class is Variable:
+            emit(node.value)
+        elif node_class is BinOp:
+            push(node.right)
+            push(node.op.value)
+            push(node.left)
+        elif node_class is Num:
+            emit(str(node.value))
+        elif node_class is UnOp:
+            push(node.expr)
+            emit(node.op_value)
         else:
-            return self.empty()
-
-    def assigment_statement(self):
-        """
-        assignment_statement : variable ASSIGN expr
-        """
-        var = self.variable()
-        op = self.token
-        self.eat(ASSIGN)
-        expr = self.expr()
-        return Assignment(var, op, expr)
-
-    def empty(self):
-        return Empty()
-
-    def variable(self):
-        """
-        variable : ID
-        """
-        var = self.token
-        self.eat(ID)
-        return Variable(var)
-
-    def factor(self):
-        """
-        factor : (PLUS | MINUS)factor
-               | INT_CONST
-               | REAL_CONST
-               | LP expr RP
-               | variable
-        """
-        token = self.token
-        if token.type in (INT_CONST, REAL_CONST):
-            num = Num(token.value, token.type)
-            self.eat(token.type)
-            return num
-        if token.type == LP:
-            self.eat(LP)
-            expr = self.expr()
-            self.eat(RP)
-            return expr
-        if token.type == PLUS or token.type == MINUS:
-            self.eat(token.type)
-            return UnOp(token, self.factor())
-        if token.type == ID:
-            return self.variable()
-
-    def term(self):
-        """
-        term : factor ((MUL | INT_DIV | REAL_DIV) factor)*
-        """
-        node = self.factor()
-        while self.token.type in (MUL, INT_DIV, REAL_DIV):
-            op = self.token
-            self.eat(op.type)
-            right_term = self.factor()
-            node = BinOp(node, op, right_term)
-        return node
-
-    def expr(self):
-        """
-        expr : term ((PLUS | MINUS) term)*
-        """
-        node = self.term()
-        while self.token.type == PLUS or self.token.type == MINUS:
-            op = self.token
-            self.eat(op.type)
-            right_term = self.term()
-            node = BinOp(node, op, right_term)
-        return node
-
-    def parse(self):
-        tree = self.program()
-        if self.token.type != EOS:
-            self.error()
-        return tree
-
-
-#############################################
-# 				  AST Visitors				#
-#############################################
-
-
-class NodeVisitor:
-    def visit(self, node):
-        name = "visit_" + type(node).__name__
-        visitor = getattr(self, name, self.default_visitor)
-        return visitor(node)
-
-    def default_visitor(self, node):
-        raise Exception(f"No method named visit_{type(node).__name__}.")
-
-
-#############################################
-# 				    Symbols					#
-#############################################
-class Symbol:
-    def __init__(self, name, type_symbol=None):
-        self.name = name
-        self.type_symbol = type_symbol
-
-
-class BuiltInTypeSymbol(Symbol):
-    def __init__(self, name):
-        super().__init__(name)
-
-    def __str__(self):
-        return self.name
-
-    __repr__ = __str__
-
-
-class VariableSymbol(Symbol):
-    def __init__(self, name, type_symbol):
-        super().__init__(name, type_symbol)
-
-    def __str__(self):
-        return f"<{self.name} : {self.type_symbol}>"
-
-    __repr__ = __str__
-
-
-class ProcedureSymbol(Symbol):
-    def __init__(self, name, params=None):
-        super(ProcedureSymbol, self).__init__(name)
-        self.params = params if params is not None else []
-
-    def __str__(self):
-        return (
-            f"<{self.__class__.__name__}(name = {self.name}, params = {self.params})>"
-        )
-
-    __repr__ = __str__
-
-
-#############################################
-# 				  Symbol Table				#
-#############################################
-class ScopedSymbolTable:
-    def __init__(self, scope_name, scope_level, enclosing_scope=None):
-        self.symbol_table = OrderedDict()
-        self.scope_name = scope_name
-        self.scope_level = scope_level
-        self.enclosing_scope = enclosing_scope
-        self.initBuiltIns()
-
-    def initBuiltIns(self):
-        self.define(BuiltInTypeSymbol(INTEGER))
-        self.define(BuiltInTypeSymbol(REAL))
-
-    def define(self, symbol):
-        print(f"Insert: {symbol}.")
-        self.symbol_table[symbol.name] = symbol
-
-    def lookup(self, name, current_scope_only=False):
-        print(f"Lookup: {name}. Scope: {self.scope_name}")
-        symbol = self.symbol_table.get(name)
-        if symbol is not None:
-            return symbol
-        if current_scope_only:
-            return None
-        if self.enclosing_scope is not None:
-            return self.enclosing_scope.lookup(name)
-
-    def __str__(self):
-        header0 = "SCOPE (SCOPED SYMBOL TABLE)"
-        lines = ["\n", header0, "=" * len(header0)]
-        for h_name, h_value in (
-            ("Scope name: ", self.scope_name),
-            ("Scope level: ", self.scope_level),
-            (
-                "Enclosing scope:",
-                (self.enclosing_scope.scope_name if self.enclosing_scope else None),
-            ),
-        ):
-            lines.append(f"{h_name}{h_value}")
-        header1 = "Scoped symbol table contents:"
-        lines += ["-" * len(header1), header1]
-        lines.extend(
-            ("%7s: %r" % (key, value)) for key, value in self.symbol_table.items()
-        )
-        lines.append("\n")
-        s = "\n".join(lines)
-        return s
-
-    __repr__ = __str__
+            raise Exception(f"Not an expression: {type(node).__name__}.")
+    return "".join(pieces)
 
 
 class SourceToSource(NodeVisitor):
-    def __init__(self, recompiled):
+    """
+    Recompiles a Program tree to Pascal. `chunks` produces the source as a
+    generator of large strings and `recompile` writes them to recompiled,
+    which can be anything with a write method taking str: a file,
+    io.StringIO, a socket's makefile("w"), ...
+
+    Every visit adds its pieces of source to self.pieces, a whole line for
+    each statement. Those of the program, blocks, procedures and compound
+    statements are generators as well, and compound statements yield
+    whenever there are more than chunk_pieces pieces, for `chunks` to join
+    them into a chunk.
+    Expressions are built by `expression_source`, a string per statement.
+    """
+
+    def __init__(self, recompiled=None, chunk_pieces=1 << 14):
         self.current_scope = None
         self.recompiled = recompiled
+        self.chunk_pieces = chunk_pieces
+        self.pieces = []
+        self.emit = self.pieces.append
+
+    def recompile(self, program):
+        write = self.recompiled.write
+        for chunk in self.chunks(program):
+            write(chunk)
+
+    def chunks(self, program):
+        pieces = self.pieces
+        for _ in self.visit(program):
+            yield "".join(pieces)
+            pieces.clear()
+        if pieces:
+            yield "".join(pieces)
+            pieces.clear()
 
     def visit_Program(self, program_node):
-        write = f"program {program_node.name};\n"
-        self.recompiled.write(write)
-        self.visit(program_node.block)
+        self.emit(f"program {program_node.name};\n")
+        yield from self.visit(program_node.block)
 
     def visit_Block(self, block_node):
         for declaration in block_node.declarations:
-            self.visit(declaration)
+            procedure = self.visit(declaration)
+            if procedure is not None:
+                yield from procedure
 
-        self.visit(block_node.compound_statement)
+        yield from self.visit(block_node.compound_statement)
 
     def visit_VarDeclaration(self, declaration):
         write = f"var {declaration.var_node.value} : {declaration.type_node.value};\n"
-        self.recompiled.write(write)
+        self.emit(write)
 
     def visit_ProcedureDeclaration(self, declaration):
         write = f"procedure {declaration.name}"
         if declaration.params:
-            var_ids = [param.var_node.value for param in declaration.params]
-            var_type = declaration.params[0].type_node.value
-            ids = ", ".join(var_ids)
-            write += f"({ids} : {var_type})"
+            params = [
+                (param.var_node.value, param.type_node.value)
+                for param in declaration.params
+            ]
+            write += f"({parameter_list(params)})"
         write += ";\n"
 
-        self.recompiled.write(write)
+        self.emit(write)
 
-        self.visit(declaration.block)
+        yield from self.visit(declaration.block)
 
     def visit_Compound(self, compound_statement):
+        pieces = self.pieces
         for statement in compound_statement.statement_list:
-            self.visit(statement)
+            compound = self.visit(statement)
+            if compound is not None:
+                yield from compound
+            elif len(pieces) > self.chunk_pieces:
+                yield
 
     def visit_Assignment(self, assignment_node):
-        expr = self.visit(assignment_node.expr)
-        write = f"{assignment_node.var.value} := {expr};\n"
-        self.recompiled.write(write)
+        expr = self.source(assignment_node.expr)
+        self.emit(f"{assignment_node.var.value} := {expr};\n")
 
-    def visit_BinOp(self, binop):
-        write = self.visit(binop.left) + binop.op.value + self.visit(binop.right)
-        return write
+    def visit_ProcedureCall(self, call):
+        args = ", ".join([self.source(arg) for arg in call.actual_params])
+        self.emit(f"{call.name}({args});\n")
 
-    def visit_UnOp(self, unop):
-        expr = self.visit(unop.expr)
-        write = unop.op_value + expr
-        return write
+    def expression(self, node):
+        self.emit(self.source(node))
 
-    def visit_Num(self, num):
-        return str(num.value)
+    source = staticmethod(expression_source)
 
-    def visit_Variable(self, var):
-        return var.value
+    visit_BinOp = visit_UnOp = visit_Num = visit_Variable = expression
 
     def visit_Type(self, type_node):
         pass
@@ -776,32 +213,283 @@ class SourceToSource(NodeVisitor):
         pass
 
 
+OPERATOR_VALUES = {PLUS: "+", MINUS: "-", MUL: "*", INT_DIV: "DIV", REAL_DIV: "/"}
+
+
+class FlatSourceToSource(FlatVisitor):
+    """SourceToSource for a `FlatTree`."""
+
+    def __init__(self, tree, recompiled=None, chunk_pieces=1 << 14):
+        super().__init__(tree)
+        self.recompiled = recompiled
+        self.chunk_pieces = chunk_pieces
+        self.pieces = []
+        self.emit = self.pieces.append
+
+    recompile = SourceToSource.recompile
+    chunks = SourceToSource.chunks
+    expression = SourceToSource.expression
+
+    def visit_Program(self, index):
+        self.emit(f"program {self.name(index)};\n")
+        yield from self.visit(self.b[index])
+
+    def visit_Block(self, index):
+        for declaration in self.tree.child_nodes(self.a[index], self.b[index]):
+            procedure = self.visit(declaration)
+            if procedure is not None:
+                yield from procedure
+
+        yield from self.visit(self.c[index])
+
+    def visit_VarDeclaration(self, index):
+        var_name = self.name(self.a[index])
+        type_name = self.name(self.b[index])
+        self.emit(f"var {var_name} : {type_name};\n")
+
+    def visit_ProcedureDeclaration(self, index):
+        write = f"procedure {self.name(index)}"
+        start, count = self.b[index], self.c[index]
+        params = self.tree.child_nodes(start, count)
+        if params:
+            params = [
+                (self.name(self.a[param]), self.name(self.b[param]))
+                for param in params
+            ]
+            write += f"({parameter_list(params)})"
+        write += ";\n"
+
+        self.emit(write)
+
+        yield from self.visit(self.tree.children[start + count])
+
+    def visit_Compound(self, index):
+        pieces = self.pieces
+        for statement in self.tree.child_nodes(self.a[index], self.b[index]):
+            compound = self.visit(statement)
+            if compound is not None:
+                yield from compound
+            elif len(pieces) > self.chunk_pieces:
+                yield
+
+    def visit_Assignment(self, index):
+        expr = self.source(self.b[index])
+        self.emit(f"{self.name(self.a[index])} := {expr};\n")
+
+    def visit_ProcedureCall(self, index):
+        arg_nodes = self.tree.child_nodes(self.b[index], self.c[index])
+        args = ", ".join([self.source(arg) for arg in arg_nodes])
+        self.emit(f"{self.name(index)}({args});\n")
+
+    def source(self, index, depth=0):
+        """The source of the expression node at index."""
+        kind = self.kinds[index]
+        if kind == VARIABLE_NODE:
+            return self.tree.names[self.a[index]]
+        if kind == NUM_NODE:
+            return str(self.tree.constants[self.a[index]])
+        if depth < SOURCE_DEPTH:
+            if kind == BINOP_NODE:
+                left = self.source(self.a[index], depth + 1)
+                op = OPERATOR_VALUES[self.b[index]]
+                return f"{left}{op}{self.source(self.c[index], depth + 1)}"
+            if kind == UNOP_NODE:
+                op = OPERATOR_VALUES[self.a[index]]
+                return op + self.source(self.b[index], depth + 1)
+        return self.deep_source(index)
+
+    def deep_source(self, index):
+        # like `deep_source`, with node indexes for nodes
+        pieces = []
+        emit = pieces.append
+        kinds, a, b, c = self.kinds, self.a, self.b, self.c
+        names, constants = self.tree.names, self.tree.constants
+        stack = [index]
+        pop, push = stack.pop, stack.append
+        while stack:
+            index = pop()
+            if index.__class__ is str:
+                emit(index)
+                continue
+            kind = kinds[index]
+            if kind == VARIABLE_NODE:
+                emit(names[a[index]])
+            elif kind == BINOP_NODE:
+                push(c[index])
+                push(OPERATOR_VALUES[b[index]])
+                push(a[index])
+            elif kind == NUM_NODE:
+                emit(str(constants[a[index]]))
+            elif kind == UNOP_NODE:
+                push(b[index])
+                emit(OPERATOR_VALUES[a[index]])
+            else:
+                self.default_visitor(index)
+        return "".join(pieces)
+
+    visit_BinOp = visit_UnOp = visit_Num = visit_Variable = expression
+
+    def visit_Type(self, index):
+        pass
+
+    def visit_Empty(self, index):
+        pass
+
+
+class SourceToPython(PythonCompiler):
+    """
+    Translates a Program tree checked by `SemanticAnalyzer` into the source
+    of a Python module, to run at CPython speed or import. The module's
+    run() runs the program and returns its assigned global variables by
+    name, as `Interpreter` leaves them in GLOBAL_MEMORY, and running the
+    module as a script prints them.
+
+    The translation is `PythonCompiler`'s, so DIV stays floor division and
+    / real division, plus conversions that keep every variable and
+    parameter of its declared type: an INTEGER assigned to a REAL variable
+    or passed for a REAL parameter is converted with float(), and
+    assigning a REAL to an INTEGER variable is a type error.
+    """
+
+    def module(self, program):
+        self.scope = checked_scope(program)
+        lines = [
+            f"# Python translation of the Pascal program {program.name}.",
+            "",
+            "",
+            "def run():",
+            f'    """Run {program.name}; return its global variables by name."""',
+        ]
+        lines.extend(f"    {statement}" for statement in self.body(program))
+        lines.append("    return variables(locals())")
+        lines += [
+            "",
+            "",
+            "def variables(names):",
+            "    # Pascal names are prefixed with _, procedures are the callables",
+            "    return {",
+            "        name[1:]: value",
+            "        for name, value in names.items()",
+            "        if not callable(value)",
+            "    }",
+            "",
+            "",
+            'if __name__ == "__main__":',
+            "    print(run())",
+        ]
+        return "\n".join(lines) + "\n"
+
+    def visit_ProcedureDeclaration(self, procedure):
+        scope = self.scope
+        self.scope = checked_scope(procedure)
+        lines = super().visit_ProcedureDeclaration(procedure)
+        self.scope = scope
+        return lines
+
+    def visit_Assignment(self, assignment):
+        var = assignment.var
+        if var.depth < self.depth:
+            self.nonlocals.add(f"_{var.value}")
+        expr = self.converted(assignment.expr, self.type_of(var), var.value)
+        return [f"_{var.value} = {expr}"]
+
+    def visit_ProcedureCall(self, call):
+        args = ", ".join(
+            self.converted(arg, param.type_node.value, param.var_node.value)
+            for arg, param in zip(call.actual_params, call.procedure.params)
+        )
+        return [f"_{call.name}_({args})"]
+
+    def converted(self, expr, type_name, name):
+        """The source of expr, converted for a variable name of type_name."""
+        source, _ = self.visit(expr)
+        expr_type = self.type_of(expr)
+        if expr_type == type_name:
+            return source
+        if (expr_type, type_name) == ("INTEGER", "REAL"):
+            return f"float({source})"
+        raise Exception(f"Type error: assigning a {expr_type} to {name} : {type_name}")
+
+    def type_of(self, expr):
+        if isinstance(expr, Num):
+            return "INTEGER" if expr.type == INT_CONST else "REAL"
+        if isinstance(expr, Variable):
+            return self.scope.lookup(expr.value).type_symbol.name
+        if isinstance(expr, UnOp):
+            return self.type_of(expr.expr)
+        left, right = self.type_of(expr.left), self.type_of(expr.right)
+        return binop_type(expr.op.type, left, right)
+
+
 #############################################
 # 				  	Main					#
 #############################################
 
 
 def main():
-    import sys
+    import argparse
+
+    directory = "/Users/paultalma/Programming/simple-interpreters/pascal-interpreter"
+    arg_parser = argparse.ArgumentParser(description="Pascal to Pascal compiler")
+    arg_parser.add_argument("source", nargs="?", default=f"{directory}/test.txt")
+    arg_parser.add_argument("output", nargs="?", default=f"{directory}/recompiled.txt")
+    arg_parser.add_argument("--lexer", choices=LEXERS, default="scan")
+    arg_parser.add_argument("--flat", action="store_true", help="parse into a FlatTree")
+    arg_parser.add_argument(
+        "--no-fold", action="store_true", help="skip constant folding"
+    )
+    arg_parser.add_argument("--cache-dir", help="reuse parse trees cached here")
+    arg_parser.add_argument(
+        "--python", action="store_true", help="translate to a Python module"
+    )
+    args = arg_parser.parse_args()
+    if args.python and args.flat:
+        arg_parser.error("--python needs objects, not a FlatTree")
 
     print("Recompiling...")
 
-    text = open(
-        "/Users/paultalma/Programming/simple-interpreters/pascal-interpreter/test.txt",
-        "r",
-    ).read()
+    def open_lexer():
+        if args.lexer == "stream":
+            return StreamLexer(map_file(open(args.source, "rb")))
+        text = open(args.source, "r").read()
+        return LEXERS[args.lexer](text)
 
-    recompiled_name = "/Users/paultalma/Programming/simple-interpreters/pascal-interpreter/recompiled.txt"
-    # clear output
-    with open(recompiled_name, "w"):
-        pass
+    def parse_flat():
+        tree = FlatTree()
+        Parser(open_lexer(), tree).parse()
+        return tree
 
-    recompiled = open(recompiled_name, "a")
-    lexer = Lexer(text)
-    parser = Parser(lexer)
-    tree = parser.parse()
-    symbol_table_builder = SourceToSource(recompiled)
-    symbol_table_builder.visit_Program(tree)
+    def parse():
+        parser = Parser(open_lexer())
+        return parser.parse()
+
+    front_end = parse_flat if args.flat else parse
+    if args.cache_dir is not None:
+        cache = ParseCache(args.cache_dir)
+        key = cache.file_key("flat parsed" if args.flat else "parsed", args.source)
+        tree = cache.fetch(key, front_end)
+    else:
+        tree = front_end()
+
+    if args.flat:
+        recompiler = FlatSourceToSource(tree)
+        program = tree.root
+    else:
+        if not args.no_fold:
+            folder = ConstantFolder()
+            tree = folder.fold(tree)
+            print(f"Constant folding removed {folder.removed} nodes.")
+        recompiler = SourceToSource()
+        program = tree
+    if args.python:
+        SemanticAnalyzer().visit(tree)
+        module = SourceToPython().module(tree)
+        with open(args.output, "w") as recompiled:
+            recompiled.write(module)
+        return
+    with open(args.output, "w") as recompiled:
+        recompiler.recompiled = recompiled
+        recompiler.recompile(program)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,175 @@
+# The regex and streaming lexers must produce the same tokens as `Lexer`.
+# usage: python -m pytest test_lexers.py
+import importlib.util
+import io
+import os
+import sys
+
+import pytest
+
+
+def load(file_name, module_name):
+    """Import one of the hyphenated scripts in this directory as a module."""
+    path = os.path.join(os.path.dirname(os.path.abspath(__file__)), file_name)
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[module_name] = module
+    spec.loader.exec_module(module)
+    return module
+
+
+pascal = load("pascal-interpreter.py", "pascal_interpreter")
+
+PROGRAM = """\
+PROGRAM Sample;
+VAR
+   a, b, _c : INTEGER;
+   y : REAL;
+{ a {nested} comment }
+PROCEDURE P1(x, z : INTEGER; r : REAL);
+VAR
+   k : REAL;
+BEGIN {P1}
+   k := 2.5 / r
+END;  {P1}
+
+begin {Sample}
+   a := 2;
+   BEGIN
+      b := 10 * a + 10 * A div 4;
+      _c := a - - b
+   END;
+   P1(a, b, 1.5);
+   y := 20 / 7 + 3.14;
+   a := (a + b) * -_c
+End.  {Sample}
+"""
+
+VALID = [
+    PROGRAM,
+    "",
+    "   ",
+    "{ only a comment }",
+    "{ trailing {nested} } ",
+    "a{}b",
+    "x:=1",
+    "x:",
+    "12.5.3",
+    "1..2",
+    "_",
+    "_1",
+    "aé",
+    "BeGiN eNd",
+    "Div DIV div",
+]
+
+# `Lexer.get_token` returns None at a character it does not recognize, where
+# the other lexers raise
+UNKNOWN = ["@", "a @", "}", "a}", "x := 1 # 2"]
+
+ERRORS = [
+    ("{ open", "Unclosed comment."),
+    ("{ a { b }", "Unclosed comment."),
+    ("_ x", "Lexer error."),
+    ("__a", "Lexer error."),
+]
+
+
+def drain(lexer):
+    tokens = []
+    token = lexer.get_token()
+    while token is not None and token.type != pascal.EOS:
+        tokens.append((token.type, token.value))
+        token = lexer.get_token()
+    return tokens, token and token.type
+
+
+def chunked(text, size):
+    return [text[i : i + size] for i in range(0, len(text), size)]
+
+
+def lexers(text):
+    """A lexer of every engine for text, streaming ones in several chunk sizes."""
+    yield "scan", pascal.Lexer(text)
+    yield "regex", pascal.RegexLexer(text)
+    yield "stream", pascal.StreamLexer(text)
+    for size in (1, 2, 3, 7, 64):
+        yield f"stream/{size}", pascal.StreamLexer(chunked(text, size))
+        data = io.BytesIO(text.encode())
+        yield f"stream/bytes/{size}", pascal.StreamLexer(data, chunk_size=size)
+
+
+def test_every_engine_is_listed():
+    assert set(pascal.LEXERS) == {"scan", "regex", "stream"}
+
+
+@pytest.mark.parametrize("text", VALID)
+def test_valid_input(text):
+    expected, end = drain(pascal.Lexer(text))
+    assert end == pascal.EOS
+    for name, lexer in lexers(text):
+        assert drain(lexer) == (expected, end), name
+
+
+def test_end_of_source_repeats():
+    for name, lexer in lexers("a"):
+        assert lexer.get_token().value == "a", name
+        for _ in range(3):
+            assert lexer.get_token().type == pascal.EOS, name
+
+
+def test_keywords_and_identifiers():
+    tokens, _ = drain(pascal.RegexLexer("Begin bEGIN FooBar _Foo foo_bar"))
+    assert tokens == [
+        (pascal.BEGIN, "BEGIN"),
+        (pascal.BEGIN, "BEGIN"),
+        (pascal.ID, "foobar"),
+        (pascal.ID, "_foo"),
+        (pascal.ID, "foo"),
+        (pascal.ID, "_bar"),
+    ]
+
+
+def test_numbers():
+    tokens, _ = drain(pascal.RegexLexer("7 2.50"))
+    assert tokens == [(pascal.INT_CONST, 7), (pascal.REAL_CONST, 2.5)]
+    assert type(tokens[0][1]) is int and type(tokens[1][1]) is float
+
+
+@pytest.mark.parametrize("text", UNKNOWN)
+def test_unknown_character(text):
+    expected, end = drain(pascal.Lexer(text))
+    assert end is None
+    for name, lexer in lexers(text):
+        if name == "scan":
+            continue
+        tokens = []
+        with pytest.raises(Exception, match="Lexer error."):
+            for token in iter(lexer.get_token, None):
+                if token.type == pascal.EOS:
+                    break
+                tokens.append((token.type, token.value))
+        assert tokens == expected, name
+
+
+def test_stream_stops_at_unknown_character():
+    read = []
+
+    def chunks():
+        yield "a @ b"
+        for _ in range(1000):
+            read.append(1)
+            yield "; b"
+
+    lexer = pascal.StreamLexer(chunks())
+    assert lexer.get_token().value == "a"
+    with pytest.raises(Exception, match="Lexer error."):
+        lexer.get_token()
+    assert len(read) <= 1
+
+
+@pytest.mark.parametrize("text, message", ERRORS)
+def test_errors(text, message):
+    for name, lexer in lexers(text):
+        with pytest.raises(Exception, match=message):
+            drain(lexer)
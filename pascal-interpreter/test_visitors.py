@@ -0,0 +1,84 @@
+# Visitors must see every node of an expression once, however deep it is.
+# usage: python -m pytest test_visitors.py
+import pytest
+
+from test_lexers import pascal
+
+DEPTH = 5000
+
+
+def deep_program(depth, statement="b := {}"):
+    """A program with the expression a + (a + (... a)) of depth operators."""
+    expression = "a + (" * depth + "a" + ")" * depth
+    lines = ["PROGRAM Deep;", "VAR a, b : INTEGER;", "PROCEDURE P(n : INTEGER);"]
+    lines += ["BEGIN b := n END;", "BEGIN", "   a := 1;"]
+    lines += ["   " + statement.format(expression), "END."]
+    return "\n".join(lines)
+
+
+def parse(text):
+    return pascal.Parser(pascal.RegexLexer(text)).parse()
+
+
+def statement(tree):
+    return tree.block.compound_statement.statement_list[1]
+
+
+def counts(profile):
+    return {cls.__name__: entry[0] for cls, entry in profile.node_types.items()}
+
+
+@pytest.mark.parametrize(
+    "depth, deep",
+    [(0, False), (pascal.EXPRESSION_DEPTH, False), (pascal.EXPRESSION_DEPTH + 1, True)],
+)
+def test_parser_flags_deep_statements(depth, deep):
+    for text in (deep_program(depth), deep_program(depth, "P(1, {})")):
+        assert statement(parse(text)).deep is deep
+
+
+@pytest.mark.parametrize("depth", [1, DEPTH])
+def test_trace_looks_up_each_variable_once(depth):
+    lookups = []
+
+    def target(level, event, fields):
+        if event == "lookup" and fields["name"] == "a":
+            lookups.append(fields)
+
+    tree = parse(deep_program(depth))
+    pascal.SemanticAnalyzer(pascal.TraceSink(target)).visit(tree)
+    # the declaration, a := 1 and the expression's operands
+    assert len(lookups) == 2 + depth + 1
+
+
+# statement, then the Variable visits besides the expression's: of the
+# analysis (a := 1 and the body of P included) and of the run, and the
+# number of statements run
+STATEMENTS = [("b := {}", 4, 0, 2), ("P({})", 3, 1, 3)]
+
+
+@pytest.mark.parametrize("depth", [1, DEPTH])
+@pytest.mark.parametrize("statement_source, analyzed, read, statements", STATEMENTS)
+def test_profile_counts_every_node(depth, statement_source, analyzed, read, statements):
+    tree = parse(deep_program(depth, statement_source))
+    analysis, run = pascal.Profile(), pascal.Profile()
+    pascal.SemanticAnalyzer(profile=analysis).visit(tree)
+    interpreter = pascal.Interpreter(tree, profile=run)
+    interpreter.interpret()
+    assert interpreter.GLOBAL_MEMORY["b"] == depth + 1
+
+    assert counts(analysis)["BinOp"] == counts(run)["BinOp"] == depth
+    assert counts(analysis)["Variable"] == depth + 1 + analyzed
+    assert counts(run)["Variable"] == depth + 1 + read
+    assert len(run.statements) == statements
+    run.report()  # labels statements too deep to write out
+
+
+@pytest.mark.parametrize("depth", [1, DEPTH])
+def test_flat_tree(depth):
+    tree = pascal.FlatTree()
+    pascal.Parser(pascal.RegexLexer(deep_program(depth, "P({})")), tree).parse()
+    pascal.FlatSemanticAnalyzer(tree).visit(tree.root)
+    interpreter = pascal.FlatInterpreter(tree)
+    interpreter.interpret()
+    assert interpreter.GLOBAL_MEMORY["b"] == depth + 1